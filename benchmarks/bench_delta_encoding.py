@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+
+# Compare stream archives of a slowly changing field with and without the
+# field stored as zstd patches against its latest full version, checking that
+# every time is restored exactly.
+#
+# Usage: python -m benchmarks.bench_delta_encoding [num_times] [field_size]
+#     [changed_fraction] [keyframe_every]
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from simon.archive import delta
+from simon.archive.stream import StreamArchive
+
+
+def write_times(
+    case_dir: Path,
+    num_times: int,
+    field_size: int,
+    changed_fraction: float,
+    seed: int = 0,
+) -> Dict[str, bytes]:
+    # Write num_times times of an ASCII field of about field_size bytes, of
+    # which changed_fraction of the values change from one time to the next
+    rng = random.Random(seed)
+    values = [f"{rng.uniform(-1, 1):.6g}" for _ in range(field_size // 10)]
+    contents: Dict[str, bytes] = {}
+    for i in range(num_times):
+        t = str(i + 1)
+        for j in rng.sample(
+            range(len(values)), int(len(values) * changed_fraction)
+        ):
+            values[j] = f"{rng.uniform(-1, 1):.6g}"
+        (case_dir / t).mkdir(parents=True)
+        contents[t] = "\n".join(values).encode()
+        (case_dir / t / "U").write_bytes(contents[t])
+    return contents
+
+
+def archive_times(
+    case_dir: Path,
+    times: List[str],
+    archive_path: Path,
+    delta_fields: Optional[List[str]],
+    keyframe_every: int,
+) -> float:
+    start = time.perf_counter()
+    archive = StreamArchive(archive_path)
+    for t in times:
+        archive.append(
+            case_dir,
+            t,
+            delta_fields=delta_fields,
+            keyframe_every=keyframe_every,
+        )
+    archive.finalize()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    num_times = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    field_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1 << 22
+    changed_fraction = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+    keyframe_every = (
+        int(sys.argv[4]) if len(sys.argv) > 4 else delta.KEYFRAME_EVERY
+    )
+    if not delta.is_available():
+        sys.exit("zstd is not installed")
+    with tempfile.TemporaryDirectory() as work_dir:
+        case_dir = Path(work_dir) / "case"
+        contents = write_times(
+            case_dir, num_times, field_size, changed_fraction
+        )
+        times = list(contents)
+        plain_path = Path(work_dir) / "plain.tgz"
+        delta_path = Path(work_dir) / "delta.tgz"
+        plain_seconds = archive_times(
+            case_dir, times, plain_path, None, keyframe_every
+        )
+        delta_seconds = archive_times(
+            case_dir, times, delta_path, ["U"], keyframe_every
+        )
+        start = time.perf_counter()
+        archive = StreamArchive(delta_path)
+        for t in times:
+            restored = Path(work_dir) / "restored"
+            archive.extract(t, restored)
+            assert (restored / t / "U").read_bytes() == contents[t]
+        extract_seconds = time.perf_counter() - start
+        input_bytes = sum(len(c) for c in contents.values())
+        plain_bytes = plain_path.stat().st_size
+        delta_bytes = delta_path.stat().st_size
+    print(
+        f"{num_times} times of {field_size} bytes, {changed_fraction:.0%}"
+        f" changed per time, a keyframe every {keyframe_every} times"
+    )
+    print(
+        f"gzip:         ratio {input_bytes / plain_bytes:6.2f}"
+        f"  {plain_seconds:6.2f} s"
+    )
+    print(
+        f"zstd patches: ratio {input_bytes / delta_bytes:6.2f}"
+        f"  {delta_seconds:6.2f} s"
+    )
+    print(f"Gain:         {plain_bytes / delta_bytes:.2f}x")
+    print(f"Restored every time exactly in {extract_seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
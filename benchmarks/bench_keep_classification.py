@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+
+# Compare classifying a backfill of split times against keep_every with a
+# Decimal division and a modulo by one per time (the original check) and with
+# TimeGrid.classify (a single Decimal remainder per time).
+#
+# Usage: python -m benchmarks.bench_keep_classification [num_times]
+
+import sys
+import timeit
+from decimal import Decimal
+from typing import List
+
+from simon.openfoam.timegrid import TimeGrid
+
+
+def classify_by_division(
+    timestamps: List[str], keep_every: Decimal
+) -> List[bool]:
+    # The original check from OFListener._delete_without_processing
+    return [(Decimal(t) / keep_every) % 1 == 0 for t in timestamps]
+
+
+def main() -> None:
+    num_times = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    write_interval = Decimal("0.0005")
+    keep_every = Decimal("0.001")
+    timestamps = [str(i * write_interval) for i in range(1, num_times + 1)]
+    grid = TimeGrid(keep_every)
+    assert grid.classify(timestamps) == classify_by_division(
+        timestamps, keep_every
+    )
+    division = min(
+        timeit.repeat(
+            lambda: classify_by_division(timestamps, keep_every),
+            number=1,
+            repeat=5,
+        )
+    )
+    remainder = min(
+        timeit.repeat(lambda: grid.classify(timestamps), number=1, repeat=5)
+    )
+    print(f"{num_times} timestamps")
+    print(f"Division and modulo: {division * 1e3:.1f} ms")
+    print(f"TimeGrid remainder:  {remainder * 1e3:.1f} ms")
+    print(f"Speedup:             {division / remainder:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
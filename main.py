@@ -1,23 +1,31 @@
 #!/usr/bin/python3
 
 import argparse
+import tempfile
 import time
 from decimal import Decimal
 from pathlib import Path
+from typing import List, Optional, Union
 
-from simon.oflistener import OFListener
+from simon.archive import bench
+from simon.archive.catalog import ArchiveCatalog
+from simon.archive.codecs import CODECS, Codec
+from simon.archive.delta import KEYFRAME_EVERY
+from simon.archive.extract import extract_times, find_catalog
+from simon.cluster.local import LocalJobManager
+from simon.cluster.quota import QuotaMonitor
+from simon.cluster.slurm import SlurmJobManager
+from simon.openfoam.completion import WriteCompletionDetector
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.listener import ARCHIVE_MODES, OFListener
+from simon.openfoam.registry import RECONSTRUCTION_REGISTRIES
+from simon.openfoam.schedule import WriteScheduler
+from simon.openfoam.solver_log import SolverLog, find_solver_log
+from simon.openfoam.usage import OFUsageTracker
 from simon.taskqueue import TaskQueue
 
 
-def init_argparse() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        prog="simon", description="A Simulation Monitor"
-    )
-    parser.add_argument(
-        "command",
-        choices=["setup", "monitor"],
-        help="Running mode 'setup' (clean up case directory) or 'monitor'",
-    )
+def add_processing_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "--keep-every",
         required=True,
@@ -25,6 +33,13 @@ def init_argparse() -> argparse.ArgumentParser:
         type=Decimal,
         help="How often to keep timesteps (all others are deleted)",
     )
+    parser.add_argument(
+        "--compress-every",
+        required=True,
+        dest="compress_every",
+        type=Decimal,
+        help="How much simulation time to group into each compressed file",
+    )
     parser.add_argument(
         "-n",
         "--num-simultaneous-tasks",
@@ -41,7 +56,36 @@ def init_argparse() -> argparse.ArgumentParser:
         type=int,
         help="How many seconds to sleep for between update steps",
     )
+
+
+def init_argparse() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="simon", description="A Simulation Monitor"
+    )
+    parser.add_argument(
+        "--case-dir",
+        default=Path("."),
+        dest="case_directory",
+        type=Path,
+        help="The OpenFOAM case directory",
+    )
     parser.add_argument(
+        "--reconstruction-registry",
+        default="marker",
+        dest="reconstruction_registry",
+        choices=list(RECONSTRUCTION_REGISTRIES),
+        help="How to record completely reconstructed times",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    setup_parser = subparsers.add_parser(
+        "setup", help="Clean up the case directory"
+    )
+    add_processing_arguments(setup_parser)
+    monitor_parser = subparsers.add_parser(
+        "monitor", help="Monitor the case while it runs"
+    )
+    add_processing_arguments(monitor_parser)
+    monitor_parser.add_argument(
         "-u",
         "--recheck-every-num-updates",
         default=1,
@@ -49,16 +93,506 @@ def init_argparse() -> argparse.ArgumentParser:
         type=int,
         help="How many update steps to run before querying for new tasks",
     )
+    monitor_parser.add_argument(
+        "--max-files",
+        default=None,
+        dest="max_files",
+        type=int,
+        help="File count quota to drain against",
+    )
+    monitor_parser.add_argument(
+        "--max-bytes",
+        default=None,
+        dest="max_bytes",
+        type=int,
+        help="Byte quota to drain against",
+    )
+    monitor_parser.add_argument(
+        "--quota-command",
+        default=None,
+        dest="quota_command",
+        help="Command printing the quota (e.g. 'lfs quota -q -u $USER .')"
+        " to use instead of the usage measured by simon",
+    )
+    monitor_parser.add_argument(
+        "--high-water",
+        default=0.9,
+        dest="high_water",
+        type=float,
+        help="Fraction of the quota at which to start draining",
+    )
+    monitor_parser.add_argument(
+        "--low-water",
+        default=0.8,
+        dest="low_water",
+        type=float,
+        help="Fraction of the quota at which to stop draining",
+    )
+    monitor_parser.add_argument(
+        "--drain-num-simultaneous-tasks",
+        default=None,
+        dest="drain_num_simultaneous_tasks",
+        type=int,
+        help="How many tasks to run in parallel while draining",
+    )
+    monitor_parser.add_argument(
+        "--hold-job-when-draining",
+        action="store_true",
+        dest="hold_job_when_draining",
+        help="Hold the requeued solver job while draining so that it cannot"
+        " restart and write more times before the quota has recovered",
+    )
+    monitor_parser.add_argument(
+        "--slurm-job-id",
+        default=None,
+        dest="slurm_job_id",
+        help="The Slurm job running the solver (runs the compress jobs"
+        " through Slurm instead of locally)",
+    )
+    monitor_parser.add_argument(
+        "--slurm-job-sfile",
+        default=None,
+        dest="slurm_job_sfile",
+        help="The sbatch file of the solver job, relative to the case",
+    )
+    monitor_parser.add_argument(
+        "--slurm-compress-sfile",
+        default=None,
+        dest="slurm_compress_sfile",
+        help="The sbatch template of the compress jobs, relative to the case",
+    )
+    monitor_parser.add_argument(
+        "--detect-write-completion",
+        action="store_true",
+        dest="detect_write_completion",
+        help="Process the latest split time as soon as it has been written"
+        " instead of waiting for the next one",
+    )
+    monitor_parser.add_argument(
+        "--solver-log",
+        default=None,
+        dest="solver_log",
+        type=Path,
+        help="The solver log to follow (defaults to the latest log.* or"
+        " Report-*.out in the case directory)",
+    )
+    monitor_parser.add_argument(
+        "--write-quiet-seconds",
+        default=30.0,
+        dest="write_quiet_seconds",
+        type=float,
+        help="How long a split time has to be left untouched to be"
+        " considered written when the solver log has not moved past it",
+    )
+    monitor_parser.add_argument(
+        "--reconstruct-batch-size",
+        default=1,
+        dest="reconstruct_batch_size",
+        type=int,
+        help="How many times to reconstruct per reconstructPar run",
+    )
+    monitor_parser.add_argument(
+        "--reconstruct-field-parts",
+        default=1,
+        dest="reconstruct_field_parts",
+        type=int,
+        help="How many concurrent reconstructPar runs to split the fields of"
+        " a time over when it is reconstructed on its own",
+    )
+    monitor_parser.add_argument(
+        "--fields",
+        default=None,
+        dest="fields",
+        nargs="+",
+        help="The fields to reconstruct and archive (all of them by"
+        " default)",
+    )
+    monitor_parser.add_argument(
+        "--archive-mode",
+        default="tar",
+        dest="archive_mode",
+        choices=ARCHIVE_MODES,
+        help="Tar the reconstructed times and compress the tars later (tar)"
+        " or append them straight into compressed group archives (stream)",
+    )
+    monitor_parser.add_argument(
+        "--delta-fields",
+        default=None,
+        dest="delta_fields",
+        nargs="+",
+        help="The fields to store as zstd patches against their previous"
+        " full version in the stream archives (needs zstd)",
+    )
+    monitor_parser.add_argument(
+        "--keyframe-every",
+        default=KEYFRAME_EVERY,
+        dest="keyframe_every",
+        type=int,
+        help="Store one in every this many times of the --delta-fields in"
+        " full",
+    )
+    monitor_parser.add_argument(
+        "--max-group-bytes",
+        default=None,
+        dest="max_group_bytes",
+        type=int,
+        help="Split the tars of a --compress-every window into compressed"
+        " files of about this many bytes (whichever of the two comes first"
+        " closes a compressed file)",
+    )
+    monitor_parser.add_argument(
+        "--compact-bytes",
+        default=None,
+        dest="compact_bytes",
+        type=int,
+        help="Merge adjacent compressed files smaller than this many bytes"
+        " into ones of up to this many bytes in the background",
+    )
+    monitor_parser.add_argument(
+        "--codec",
+        default="gzip",
+        dest="codec",
+        choices=CODECS,
+        help="What to compress the tars with (the stream archives are always"
+        " gzip)",
+    )
+    monitor_parser.add_argument(
+        "--compress-level",
+        default=None,
+        dest="compress_level",
+        type=int,
+        help="The compression level (defaults to that of the codec)",
+    )
+    monitor_parser.add_argument(
+        "--compress-threads",
+        default=None,
+        dest="compress_threads",
+        type=int,
+        help="How many threads pigz, zstd and xz compress with (0 for all"
+        " the cores, which is also the default)",
+    )
+    monitor_parser.add_argument(
+        "--seekable",
+        action="store_true",
+        dest="seekable",
+        help="Compress every time separately (gzip only) and index where"
+        " each one starts so that single times can be extracted quickly",
+    )
+    monitor_parser.add_argument(
+        "--catalog",
+        action="store_true",
+        dest="catalog",
+        help="Record the times held by every compressed file in the case"
+        " catalog",
+    )
+    monitor_parser.add_argument(
+        "--follow-solver-log",
+        action="store_true",
+        dest="follow_solver_log",
+        help="Sleep until the next write predicted from the solver log"
+        " instead of for a fixed time",
+    )
+    monitor_parser.add_argument(
+        "--min-sleep-time",
+        default=1.0,
+        dest="min_sleep_time",
+        type=float,
+        help="Shortest sleep between updates when following the solver log",
+    )
+    monitor_parser.add_argument(
+        "--max-sleep-time",
+        default=60.0,
+        dest="max_sleep_time",
+        type=float,
+        help="Longest sleep between updates when following the solver log",
+    )
+    monitor_parser.add_argument(
+        "--reserve-num-tasks",
+        default=0,
+        dest="reserve_num_tasks",
+        type=int,
+        help="How many task slots to keep free for the tasks of an"
+        " imminent write when following the solver log",
+    )
+    subparsers.add_parser(
+        "usage", help="Show the files and bytes held by each stage"
+    )
+    subparsers.add_parser(
+        "migrate-markers",
+        help="Move reconstruction marker files over to the registry in use",
+    )
+    catalog_parser = subparsers.add_parser(
+        "catalog", help="Query the catalog of the archived times"
+    )
+    catalog_subparsers = catalog_parser.add_subparsers(
+        dest="catalog_command", required=True
+    )
+    catalog_subparsers.add_parser(
+        "sync", help="Add the compressed files that are not cataloged yet"
+    )
+    catalog_subparsers.add_parser(
+        "list", help="List the cataloged compressed files"
+    )
+    find_parser = catalog_subparsers.add_parser(
+        "find", help="Find the compressed files holding some times"
+    )
+    find_parser.add_argument("times", nargs="+")
+    missing_parser = catalog_subparsers.add_parser(
+        "missing", help="List the kept times that are not archived"
+    )
+    missing_parser.add_argument(
+        "--keep-every",
+        required=True,
+        dest="keep_every",
+        type=Decimal,
+        help="How often timesteps are kept",
+    )
+    missing_parser.add_argument(
+        "--start",
+        default=None,
+        dest="start",
+        help="The first time to check (the first archived one by default)",
+    )
+    missing_parser.add_argument(
+        "--end",
+        default=None,
+        dest="end",
+        help="The last time to check (the last archived one by default)",
+    )
+    extract_parser = subparsers.add_parser(
+        "extract", help="Extract times from the archives"
+    )
+    extract_parser.add_argument(
+        "--time",
+        required=True,
+        dest="times",
+        nargs="+",
+        help="The times to extract",
+    )
+    extract_parser.add_argument(
+        "--fields",
+        default=None,
+        dest="fields",
+        nargs="+",
+        help="The fields to extract (all of them by default, and can be"
+        " comma separated)",
+    )
+    extract_parser.add_argument(
+        "--dest",
+        default=Path("."),
+        dest="dest_directory",
+        type=Path,
+        help="Where to extract the times to",
+    )
+    extract_parser.add_argument(
+        "-j",
+        "--num-workers",
+        default=None,
+        dest="num_workers",
+        type=int,
+        help="How many times (or archives) to extract at once",
+    )
+    bench_parser = subparsers.add_parser("bench", help="Run benchmarks")
+    bench_subparsers = bench_parser.add_subparsers(
+        dest="bench_command", required=True
+    )
+    compress_parser = bench_subparsers.add_parser(
+        "compress",
+        help="Compare the codecs and levels the group archives can be"
+        " compressed with",
+    )
+    compress_parser.add_argument(
+        "--times",
+        default=None,
+        dest="times",
+        nargs="+",
+        help="The reconstructed times to compress (defaults to the latest"
+        " --num-times ones)",
+    )
+    compress_parser.add_argument(
+        "--num-times",
+        default=1,
+        dest="num_times",
+        type=int,
+        help="How many of the latest reconstructed times to compress",
+    )
+    compress_parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        dest="synthetic",
+        help="Compress synthetic ASCII fields instead of reconstructed times",
+    )
+    compress_parser.add_argument(
+        "--num-fields",
+        default=4,
+        dest="num_fields",
+        type=int,
+        help="How many synthetic fields to write",
+    )
+    compress_parser.add_argument(
+        "--field-size",
+        default=1 << 24,
+        dest="field_size",
+        type=int,
+        help="The size of each synthetic field in bytes",
+    )
+    compress_parser.add_argument(
+        "--entropy",
+        default=0.5,
+        dest="entropy",
+        type=float,
+        help="The fraction of the synthetic values that are random (the"
+        " others repeat the previous value)",
+    )
+    compress_parser.add_argument(
+        "--codecs",
+        default=None,
+        dest="codecs",
+        nargs="+",
+        choices=CODECS,
+        help="The codecs to try (all the installed ones by default)",
+    )
+    compress_parser.add_argument(
+        "--levels",
+        default=None,
+        dest="levels",
+        nargs="+",
+        type=int,
+        help="The levels to try (a few of each codec by default)",
+    )
+    compress_parser.add_argument(
+        "--threads",
+        default=None,
+        dest="threads",
+        type=int,
+        help="How many threads pigz, zstd and xz compress with",
+    )
+    compress_parser.add_argument(
+        "--window-bytes",
+        default=None,
+        dest="window_bytes",
+        type=int,
+        help="The size of the tars of a compression window (defaults to the"
+        " size of the sample)",
+    )
+    compress_parser.add_argument(
+        "--target-seconds",
+        default=600.0,
+        dest="target_seconds",
+        type=float,
+        help="How long compressing a window may take",
+    )
     return parser
 
 
+def create_listener(
+    keep_every: Decimal,
+    compress_every: Decimal,
+    case_directory: Path,
+    reconstruction_registry: str = "marker",
+    usage: bool = False,
+    max_files: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    quota_command: Optional[str] = None,
+    high_water: float = 0.9,
+    low_water: float = 0.8,
+    detect_write_completion: bool = False,
+    solver_log: Optional[SolverLog] = None,
+    write_quiet_seconds: float = 30.0,
+    reconstruct_batch_size: int = 1,
+    reconstruct_field_parts: int = 1,
+    fields: Optional[List[str]] = None,
+    archive_mode: str = "tar",
+    codec: Optional[Codec] = None,
+    catalog: bool = False,
+    delta_fields: Optional[List[str]] = None,
+    keyframe_every: int = KEYFRAME_EVERY,
+    max_group_bytes: Optional[int] = None,
+    compact_bytes: Optional[int] = None,
+    hold_job_when_draining: bool = False,
+    slurm_job_id: Optional[str] = None,
+    slurm_job_sfile: Optional[str] = None,
+    slurm_compress_sfile: Optional[str] = None,
+) -> OFListener:
+    state = OFFileState(
+        case_directory, reconstruction_registry=reconstruction_registry
+    )
+    tracker = OFUsageTracker(state) if usage else None
+    quota = None
+    if quota_command is not None:
+        quota = QuotaMonitor(
+            max_files=max_files,
+            max_bytes=max_bytes,
+            high_water=high_water,
+            low_water=low_water,
+            quota_command=quota_command,
+        )
+    elif tracker is not None and (max_files or max_bytes):
+        quota = QuotaMonitor(
+            max_files=max_files,
+            max_bytes=max_bytes,
+            high_water=high_water,
+            low_water=low_water,
+            usage=lambda: (tracker.total.files, tracker.total.bytes),
+        )
+    if codec is None:
+        codec = Codec()
+    cluster: Union[LocalJobManager, SlurmJobManager]
+    if slurm_job_id is None:
+        cluster = LocalJobManager(case_directory, codec=codec)
+    elif slurm_job_sfile is None or slurm_compress_sfile is None:
+        raise ValueError(
+            "A Slurm job needs both its sbatch file and the compress template"
+        )
+    else:
+        cluster = SlurmJobManager(
+            case_directory,
+            slurm_job_sfile,
+            slurm_job_id,
+            slurm_compress_sfile,
+            codec=codec,
+        )
+    completion = None
+    if detect_write_completion:
+        completion = WriteCompletionDetector(
+            state, quiet_seconds=write_quiet_seconds, solver_log=solver_log
+        )
+    return OFListener(
+        state=state,
+        keep_every=keep_every,
+        compress_every=compress_every,
+        cluster=cluster,
+        usage=tracker,
+        quota=quota,
+        hold_job_when_draining=hold_job_when_draining,
+        completion=completion,
+        reconstruct_batch_size=reconstruct_batch_size,
+        reconstruct_field_parts=reconstruct_field_parts,
+        fields=fields,
+        archive_mode=archive_mode,
+        codec=codec,
+        catalog=ArchiveCatalog.for_case(case_directory) if catalog else None,
+        delta_fields=delta_fields,
+        keyframe_every=keyframe_every,
+        max_group_bytes=max_group_bytes,
+        compact_bytes=compact_bytes,
+    )
+
+
 def setup(
     keep_every: Decimal,
+    compress_every: Decimal,
     num_simultaneous_tasks: int,
     sleep_time_per_update: int,
     case_directory: Path = Path("."),
+    reconstruction_registry: str = "marker",
 ) -> None:
-    listener = OFListener(keep_every, case_directory)
+    listener = create_listener(
+        keep_every,
+        compress_every,
+        case_directory,
+        reconstruction_registry=reconstruction_registry,
+    )
     task_queue = TaskQueue(num_simultaneous_tasks=num_simultaneous_tasks)
     task_queue.add(*listener.get_cleanup_tasks())
     # Run all the tasks in the task queue to completion before proceeding
@@ -72,31 +606,283 @@ def setup(
     listener.ensure_case_correctness()
 
 
+def report_drain_mode(listener: OFListener, was_draining: bool) -> None:
+    if listener.draining and not was_draining:
+        print(f"Close to the quota {listener.quota}. Draining...")
+    elif was_draining and not listener.draining:
+        print(f"Back under the quota {listener.quota}. Resuming...")
+
+
 def monitor(
     keep_every: Decimal,
+    compress_every: Decimal,
     num_simultaneous_tasks: int,
     sleep_time_per_update: int,
     recheck_every_num_updates: int,
     case_directory: Path = Path("."),
+    reconstruction_registry: str = "marker",
+    max_files: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    quota_command: Optional[str] = None,
+    high_water: float = 0.9,
+    low_water: float = 0.8,
+    drain_num_simultaneous_tasks: Optional[int] = None,
+    detect_write_completion: bool = False,
+    solver_log: Optional[Path] = None,
+    write_quiet_seconds: float = 30.0,
+    follow_solver_log: bool = False,
+    min_sleep_time: float = 1.0,
+    max_sleep_time: float = 60.0,
+    reserve_num_tasks: int = 0,
+    reconstruct_batch_size: int = 1,
+    reconstruct_field_parts: int = 1,
+    fields: Optional[List[str]] = None,
+    archive_mode: str = "tar",
+    codec: Optional[Codec] = None,
+    catalog: bool = False,
+    delta_fields: Optional[List[str]] = None,
+    keyframe_every: int = KEYFRAME_EVERY,
+    max_group_bytes: Optional[int] = None,
+    compact_bytes: Optional[int] = None,
+    hold_job_when_draining: bool = False,
+    slurm_job_id: Optional[str] = None,
+    slurm_job_sfile: Optional[str] = None,
+    slurm_compress_sfile: Optional[str] = None,
 ) -> None:
     num_updates = 0
-    listener = OFListener(keep_every, case_directory)
+    # The same log is followed for write completion and for the schedule
+    log = None
+    if detect_write_completion or follow_solver_log:
+        if solver_log is None:
+            solver_log = find_solver_log(case_directory)
+        if solver_log is not None:
+            log = SolverLog(solver_log)
+    listener = create_listener(
+        keep_every,
+        compress_every,
+        case_directory,
+        reconstruction_registry=reconstruction_registry,
+        usage=True,
+        max_files=max_files,
+        max_bytes=max_bytes,
+        quota_command=quota_command,
+        high_water=high_water,
+        low_water=low_water,
+        detect_write_completion=detect_write_completion,
+        solver_log=log,
+        write_quiet_seconds=write_quiet_seconds,
+        reconstruct_batch_size=reconstruct_batch_size,
+        reconstruct_field_parts=reconstruct_field_parts,
+        fields=fields,
+        archive_mode=archive_mode,
+        codec=codec,
+        catalog=catalog,
+        delta_fields=delta_fields,
+        keyframe_every=keyframe_every,
+        max_group_bytes=max_group_bytes,
+        compact_bytes=compact_bytes,
+        hold_job_when_draining=hold_job_when_draining,
+        slurm_job_id=slurm_job_id,
+        slurm_job_sfile=slurm_job_sfile,
+        slurm_compress_sfile=slurm_compress_sfile,
+    )
+    if drain_num_simultaneous_tasks is None:
+        drain_num_simultaneous_tasks = num_simultaneous_tasks
+    scheduler = None
+    if follow_solver_log:
+        if log is None:
+            print("No solver log found. Sleeping for a fixed time...")
+        else:
+            scheduler = WriteScheduler(
+                log,
+                min_sleep=min_sleep_time,
+                max_sleep=max_sleep_time,
+            )
+    if listener.restore_history():
+        print("Restored the history of the last run")
     task_queue = TaskQueue(num_simultaneous_tasks=num_simultaneous_tasks)
     task_queue.add(*listener.get_new_tasks())
+    listener.save_history()
+    report_drain_mode(listener, was_draining=False)
     while len(task_queue) > 0 or recheck_every_num_updates > 0:
         num_updates += 1
         if len(task_queue) > 0:
             print("\nUpdating task queue")
             task_queue.update()
             print(task_queue)
-        time.sleep(sleep_time_per_update)
+        sleep_time: float = sleep_time_per_update
+        if scheduler is not None:
+            scheduler.update(listener.latest_split_time)
+            sleep_time = scheduler.next_sleep(sleep_time_per_update)
+            if len(task_queue) > 0:
+                # Keep feeding the running tasks
+                sleep_time = min(sleep_time, sleep_time_per_update)
+            if reserve_num_tasks and scheduler.write_is_imminent(sleep_time):
+                task_queue.reserve(reserve_num_tasks)
+        time.sleep(sleep_time)
         # if recheck_every_num_updates <= 0 and len(task_queue) == 0:
         #     return
         if (
             recheck_every_num_updates > 0
             and num_updates % recheck_every_num_updates == 0
         ):
+            was_draining = listener.draining
             task_queue.add(*listener.get_new_tasks())
+            listener.save_history()
+            print(listener.usage)
+            report_drain_mode(listener, was_draining)
+            # Only space freeing tasks get generated while draining so run
+            # as many of them at once as allowed
+            if listener.draining:
+                task_queue.num_simultaneous_tasks = (
+                    drain_num_simultaneous_tasks
+                )
+            else:
+                task_queue.num_simultaneous_tasks = num_simultaneous_tasks
+
+
+def usage(case_directory: Path = Path(".")) -> None:
+    tracker = OFUsageTracker(OFFileState(case_directory))
+    tracker.update()
+    print(tracker)
+
+
+def migrate_markers(
+    case_directory: Path = Path("."), reconstruction_registry: str = "marker"
+) -> None:
+    state = OFFileState(
+        case_directory, reconstruction_registry=reconstruction_registry
+    )
+    migrated = state.migrate_reconstruction_markers()
+    print(f"Migrated {len(migrated)} reconstructed times")
+
+
+def catalog_command(
+    command: str,
+    case_directory: Path = Path("."),
+    times: Optional[List[str]] = None,
+    keep_every: Optional[Decimal] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> None:
+    state = OFFileState(case_directory, require_processor_dirs=False)
+    catalog = ArchiveCatalog.for_case(case_directory)
+    if command == "sync":
+        added = catalog.sync(case_directory, state.get_compressed_files())
+        print(f"Cataloged {len(added)} compressed files")
+    elif command == "list":
+        print(f"{'compressed file':<40}{'times':>8}{'bytes':>16}  range")
+        for record in catalog.archives():
+            print(
+                f"{record.name:<40}{record.num_times:>8}{record.bytes:>16}"
+                f"  {record.first_time}-{record.last_time}"
+                + ("  (indexed)" if record.indexed else "")
+            )
+    elif command == "find":
+        for t in times or []:
+            archived = catalog.find(t)
+            if not archived:
+                print(f"{t}: not archived")
+            for a in archived:
+                location = ""
+                if a.offset is not None:
+                    location = f" at {a.offset}+{a.length}"
+                print(
+                    f"{t}: {a.archive}{location} ({a.bytes} bytes,"
+                    f" sha256 {a.sha256})"
+                )
+    elif command == "missing":
+        assert keep_every is not None
+        missing = catalog.missing_times(keep_every, start, end)
+        for t in missing:
+            print(t)
+        print(f"{len(missing)} kept times are not archived")
+
+
+def extract(
+    times: List[str],
+    case_directory: Path = Path("."),
+    fields: Optional[List[str]] = None,
+    dest_directory: Path = Path("."),
+    num_workers: Optional[int] = None,
+) -> None:
+    if fields is not None:
+        fields = [field for f in fields for field in f.split(",") if field]
+    extracted = extract_times(
+        OFFileState(case_directory, require_processor_dirs=False),
+        times,
+        dest_directory,
+        fields=fields,
+        catalog=find_catalog(case_directory),
+        num_workers=num_workers,
+    )
+    for t, archive in extracted.items():
+        print(f"Extracted {t} from {archive}")
+
+
+def bench_compress(
+    case_directory: Path = Path("."),
+    times: Optional[List[str]] = None,
+    num_times: int = 1,
+    synthetic: bool = False,
+    num_fields: int = 4,
+    field_size: int = 1 << 24,
+    entropy: float = 0.5,
+    codecs: Optional[List[str]] = None,
+    levels: Optional[List[int]] = None,
+    threads: Optional[int] = None,
+    window_bytes: Optional[int] = None,
+    target_seconds: float = 600.0,
+) -> None:
+    with tempfile.TemporaryDirectory() as work_dir:
+        sample_dir = case_directory
+        if synthetic:
+            sample_dir = Path(work_dir) / "sample"
+            members = bench.create_synthetic_sample(
+                sample_dir,
+                num_fields=num_fields,
+                field_size=field_size,
+                entropy=entropy,
+            )
+        elif times is not None:
+            members = times
+        else:
+            members = OFFileState(case_directory).get_reconstructed_times()[
+                -num_times:
+            ]
+        if not members:
+            print("No reconstructed times to compress")
+            return
+        results = bench.run_benchmark(
+            sample_dir,
+            members,
+            Path(work_dir),
+            codecs=codecs,
+            levels=levels,
+            threads=threads,
+        )
+    print(bench.format_results(results))
+    if not results:
+        return
+    if window_bytes is None:
+        window_bytes = results[0].input_bytes
+    best = bench.recommend(results, window_bytes, target_seconds)
+    assert best is not None
+    seconds = window_bytes / best.throughput
+    print(
+        f"\nRecommended: --codec {best.codec.name}"
+        + (
+            ""
+            if best.codec.level is None
+            else f" --compress-level {best.codec.level}"
+        )
+        + (
+            ""
+            if best.codec.threads is None
+            else f" --compress-threads {best.codec.threads}"
+        )
+        + f" (about {seconds:.1f} s per window of {window_bytes} bytes)"
+    )
 
 
 def main() -> None:
@@ -105,15 +891,92 @@ def main() -> None:
     if args.command == "setup":
         setup(
             keep_every=args.keep_every,
+            compress_every=args.compress_every,
             num_simultaneous_tasks=args.num_simultaneous_tasks,
             sleep_time_per_update=args.sleep_time_per_update,
+            case_directory=args.case_directory,
+            reconstruction_registry=args.reconstruction_registry,
         )
     elif args.command == "monitor":
         monitor(
             keep_every=args.keep_every,
+            compress_every=args.compress_every,
             num_simultaneous_tasks=args.num_simultaneous_tasks,
             sleep_time_per_update=args.sleep_time_per_update,
             recheck_every_num_updates=args.recheck_every_num_updates,
+            case_directory=args.case_directory,
+            reconstruction_registry=args.reconstruction_registry,
+            max_files=args.max_files,
+            max_bytes=args.max_bytes,
+            quota_command=args.quota_command,
+            high_water=args.high_water,
+            low_water=args.low_water,
+            drain_num_simultaneous_tasks=args.drain_num_simultaneous_tasks,
+            detect_write_completion=args.detect_write_completion,
+            solver_log=args.solver_log,
+            write_quiet_seconds=args.write_quiet_seconds,
+            follow_solver_log=args.follow_solver_log,
+            min_sleep_time=args.min_sleep_time,
+            max_sleep_time=args.max_sleep_time,
+            reserve_num_tasks=args.reserve_num_tasks,
+            reconstruct_batch_size=args.reconstruct_batch_size,
+            reconstruct_field_parts=args.reconstruct_field_parts,
+            fields=args.fields,
+            archive_mode=args.archive_mode,
+            codec=Codec(
+                args.codec,
+                level=args.compress_level,
+                threads=args.compress_threads,
+                seekable=args.seekable,
+            ),
+            catalog=args.catalog,
+            delta_fields=args.delta_fields,
+            keyframe_every=args.keyframe_every,
+            max_group_bytes=args.max_group_bytes,
+            compact_bytes=args.compact_bytes,
+            hold_job_when_draining=args.hold_job_when_draining,
+            slurm_job_id=args.slurm_job_id,
+            slurm_job_sfile=args.slurm_job_sfile,
+            slurm_compress_sfile=args.slurm_compress_sfile,
+        )
+    elif args.command == "usage":
+        usage(case_directory=args.case_directory)
+    elif args.command == "migrate-markers":
+        migrate_markers(
+            case_directory=args.case_directory,
+            reconstruction_registry=args.reconstruction_registry,
+        )
+    elif args.command == "catalog":
+        catalog_command(
+            args.catalog_command,
+            case_directory=args.case_directory,
+            times=getattr(args, "times", None),
+            keep_every=getattr(args, "keep_every", None),
+            start=getattr(args, "start", None),
+            end=getattr(args, "end", None),
+        )
+    elif args.command == "extract":
+        extract(
+            times=args.times,
+            case_directory=args.case_directory,
+            fields=args.fields,
+            dest_directory=args.dest_directory,
+            num_workers=args.num_workers,
+        )
+    elif args.command == "bench" and args.bench_command == "compress":
+        bench_compress(
+            case_directory=args.case_directory,
+            times=args.times,
+            num_times=args.num_times,
+            synthetic=args.synthetic,
+            num_fields=args.num_fields,
+            field_size=args.field_size,
+            entropy=args.entropy,
+            codecs=args.codecs,
+            levels=args.levels,
+            threads=args.threads,
+            window_bytes=args.window_bytes,
+            target_seconds=args.target_seconds,
         )
 
 
@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+# The top of the repository (where simon can be imported from)
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+
+def module_command(module: str) -> str:
+    # The command that the tasks run a module of simon.archive with (they
+    # can run from any directory)
+    return (
+        f"PYTHONPATH={REPO_ROOT} {sys.executable} -m simon.archive.{module}"
+    )
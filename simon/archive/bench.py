@@ -0,0 +1,244 @@
+# Measure how well (and how fast) each codec compresses a sample of a case.
+#
+# The sample is either some of the reconstructed times of the case or
+# synthetic ASCII field files. It is tarred once and the tar is then piped
+# through the compressor of every codec and level (like tar -I does), timing
+# each run and sampling its peak memory while it runs.
+
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import tarfile
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from simon.archive.codecs import (CODEC_LEVELS, CODECS, THREADED_CODECS,
+                                  Codec)
+
+# The levels to try for each codec when none are given
+DEFAULT_LEVELS: Dict[str, List[Optional[int]]] = {
+    "gzip": [1, 6, 9],
+    "pigz": [1, 6, 9],
+    "zstd": [1, 3, 9, 19],
+    "xz": [0, 6],
+    "lz4": [1, 9],
+    "none": [None],
+}
+# The level each compressor uses when it is not given one
+COMPRESSOR_DEFAULT_LEVELS: Dict[str, int] = {
+    "gzip": 6,
+    "pigz": 6,
+    "zstd": 3,
+    "xz": 6,
+    "lz4": 1,
+}
+# How often to sample the memory of the compressor (in seconds)
+SAMPLE_INTERVAL = 0.005
+FIELD_HEADER = """FoamFile
+{{
+    format      ascii;
+    class       volScalarField;
+    object      {name};
+}}
+
+dimensions      [0 0 0 0 0 0 0];
+
+internalField   nonuniform List<scalar>
+{num_values}
+(
+"""
+
+
+class CompressionResult(NamedTuple):
+    codec: Codec
+    input_bytes: int
+    output_bytes: int
+    seconds: float
+    peak_memory_bytes: int
+
+    @property
+    def ratio(self) -> float:
+        return self.input_bytes / max(self.output_bytes, 1)
+
+    @property
+    def throughput(self) -> float:
+        # Input bytes compressed per second
+        return self.input_bytes / max(self.seconds, 1e-9)
+
+
+def write_synthetic_field(
+    path: Path, size: int, entropy: float, rng: random.Random
+) -> None:
+    # Write an ASCII field of roughly size bytes. entropy is the fraction of
+    # the values that are random, the others repeat the previous value (like
+    # the cells of a uniform region do).
+    if not 0 <= entropy <= 1:
+        raise ValueError(f"entropy must be between 0 and 1 (got {entropy})")
+    values: List[str] = []
+    value = "0"
+    num_bytes = 0
+    while num_bytes < size:
+        if rng.random() < entropy:
+            value = f"{rng.uniform(-1, 1):.6g}"
+        values.append(value)
+        num_bytes += len(value) + 1
+    with open(path, "w") as f:
+        f.write(FIELD_HEADER.format(name=path.name, num_values=len(values)))
+        f.write("\n".join(values))
+        f.write("\n)\n;\n")
+
+
+def create_synthetic_sample(
+    directory: Path,
+    *,
+    num_fields: int = 4,
+    field_size: int = 1 << 20,
+    entropy: float = 0.5,
+    seed: int = 0,
+) -> List[str]:
+    # Create a synthetic time directory in directory and return it (as a
+    # path relative to directory)
+    rng = random.Random(seed)
+    time_dir = directory / "0"
+    time_dir.mkdir(parents=True)
+    for i in range(num_fields):
+        write_synthetic_field(time_dir / f"field{i}", field_size, entropy, rng)
+    return ["0"]
+
+
+def codec_for_level(name: str, level: Optional[int]) -> Codec:
+    # Always give the compressor a level so that it gets run by tar -I (gzip
+    # without a level is left to tar -z)
+    if level is None:
+        level = COMPRESSOR_DEFAULT_LEVELS.get(name)
+    return Codec(name, level=level)
+
+
+def is_available(codec: Codec) -> bool:
+    program = codec.compress_program()
+    return program is None or shutil.which(program.split()[0]) is not None
+
+
+def _read_peak_memory(pid: int) -> Optional[int]:
+    # The peak resident memory of a running process in bytes
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return None
+
+
+def measure(
+    codec: Codec, tar_path: Path, output_path: Path
+) -> CompressionResult:
+    # Pipe tar_path through the compressor of codec into output_path. The
+    # maximum resident size that wait4 reports carries over the memory of
+    # this (forked) process from before the compressor was executed, so the
+    # peak memory of the compressor itself is sampled from /proc while it
+    # runs. wait4 is only relied on when the compressor finished too quickly
+    # to be sampled.
+    program = codec.compress_program()
+    command = ["cat"] if program is None else shlex.split(program)
+    peak_memory: Optional[int] = None
+    with open(tar_path, "rb") as stdin, open(output_path, "wb") as stdout:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdin=stdin, stdout=stdout)
+        while True:
+            sampled = _read_peak_memory(process.pid)
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid != 0:
+                break
+            # Nothing is mapped yet while the compressor is being executed
+            if sampled:
+                peak_memory = max(peak_memory or 0, sampled)
+            time.sleep(SAMPLE_INTERVAL)
+        seconds = time.perf_counter() - start
+    # Popen has to be told that its child has been reaped
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    if peak_memory is None:
+        # ru_maxrss is in kilobytes on Linux
+        peak_memory = rusage.ru_maxrss * 1024
+    return CompressionResult(
+        codec=codec,
+        input_bytes=tar_path.stat().st_size,
+        output_bytes=output_path.stat().st_size,
+        seconds=seconds,
+        peak_memory_bytes=peak_memory,
+    )
+
+
+def _levels_to_try(
+    name: str, levels: Optional[List[int]]
+) -> List[Optional[int]]:
+    # The given levels that the codec supports (or its default ones)
+    if levels is None or name not in CODEC_LEVELS:
+        return DEFAULT_LEVELS[name]
+    lowest, highest = CODEC_LEVELS[name]
+    return [level for level in levels if lowest <= level <= highest]
+
+
+def run_benchmark(
+    case_dir: Path,
+    members: List[str],
+    work_dir: Path,
+    *,
+    codecs: Optional[List[str]] = None,
+    levels: Optional[List[int]] = None,
+    threads: Optional[int] = None,
+) -> List[CompressionResult]:
+    # Compress members (relative to case_dir) with every available codec at
+    # each of levels (or DEFAULT_LEVELS)
+    tar_path = work_dir / "sample.tar"
+    with tarfile.open(tar_path, "w") as tar:
+        for member in members:
+            tar.add(case_dir / member, arcname=member)
+    results: List[CompressionResult] = []
+    for name in codecs or CODECS:
+        for level in _levels_to_try(name, levels):
+            codec = codec_for_level(name, level)
+            if threads is not None and name in THREADED_CODECS:
+                codec = Codec(name, level=codec.level, threads=threads)
+            if not is_available(codec):
+                continue
+            output_path = work_dir / f"compressed.{codec.extension}"
+            results.append(measure(codec, tar_path, output_path))
+            output_path.unlink()
+    return results
+
+
+def recommend(
+    results: List[CompressionResult], window_bytes: int, target_seconds: float
+) -> Optional[CompressionResult]:
+    # The setting with the best ratio that still compresses a window of
+    # window_bytes within target_seconds (or the fastest when none do)
+    if not results:
+        return None
+    fast_enough = [
+        r for r in results if window_bytes / r.throughput <= target_seconds
+    ]
+    if not fast_enough:
+        return max(results, key=lambda r: r.throughput)
+    return max(fast_enough, key=lambda r: (r.ratio, r.throughput))
+
+
+def format_results(results: List[CompressionResult]) -> str:
+    lines = [
+        f"{'codec':<8}{'level':>6}{'threads':>8}{'ratio':>8}"
+        f"{'MB/s':>10}{'peak MB':>10}"
+    ]
+    for r in results:
+        level = "-" if r.codec.level is None else r.codec.level
+        threads = "-" if r.codec.threads is None else r.codec.threads
+        lines.append(
+            f"{r.codec.name:<8}{level:>6}{threads:>8}{r.ratio:>8.2f}"
+            f"{r.throughput / 1e6:>10.1f}{r.peak_memory_bytes / 1e6:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,383 @@
+# A sqlite catalog of the times held by the group archives of a case.
+#
+# Every archive is read once when it gets added, unless it has a manifest
+# of its files (which already has their digests). The index of a seekable
+# archive gives the offset and length of each time; otherwise the archive is
+# streamed through once. For every time, the catalog records the uncompressed
+# size and a sha256 digest of the names and contents of its files (which
+# does not depend on the order the files were archived in), so that
+# finding a time (or checking that every kept time got archived) is a query
+# instead of a tar -tzf of every archive.
+#
+# It is run as a module by the tasks that simon generates:
+#   python -m simon.archive.catalog add CATALOG ARCHIVE...
+
+import argparse
+import gzip
+import hashlib
+import io
+import math
+import sqlite3
+import tarfile
+from contextlib import closing, contextmanager
+from decimal import Decimal
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from simon.archive.codecs import open_tar_stream, split_compressed_extension
+from simon.archive.manifest import (ManifestEntry, manifest_path_of,
+                                    read_manifest)
+from simon.archive.stream import index_path_of, read_index, time_of_member
+
+CATALOG_FILENAME = ".simon_catalog.sqlite"
+# How long to wait for another process that is writing to the catalog
+TIMEOUT = 60.0
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    name TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    extension TEXT NOT NULL,
+    indexed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS times (
+    time TEXT NOT NULL,
+    value REAL NOT NULL,
+    archive TEXT NOT NULL REFERENCES archives (name) ON DELETE CASCADE,
+    frame_offset INTEGER,
+    frame_length INTEGER,
+    bytes INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (archive, time)
+);
+CREATE INDEX IF NOT EXISTS times_by_value ON times (value);
+"""
+
+
+class ArchivedTime(NamedTuple):
+    time: str
+    archive: str
+    # Where the frame of the time is (None when the archive is not seekable)
+    offset: Optional[int]
+    length: Optional[int]
+    # The uncompressed size of the files of the time
+    bytes: int
+    sha256: str
+
+
+class ArchiveRecord(NamedTuple):
+    name: str
+    bytes: int
+    num_times: int
+    first_time: Optional[str]
+    last_time: Optional[str]
+    indexed: bool
+
+
+class _TimeDigest:
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.file_digests: Dict[str, str] = {}
+
+    def add_file(self, name: str, data: IO[bytes], size: int) -> None:
+        sha256 = hashlib.sha256()
+        while chunk := data.read(1 << 20):
+            sha256.update(chunk)
+        self.add_digest(name, sha256.hexdigest(), size)
+
+    def add_digest(self, name: str, sha256: str, size: int) -> None:
+        self.file_digests[name] = sha256
+        self.bytes += size
+
+    def hexdigest(self) -> str:
+        sha256 = hashlib.sha256()
+        for name in sorted(self.file_digests):
+            sha256.update(f"{name}\0{self.file_digests[name]}\n".encode())
+        return sha256.hexdigest()
+
+
+def _digest_tar(
+    tar: tarfile.TarFile, files: Optional[Dict[str, Tuple[str, int]]] = None
+) -> Dict[str, _TimeDigest]:
+    # {time: digest} of the files of every time in the (streamed) tar. The
+    # hard links count as the files they link to, which are looked up in
+    # files ({name: (sha256, size)} of the files seen so far, also of the
+    # earlier frames of a seekable archive).
+    if files is None:
+        files = {}
+    digests: Dict[str, _TimeDigest] = {}
+    for member in tar:
+        t = time_of_member(member.name.split("/")[0])
+        digest = digests.setdefault(t, _TimeDigest())
+        if member.islnk():
+            digest.add_digest(member.name, *files[member.linkname])
+            continue
+        if not member.isfile():
+            continue
+        data = tar.extractfile(member)
+        assert data is not None
+        digest.add_file(member.name, data, member.size)
+        files[member.name] = (
+            digest.file_digests[member.name],
+            member.size,
+        )
+    return digests
+
+
+def _digest_manifest(
+    entries: Dict[str, ManifestEntry]
+) -> Dict[str, _TimeDigest]:
+    # {time: digest} of the files of every time in a manifest
+    digests: Dict[str, _TimeDigest] = {}
+    for entry in entries.values():
+        t = time_of_member(entry.name.split("/")[0])
+        digest = digests.setdefault(t, _TimeDigest())
+        digest.add_digest(entry.name, entry.sha256, entry.size)
+    return digests
+
+
+def scan_archive(path: Path, use_manifest: bool = True) -> List[ArchivedTime]:
+    # Describe every time in a group archive from its manifest, or by
+    # reading it through once when it does not have one (or it is not to be
+    # trusted without use_manifest)
+    path = Path(path)
+    _, extension = split_compressed_extension(path.name)
+    if extension is None:
+        raise ValueError(f"{path} is not a compressed archive")
+    index = read_index(index_path_of(path))
+    manifest: Optional[Dict[str, ManifestEntry]] = None
+    if use_manifest:
+        try:
+            manifest = read_manifest(manifest_path_of(path))
+        except FileNotFoundError:
+            pass
+    if manifest is not None:
+        # Only the indexed times made it into a seekable archive (the
+        # manifest can still have the files of an interrupted append)
+        return [
+            ArchivedTime(
+                t,
+                path.name,
+                index[t][0] if index else None,
+                index[t][1] if index else None,
+                digest.bytes,
+                digest.hexdigest(),
+            )
+            for t, digest in _digest_manifest(manifest).items()
+            if not index or t in index
+        ]
+    archived_times: List[ArchivedTime] = []
+    if index:
+        files: Dict[str, Tuple[str, int]] = {}
+        with open(path, "rb") as f:
+            for t, (offset, length) in index.items():
+                f.seek(offset)
+                frame = gzip.decompress(f.read(length))
+                with tarfile.open(fileobj=io.BytesIO(frame), mode="r|") as tar:
+                    digest = _digest_tar(tar, files).get(t, _TimeDigest())
+                archived_times.append(
+                    ArchivedTime(
+                        t,
+                        path.name,
+                        offset,
+                        length,
+                        digest.bytes,
+                        digest.hexdigest(),
+                    )
+                )
+        return archived_times
+    with open_tar_stream(path) as tar:
+        digests = _digest_tar(tar)
+    return [
+        ArchivedTime(
+            t, path.name, None, None, digest.bytes, digest.hexdigest()
+        )
+        for t, digest in digests.items()
+    ]
+
+
+class ArchiveCatalog:
+    """The times held by the group archives of a case, kept in sqlite"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @classmethod
+    def for_case(cls, case_dir: Path) -> "ArchiveCatalog":
+        return cls(Path(case_dir) / CATALOG_FILENAME)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Commits on success and rolls back on errors
+        with closing(sqlite3.connect(self.path, timeout=TIMEOUT)) as conn:
+            conn.execute("PRAGMA foreign_keys = ON")
+            with conn:
+                yield conn
+
+    def add_archive(self, archive_path: Path) -> List[ArchivedTime]:
+        # (Re)catalog an archive from its contents
+        archive_path = Path(archive_path)
+        archived_times = scan_archive(archive_path)
+        stat = archive_path.stat()
+        _, extension = split_compressed_extension(archive_path.name)
+        with self._connect() as connection:
+            connection.execute(
+                "DELETE FROM archives WHERE name = ?", (archive_path.name,)
+            )
+            connection.execute(
+                "INSERT INTO archives VALUES (?, ?, ?, ?, ?)",
+                (
+                    archive_path.name,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    extension,
+                    int(any(t.offset is not None for t in archived_times)),
+                ),
+            )
+            connection.executemany(
+                "INSERT INTO times VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        t.time,
+                        float(Decimal(t.time)),
+                        t.archive,
+                        t.offset,
+                        t.length,
+                        t.bytes,
+                        t.sha256,
+                    )
+                    for t in archived_times
+                ],
+            )
+        return archived_times
+
+    def remove_archive(self, name: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM archives WHERE name = ?", (name,))
+
+    def uncataloged(self, case_dir: Path, archives: List[str]) -> List[str]:
+        # The archives that are not in the catalog (or have changed since
+        # they were added)
+        with self._connect() as connection:
+            cataloged: Dict[str, Tuple[int, int]] = {
+                name: (size, mtime_ns)
+                for name, size, mtime_ns in connection.execute(
+                    "SELECT name, bytes, mtime_ns FROM archives"
+                )
+            }
+        stale: List[str] = []
+        for name in archives:
+            try:
+                stat = (Path(case_dir) / name).stat()
+            except FileNotFoundError:
+                continue
+            if cataloged.get(name) != (stat.st_size, stat.st_mtime_ns):
+                stale.append(name)
+        return stale
+
+    def sync(self, case_dir: Path, archives: List[str]) -> List[str]:
+        # Bring the catalog in line with the archives of the case
+        with self._connect() as connection:
+            gone = [
+                name
+                for (name,) in connection.execute("SELECT name FROM archives")
+                if name not in archives
+            ]
+        for name in gone:
+            self.remove_archive(name)
+        added = self.uncataloged(case_dir, archives)
+        for name in added:
+            self.add_archive(Path(case_dir) / name)
+        return added
+
+    def find(self, timestamp: str) -> List[ArchivedTime]:
+        # The archives holding timestamp
+        with self._connect() as connection:
+            return [
+                ArchivedTime(*row)
+                for row in connection.execute(
+                    "SELECT time, archive, frame_offset, frame_length, bytes,"
+                    " sha256"
+                    " FROM times WHERE value = ? ORDER BY archive",
+                    (float(Decimal(timestamp)),),
+                )
+            ]
+
+    def times(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> List[str]:
+        # The archived times (within [start, end])
+        query = "SELECT DISTINCT time, value FROM times"
+        conditions: List[str] = []
+        parameters: List[float] = []
+        if start is not None:
+            conditions.append("value >= ?")
+            parameters.append(float(Decimal(start)))
+        if end is not None:
+            conditions.append("value <= ?")
+            parameters.append(float(Decimal(end)))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY value"
+        with self._connect() as connection:
+            return [t for t, _ in connection.execute(query, parameters)]
+
+    def missing_times(
+        self,
+        keep_every: Decimal,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> List[str]:
+        # The multiples of keep_every within [start, end] (the first and last
+        # archived times by default) that are not in any archive
+        archived_times = self.times(start, end)
+        if not archived_times:
+            return []
+        first = Decimal(start if start is not None else archived_times[0])
+        last = Decimal(end if end is not None else archived_times[-1])
+        archived = {Decimal(t) for t in archived_times}
+        missing: List[str] = []
+        i = math.ceil(first / keep_every)
+        while (t := i * keep_every) <= last:
+            if t not in archived:
+                missing.append(format(t.normalize(), "f"))
+            i += 1
+        return missing
+
+    def archives(self) -> List[ArchiveRecord]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT a.name, a.bytes, COUNT(t.time),"
+                " (SELECT time FROM times WHERE archive = a.name"
+                "  ORDER BY value LIMIT 1),"
+                " (SELECT time FROM times WHERE archive = a.name"
+                "  ORDER BY value DESC LIMIT 1),"
+                " a.indexed"
+                " FROM archives a LEFT JOIN times t ON t.archive = a.name"
+                " GROUP BY a.name ORDER BY MIN(t.value)"
+            ).fetchall()
+        return [
+            ArchiveRecord(name, size, num_times, first, last, bool(indexed))
+            for name, size, num_times, first, last, indexed in rows
+        ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Add group archives to a catalog"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add")
+    add_parser.add_argument("catalog", type=Path)
+    add_parser.add_argument("archives", nargs="+", type=Path)
+    args = parser.parse_args(argv)
+    if args.command == "add":
+        catalog = ArchiveCatalog(args.catalog)
+        for archive in args.archives:
+            catalog.add_archive(archive)
+
+
+if __name__ == "__main__":
+    main()
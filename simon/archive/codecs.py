@@ -0,0 +1,228 @@
+# How the group archives get compressed.
+#
+# Every codec is run by tar through --use-compress-program (-I) except for
+# plain gzip, which keeps using tar -z. The extension of the archive carries
+# the codec so that the compressed files can be recognised (and extracted)
+# without having to know how simon was configured when they were written.
+#
+# Seekable gzip archives are written by simon/archive/stream.py instead of
+# tar, with every member compressed as a gzip member of its own and an .idx
+# sidecar holding where each one starts. They are still ordinary .tgz files.
+#
+# tar does not hash what it archives, so the manifest of the files of an
+# archive is written by simon/archive/manifest.py once tar is done (the
+# seekable archives get theirs while they are being written).
+
+import subprocess
+import tarfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from simon.archive import module_command
+
+# {codec: extension}
+CODEC_EXTENSIONS: Dict[str, str] = {
+    "gzip": "tgz",
+    "pigz": "tgz",
+    "zstd": "tar.zst",
+    "xz": "tar.xz",
+    "lz4": "tar.lz4",
+    "none": "tar",
+}
+CODECS = list(CODEC_EXTENSIONS)
+# Longest first so that e.g. tar.zst is matched before tar
+COMPRESSED_EXTENSIONS: List[str] = sorted(
+    set(CODEC_EXTENSIONS.values()), key=len, reverse=True
+)
+# The tar flags to read an archive with each extension (tar only detects
+# some of the compressors on its own)
+EXTENSION_READ_FLAGS: Dict[str, str] = {
+    "tgz": "-z",
+    "tar.zst": "-I zstd",
+    "tar.xz": "-J",
+    "tar.lz4": "-I lz4",
+    "tar": "",
+}
+# How tarfile streams through an archive with each extension, and the
+# programs that decompress the ones it cannot read itself
+TARFILE_STREAM_MODES: Dict[str, str] = {
+    "tgz": "r|gz",
+    "tar.xz": "r|xz",
+    "tar": "r|",
+}
+STREAM_DECOMPRESSORS: Dict[str, str] = {"tar.zst": "zstd", "tar.lz4": "lz4"}
+# (lowest, highest) compression level of each codec
+CODEC_LEVELS: Dict[str, Tuple[int, int]] = {
+    "gzip": (1, 9),
+    "pigz": (0, 11),
+    "zstd": (1, 22),
+    "xz": (0, 9),
+    "lz4": (1, 12),
+}
+# The codecs that can compress with more than one thread
+THREADED_CODECS = ["pigz", "zstd", "xz"]
+# The codecs that can write seekable archives
+SEEKABLE_CODECS = ["gzip"]
+# zstd only goes above level 19 with --ultra
+ZSTD_MAX_NORMAL_LEVEL = 19
+
+
+def split_compressed_extension(filename: str) -> Tuple[str, Optional[str]]:
+    # Split e.g. times_0.1_0.2_0.05.tar.zst into (times_0.1_0.2_0.05,
+    # tar.zst). The extension is None when it is not one of the compressed
+    # extensions.
+    for extension in COMPRESSED_EXTENSIONS:
+        if filename.endswith(f".{extension}"):
+            return filename[: -len(extension) - 1], extension
+    return filename, None
+
+
+def tar_read_flags(filename: str) -> str:
+    # The flags tar needs to list or extract filename
+    _, extension = split_compressed_extension(filename)
+    if extension is None:
+        raise ValueError(f"{filename} is not a compressed archive")
+    return EXTENSION_READ_FLAGS[extension]
+
+
+@contextmanager
+def open_tar_stream(path: Path) -> Iterator[tarfile.TarFile]:
+    # Read through a compressed archive of any codec once, in order
+    _, extension = split_compressed_extension(Path(path).name)
+    if extension is None:
+        raise ValueError(f"{path} is not a compressed archive")
+    if extension in TARFILE_STREAM_MODES:
+        with tarfile.open(path, mode=TARFILE_STREAM_MODES[extension]) as tar:
+            yield tar
+        return
+    process = subprocess.Popen(
+        [STREAM_DECOMPRESSORS[extension], "-dc", str(path)],
+        stdout=subprocess.PIPE,
+    )
+    stdout: IO[bytes] = process.stdout  # type: ignore
+    try:
+        with tarfile.open(fileobj=stdout, mode="r|") as tar:
+            yield tar
+    finally:
+        stdout.close()
+        if process.wait() not in [0, -13]:  # -13 is SIGPIPE
+            raise subprocess.CalledProcessError(
+                process.returncode, process.args
+            )
+
+
+class Codec:
+    """A compressor (with its settings) for tar to write archives through"""
+
+    def __init__(
+        self,
+        name: str = "gzip",
+        level: Optional[int] = None,
+        threads: Optional[int] = None,
+        seekable: bool = False,
+    ) -> None:
+        if name not in CODEC_EXTENSIONS:
+            raise ValueError(
+                f"Unknown codec {name} (choose from {', '.join(CODECS)})"
+            )
+        if level is not None:
+            if name not in CODEC_LEVELS:
+                raise ValueError(f"{name} does not take a compression level")
+            lowest, highest = CODEC_LEVELS[name]
+            if not lowest <= level <= highest:
+                raise ValueError(
+                    f"The {name} compression level must be between {lowest}"
+                    f" and {highest} (got {level})"
+                )
+        if threads is not None:
+            if name not in THREADED_CODECS:
+                raise ValueError(f"{name} does not compress with threads")
+            if threads < 0:
+                raise ValueError(
+                    "The number of threads cannot be negative"
+                    f" (got {threads})"
+                )
+        if seekable and name not in SEEKABLE_CODECS:
+            raise ValueError(f"{name} cannot write seekable archives")
+        self.name = name
+        self.level = level
+        # The threaded codecs use as many threads as there are cores when
+        # this is None or 0
+        self.threads = threads
+        self.seekable = seekable
+
+    def __repr__(self) -> str:
+        return (
+            f"Codec({self.name!r}, level={self.level},"
+            f" threads={self.threads}, seekable={self.seekable})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Codec):
+            return NotImplemented
+        return (self.name, self.level, self.threads, self.seekable) == (
+            other.name,
+            other.level,
+            other.threads,
+            other.seekable,
+        )
+
+    @property
+    def extension(self) -> str:
+        return CODEC_EXTENSIONS[self.name]
+
+    def compress_program(self) -> Optional[str]:
+        # The command tar pipes the archive through (None when tar does the
+        # compression itself or there is none)
+        if self.name == "none":
+            return None
+        if self.name == "gzip" and self.level is None:
+            return None
+        command = [self.name]
+        if self.name == "pigz" and self.threads:
+            command.append(f"-p {self.threads}")
+        elif self.name in ["zstd", "xz"]:
+            command.append(f"-T{0 if self.threads is None else self.threads}")
+        if self.level is not None:
+            if self.name == "zstd" and self.level > ZSTD_MAX_NORMAL_LEVEL:
+                command.append("--ultra")
+            command.append(f"-{self.level}")
+        return " ".join(command)
+
+    def tar_create_command(
+        self,
+        archive: str,
+        index: Optional[str] = None,
+        manifest_file: Optional[str] = None,
+    ) -> str:
+        # The tar command (without the files) that writes archive. The index
+        # of a seekable archive goes to index (or next to archive) and its
+        # manifest to manifest_file. The others get their manifest from
+        # manifest_create_command.
+        if self.seekable:
+            command = f"{module_command('stream')} pack"
+            if index is not None:
+                command += f" --index {index}"
+            if manifest_file is not None:
+                command += f" --manifest {manifest_file}"
+            if self.level is not None:
+                command += f" --level {self.level}"
+            return f"{command} {archive}"
+        if self.name == "gzip" and self.level is None:
+            return f"tar -czvf {archive}"
+        program = self.compress_program()
+        if program is None:
+            return f"tar -cvf {archive}"
+        return f"tar -I '{program}' -cvf {archive}"
+
+    def manifest_create_command(self, manifest_file: str) -> Optional[str]:
+        # The command (without the files) that writes the manifest of the
+        # files of an archive that tar_create_command wrote without one
+        # (None when it already has one)
+        if self.seekable:
+            return None
+        return f"{module_command('manifest')} hash {manifest_file}"
+
+
+GZIP = Codec("gzip")
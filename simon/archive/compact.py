@@ -0,0 +1,424 @@
+# Merge adjacent small group archives into larger ones.
+#
+# Every archive takes an inode, and a smaller compress_every (or a case that
+# writes little, or size bounded groups) leaves many small ones behind.
+# Archives that follow each other (the next one starts one step after the
+# previous one ends, with the same step and codec) are merged into one named
+# after all of their times. Like the levels of an LSM tree, the merged
+# archives get merged again once enough of them are next to each other, up
+# to a target size, so that every time is only rewritten a few times.
+#
+# Seekable archives are merged without decompressing anything: their frames
+# are copied as they are (without the end of archive frame of each) and
+# their indexes are shifted. The others are read through once and their
+# members written straight into the compressor of the merged archive,
+# without extracting anything to disk.
+#
+# The merged archive is written under a temporary name and moved into place
+# after its index and manifest. The archives it is merged from are recorded
+# in <merged archive>.merged before anything is written, and they are only
+# removed (and dropped from the catalog) once all of their times have been
+# read back from it (the same frames, or the same digests when re-encoded).
+# The record goes once they are all gone, so an interrupted compaction can
+# be found from its record and finished by running it again. Nothing is
+# removed for an archive that is not in the record of the merged one.
+#
+# It is run as a module by the tasks that simon generates:
+#   python -m simon.archive.compact [--output OUTPUT] [--catalog CATALOG]
+#       [--compress-program PROGRAM] CASE_DIR ARCHIVE...
+
+import argparse
+import gzip
+import os
+import tarfile
+import zlib
+from contextlib import contextmanager
+from decimal import Decimal
+from pathlib import Path
+from typing import (IO, Dict, Iterable, Iterator, List, NamedTuple, Optional,
+                    Tuple)
+
+from simon.archive.catalog import ArchiveCatalog, scan_archive
+from simon.archive.codecs import (CODEC_EXTENSIONS, Codec, open_tar_stream,
+                                  split_compressed_extension)
+from simon.archive.delta import DELTA_SUFFIX
+from simon.archive.manifest import (CHUNK_SIZE, HashingReader, ManifestEntry,
+                                    manifest_path_of, read_manifest,
+                                    write_compressed, write_manifest)
+from simon.archive.stream import (StreamArchive, index_path_of,
+                                  lock_path_of, read_index, time_of_member)
+
+IN_PROGRESS_SUFFIX = ".inprogress"
+# The record of the archives that an archive was merged from
+MERGED_SUFFIX = ".merged"
+# How many adjacent archives below the target size get merged at once
+FANOUT = 4
+
+
+class _Params(NamedTuple):
+    start: Decimal
+    end: Decimal
+    step: Decimal
+    extension: str
+
+
+def _params(archive: str) -> _Params:
+    base, extension = split_compressed_extension(archive)
+    if extension is None:
+        raise ValueError(f"{archive} is not a compressed archive")
+    _, start, end, step = base.split("_")
+    return _Params(Decimal(start), Decimal(end), Decimal(step), extension)
+
+
+def _follows(previous: _Params, params: _Params) -> bool:
+    return (
+        params.start == previous.end + previous.step
+        and params.step == previous.step
+        and params.extension == previous.extension
+    )
+
+
+def compacted_name(archives: List[str]) -> str:
+    # The name of the archive that archives (in order) get merged into
+    params = [_params(archive) for archive in archives]
+    for previous, (archive, current) in zip(
+        params, zip(archives[1:], params[1:])
+    ):
+        if not _follows(previous, current):
+            raise ValueError(f"{archive} does not follow the archive before")
+    # The times are written as they are in the names of the archives
+    _, start, _, step = split_compressed_extension(archives[0])[0].split("_")
+    end = split_compressed_extension(archives[-1])[0].split("_")[2]
+    return f"times_{start}_{end}_{step}.{params[0].extension}"
+
+
+def plan(
+    archives: Iterable[str],
+    sizes: Dict[str, int],
+    max_bytes: int,
+    seekable: Iterable[str] = (),
+    fanout: int = FANOUT,
+) -> List[List[str]]:
+    # The runs of adjacent archives (all of them smaller than max_bytes and
+    # either all seekable or none) to merge. A run is merged once it holds
+    # fanout archives or once the archive after it cannot join it (it would
+    # take the run over max_bytes, or is not of the same kind). Runs that
+    # are not followed by an archive yet wait for it.
+    seekable = set(seekable)
+    groups: List[List[str]] = []
+    group: List[str] = []
+    num_bytes = 0
+    previous: Optional[_Params] = None
+    for archive in sorted(archives, key=lambda a: _params(a).start):
+        params = _params(archive)
+        size = sizes[archive]
+        if group:
+            assert previous is not None
+            if not _follows(previous, params):
+                group, num_bytes = [], 0
+            elif (
+                size >= max_bytes
+                or num_bytes + size > max_bytes
+                or (archive in seekable) != (group[0] in seekable)
+            ):
+                if len(group) > 1:
+                    groups.append(group)
+                group, num_bytes = [], 0
+        previous = params
+        if size >= max_bytes:
+            continue
+        group.append(archive)
+        num_bytes += size
+        if len(group) >= fanout:
+            groups.append(group)
+            group, num_bytes = [], 0
+    return groups
+
+
+def merged_path_of(archive_path: Path) -> Path:
+    return archive_path.with_name(archive_path.name + MERGED_SUFFIX)
+
+
+def _write_merged(archive_path: Path, archives: List[str]) -> None:
+    path = merged_path_of(archive_path)
+    in_progress = path.with_name(path.name + IN_PROGRESS_SUFFIX)
+    with open(in_progress, "w") as f:
+        f.write("".join(f"{archive}\n" for archive in archives))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(in_progress, path)
+
+
+def read_merged(archive_path: Path) -> List[str]:
+    # The archives that archive_path is (being) merged from, according to
+    # its record (none without one)
+    try:
+        with open(merged_path_of(archive_path)) as f:
+            return [line for line in f.read().split("\n") if line]
+    except FileNotFoundError:
+        return []
+
+
+def find_merged(case_dir: Path) -> Dict[str, List[str]]:
+    # {archive: the archives it is merged from} for the compactions in
+    # case_dir that have not been finished (their records are still there)
+    merged: Dict[str, List[str]] = {}
+    for path in sorted(Path(case_dir).glob(f"times_*{MERGED_SUFFIX}")):
+        archive = path.name[: -len(MERGED_SUFFIX)]
+        merged[archive] = read_merged(path.with_name(archive))
+    return merged
+
+
+def default_compress_program(extension: str) -> Optional[str]:
+    # The compressor of the first codec with extension, at its default
+    # settings (Codec leaves plain gzip to tar -z)
+    name = next(c for c, e in CODEC_EXTENSIONS.items() if e == extension)
+    program = Codec(name).compress_program()
+    return "gzip" if program is None and name == "gzip" else program
+
+
+def _copy_frames(
+    paths: List[Path], out: IO[bytes]
+) -> Tuple[List[str], Optional[List[ManifestEntry]]]:
+    # Copy the frames of the seekable archives in paths to out and return
+    # the lines of the index of the merged archive and its manifest (None
+    # when one of paths has none)
+    lines: List[str] = []
+    entries: Optional[List[ManifestEntry]] = []
+    for path in paths:
+        index = read_index(index_path_of(path))
+        if not index:
+            raise ValueError(f"{path} is not seekable")
+        end = max(o + n for o, n in index.values())
+        base = out.tell()
+        with open(path, "rb") as f:
+            remaining = end
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ValueError(f"{path} ends before its last frame")
+                out.write(chunk)
+                remaining -= len(chunk)
+        lines.extend(f"{t} {base + o} {n}\n" for t, (o, n) in index.items())
+        try:
+            manifest = read_manifest(manifest_path_of(path))
+        except FileNotFoundError:
+            entries = None
+        else:
+            if entries is not None:
+                entries.extend(
+                    entry
+                    for entry in manifest.values()
+                    if time_of_member(entry.name.split("/")[0]) in index
+                )
+    return lines, entries
+
+
+def _merge_seekable(paths: List[Path], output_path: Path) -> None:
+    in_progress = output_path.with_name(
+        output_path.name + IN_PROGRESS_SUFFIX
+    )
+    archive = StreamArchive(in_progress)
+    with open(in_progress, "wb") as f:
+        lines, entries = _copy_frames(paths, f)
+        f.flush()
+        os.fsync(f.fileno())
+    with open(archive.index_path, "w") as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    if entries is None:
+        archive.manifest_path.unlink(missing_ok=True)
+    else:
+        write_manifest(archive.manifest_path, entries)
+    # Closes the tar stream and moves it all into place (nothing else
+    # writes to it so its lock file goes too)
+    archive.finalize(output_path)
+    lock_path_of(in_progress).unlink()
+
+
+@contextmanager
+def _open_members(path: Path) -> Iterator[tarfile.TarFile]:
+    # tarfile stops at the end of the first gzip member, which is only the
+    # first frame of a seekable archive
+    if not index_path_of(path).is_file():
+        with open_tar_stream(path) as tar:
+            yield tar
+        return
+    with gzip.open(path, "rb") as f:
+        with tarfile.open(fileobj=f, mode="r|") as tar:
+            yield tar
+
+
+def _write_members(paths: List[Path], out: IO[bytes]) -> List[ManifestEntry]:
+    # Write the members of the archives in paths to out as a single tar,
+    # hashing the files on the way
+    entries: List[ManifestEntry] = []
+    files: Dict[str, ManifestEntry] = {}
+    with tarfile.open(
+        fileobj=out, mode="w|", format=tarfile.GNU_FORMAT
+    ) as merged:
+        for path in paths:
+            with _open_members(path) as tar:
+                for member in tar:
+                    if member.name.endswith(DELTA_SUFFIX):
+                        # Only restored against the frames before it
+                        raise ValueError(
+                            f"{path.name} has patches so it can only be"
+                            " merged with seekable archives"
+                        )
+                    if not member.isreg():
+                        merged.addfile(member)
+                        if member.islnk() and member.linkname in files:
+                            target = files[member.linkname]
+                            entries.append(
+                                target._replace(name=member.name)
+                            )
+                        continue
+                    reader = HashingReader(
+                        tar.extractfile(member)  # type: ignore
+                    )
+                    merged.addfile(member, reader)  # type: ignore
+                    entry = ManifestEntry(
+                        member.name, member.size, reader.sha256.hexdigest()
+                    )
+                    files[member.name] = entry
+                    entries.append(entry)
+    return entries
+
+
+def _reencode(
+    paths: List[Path], output_path: Path, compress_program: Optional[str]
+) -> None:
+    in_progress = output_path.with_name(
+        output_path.name + IN_PROGRESS_SUFFIX
+    )
+    entries = write_compressed(
+        in_progress,
+        lambda out: _write_members(paths, out),
+        compress_program,
+    )
+    write_manifest(manifest_path_of(in_progress), entries)
+    os.replace(manifest_path_of(in_progress), manifest_path_of(output_path))
+    os.replace(in_progress, output_path)
+
+
+def _frame_checksums(path: Path) -> Dict[str, Tuple[int, int]]:
+    # {time: (length, CRC-32)} of the frames of a seekable archive
+    checksums: Dict[str, Tuple[int, int]] = {}
+    with open(path, "rb") as f:
+        for t, (offset, length) in read_index(index_path_of(path)).items():
+            f.seek(offset)
+            crc = 0
+            remaining = length
+            while remaining and (chunk := f.read(min(CHUNK_SIZE, remaining))):
+                crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+            checksums[t] = (length - remaining, crc)
+    return checksums
+
+
+def _check_merged(output_path: Path, paths: List[Path]) -> None:
+    # Every time of paths has to be in output_path with the same contents.
+    # What was written is read back rather than taken from the manifest of
+    # output_path (which is made from the manifests of paths): the copied
+    # frames have to be the same bytes and the re-encoded times have to
+    # have the same digests.
+    if index_path_of(output_path).is_file() and all(
+        index_path_of(path).is_file() for path in paths
+    ):
+        frames = _frame_checksums(output_path)
+        for path in paths:
+            for t, checksum in _frame_checksums(path).items():
+                if frames.get(t) != checksum:
+                    raise ValueError(
+                        f"The frame of {t} of {path.name} is not in"
+                        f" {output_path.name}"
+                    )
+        return
+    merged: Dict[str, str] = {
+        t.time: t.sha256
+        for t in scan_archive(output_path, use_manifest=False)
+    }
+    for path in paths:
+        for archived in scan_archive(path):
+            if merged.get(archived.time) != archived.sha256:
+                raise ValueError(
+                    f"{archived.time} of {path.name} is not in"
+                    f" {output_path.name}"
+                )
+
+
+def compact(
+    case_dir: Path,
+    archives: List[str],
+    *,
+    output: Optional[str] = None,
+    compress_program: Optional[str] = None,
+    catalog: Optional[ArchiveCatalog] = None,
+) -> str:
+    # Merge archives (adjacent, in order) into output (named after them by
+    # default), remove them and return output. When output already exists
+    # (the compaction was interrupted after moving it into place) whichever
+    # of archives are left are only checked against it and removed, as long
+    # as its record says that it was merged from them.
+    case_dir = Path(case_dir)
+    if output is None:
+        output = compacted_name(archives)
+    output_path = case_dir / output
+    paths = [case_dir / archive for archive in archives]
+    if output_path.exists():
+        recorded = read_merged(output_path)
+        if not set(archives) <= set(recorded):
+            raise ValueError(
+                f"{output} was not merged from {', '.join(archives)}"
+            )
+    else:
+        if compacted_name(archives) != output:
+            raise ValueError(f"{', '.join(archives)} do not make {output}")
+        recorded = archives
+        _write_merged(output_path, archives)
+        if all(index_path_of(path).is_file() for path in paths):
+            _merge_seekable(paths, output_path)
+        else:
+            if compress_program is None:
+                compress_program = default_compress_program(
+                    _params(output).extension
+                )
+            _reencode(paths, output_path, compress_program)
+    paths = [path for path in paths if path.exists()]
+    _check_merged(output_path, paths)
+    for path in paths:
+        for sidecar in [index_path_of(path), manifest_path_of(path)]:
+            sidecar.unlink(missing_ok=True)
+        path.unlink()
+    if catalog is not None:
+        catalog.add_archive(output_path)
+        for archive in archives:
+            catalog.remove_archive(archive)
+    if not any((case_dir / archive).exists() for archive in recorded):
+        merged_path_of(output_path).unlink(missing_ok=True)
+    return output
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Merge adjacent group archives into one"
+    )
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--catalog", default=None, type=Path)
+    parser.add_argument("--compress-program", default=None)
+    parser.add_argument("case_dir", type=Path)
+    parser.add_argument("archives", nargs="+")
+    args = parser.parse_args(argv)
+    compact(
+        args.case_dir,
+        args.archives,
+        output=args.output,
+        compress_program=args.compress_program,
+        catalog=None if args.catalog is None else ArchiveCatalog(args.catalog),
+    )
+
+
+if __name__ == "__main__":
+    main()
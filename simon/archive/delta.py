@@ -0,0 +1,53 @@
+# Store a file as the difference from an earlier version of it.
+#
+# The fields of successive times of a case are often nearly the same, but
+# gzip only looks 32 KiB back so it cannot tell. zstd can compress a file
+# against a reference file (--patch-from) with a window that covers the
+# whole reference, which leaves only what changed. The patches are made and
+# applied by the zstd command line so that nothing has to be installed for
+# Python.
+
+import shutil
+import subprocess
+from pathlib import Path
+
+# What the patch of a field gets named after in the archives
+DELTA_SUFFIX = ".zpatch"
+DELTA_LEVEL = 3
+# How many times of a field are stored in full: one in every KEYFRAME_EVERY
+# (the others are patches against the latest full one)
+KEYFRAME_EVERY = 8
+ZSTD = "zstd"
+
+
+def is_available() -> bool:
+    return shutil.which(ZSTD) is not None
+
+
+def encode(reference: Path, path: Path, level: int = DELTA_LEVEL) -> bytes:
+    # The patch that turns reference into path
+    return subprocess.run(
+        [ZSTD, "-q", "-c", f"-{level}", f"--patch-from={reference}", path],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+
+
+def decode(reference: Path, patch: Path, out: Path) -> None:
+    # Apply the patch made by encode to reference and write the result to
+    # out. The window of a patch is as large as its reference so it has to
+    # be allowed to be larger than the default limit of zstd.
+    subprocess.run(
+        [
+            ZSTD,
+            "-q",
+            "-d",
+            "-f",
+            "--long=31",
+            f"--patch-from={reference}",
+            patch,
+            "-o",
+            out,
+        ],
+        check=True,
+    )
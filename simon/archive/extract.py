@@ -0,0 +1,136 @@
+# Pull single times (or some of their fields) back out of the archives.
+#
+# A time is looked for in its <time>.tar, then in the catalog (when the case
+# has one) and then in the compressed files by their names. Only the frame of
+# the time (and the frames of the files it links to) is read from seekable
+# archives; other compressed files are read up to the end of the time, once
+# for all the times wanted from them.
+
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from simon.archive.catalog import CATALOG_FILENAME, ArchiveCatalog
+from simon.archive.codecs import open_tar_stream
+from simon.archive.stream import StreamArchive, extract_members
+from simon.openfoam.file_state import OFFileState
+
+
+class ArchiveLocation(NamedTuple):
+    archive: str
+    # Whether the time has a frame of its own in the archive
+    seekable: bool
+
+
+def find_catalog(case_dir: Path) -> Optional[ArchiveCatalog]:
+    # The catalog of the case if it has one (opening a catalog creates it)
+    if not (Path(case_dir) / CATALOG_FILENAME).is_file():
+        return None
+    return ArchiveCatalog.for_case(case_dir)
+
+
+def locate(
+    state: OFFileState,
+    timestamp: str,
+    catalog: Optional[ArchiveCatalog] = None,
+) -> Optional[ArchiveLocation]:
+    if state.is_tarred(timestamp):
+        return ArchiveLocation(f"{timestamp}.tar", seekable=False)
+    if catalog is not None:
+        for archived in catalog.find(timestamp):
+            if (state.case_dir / archived.archive).is_file():
+                return ArchiveLocation(
+                    archived.archive, seekable=archived.offset is not None
+                )
+    compressed_file = state.find_compressed_file(timestamp)
+    if compressed_file is None:
+        return None
+    index = state.get_compressed_file_index(compressed_file)
+    return ArchiveLocation(compressed_file, seekable=timestamp in index)
+
+
+def _extract_from_archive(
+    case_dir: Path,
+    archive: str,
+    timestamps: Set[str],
+    dest_dir: Path,
+    fields: Optional[List[str]],
+) -> Set[str]:
+    archive_path = Path(case_dir) / archive
+    if archive.endswith(".tar") and not archive.startswith("times_"):
+        with tarfile.open(archive_path, mode="r|") as tar:
+            return extract_members(tar, timestamps, dest_dir, fields)
+    with open_tar_stream(archive_path) as tar:
+        return extract_members(tar, timestamps, dest_dir, fields)
+
+
+def _extract_frame(
+    case_dir: Path,
+    archive: str,
+    timestamp: str,
+    dest_dir: Path,
+    fields: Optional[List[str]],
+) -> Set[str]:
+    StreamArchive(Path(case_dir) / archive).extract(
+        timestamp, dest_dir, fields
+    )
+    return {timestamp}
+
+
+def extract_times(
+    state: OFFileState,
+    timestamps: List[str],
+    dest_dir: Path,
+    *,
+    fields: Optional[List[str]] = None,
+    catalog: Optional[ArchiveCatalog] = None,
+    num_workers: Optional[int] = None,
+) -> Dict[str, str]:
+    # Extract timestamps (only fields of them when given) into dest_dir and
+    # return the archive each one came from. Seekable times are extracted
+    # concurrently, as are the archives that have to be read through.
+    locations: Dict[str, ArchiveLocation] = {}
+    for t in timestamps:
+        location = locate(state, t, catalog)
+        if location is None:
+            raise FileNotFoundError(f"{t} is not in any archive")
+        locations[t] = location
+    # The times to read through each archive for
+    read_through: Dict[str, Set[str]] = {}
+    for t, location in locations.items():
+        if not location.seekable:
+            read_through.setdefault(location.archive, set()).add(t)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        futures = [
+            pool.submit(
+                _extract_frame,
+                state.case_dir,
+                location.archive,
+                t,
+                dest_dir,
+                fields,
+            )
+            for t, location in locations.items()
+            if location.seekable
+        ] + [
+            pool.submit(
+                _extract_from_archive,
+                state.case_dir,
+                archive,
+                times,
+                dest_dir,
+                fields,
+            )
+            for archive, times in read_through.items()
+        ]
+        extracted: Set[str] = set()
+        for future in futures:
+            extracted.update(future.result())
+    if missing := set(timestamps) - extracted:
+        raise FileNotFoundError(
+            f"{', '.join(sorted(missing))} could not be found in"
+            f" {', '.join(sorted({locations[t].archive for t in missing}))}"
+        )
+    return {t: location.archive for t, location in locations.items()}
@@ -0,0 +1,498 @@
+# A sha256 manifest of the files that went into an archive.
+#
+# Every file is hashed while it is being written to the archive (each read
+# of its contents also goes through the hash) so that the manifest costs no
+# extra read. <archive>.sha256 holds a "sha256 size name" line for every
+# file, named like it is in the archive (relative to the directory the
+# archive was written from).
+#
+# The group archives that tar writes itself get their manifest afterwards
+# instead, from the files that went into them (which costs reading them
+# again).
+#
+# The tars of single times carry their manifest as their last member
+# instead (named like the <archive>.sha256 it replaces) so that they do not
+# take a second inode each.
+#
+# The sources of an archive are checked against its manifest before they
+# get deleted. That only needs their sizes (and the manifest) instead of
+# reading the archive back. Archives written before there were manifests
+# are listed instead.
+#
+# The manifest of an archive also says which contents it already holds. A
+# file with the same contents as one that is already in the archive can be
+# stored as a (tar) hard link to it instead. Only the files with the size of
+# a file in the archive get hashed to find out.
+#
+# It is run as a module by the tasks that simon generates:
+#   python -m simon.archive.manifest tar [--directory DIR]
+#       [--exclude NAME]... [--manifest MANIFEST | --manifest-member NAME]
+#       [--compress-program PROGRAM] ARCHIVE MEMBER...
+#   python -m simon.archive.manifest hash [--directory DIR]
+#       [--exclude NAME]... MANIFEST MEMBER...
+#   python -m simon.archive.manifest verify [--directory DIR]
+#       [--exclude NAME]... ARCHIVE NAME... [--fields FIELD...]
+
+import argparse
+import hashlib
+import io
+import os
+import shlex
+import subprocess
+import sys
+import tarfile
+import time
+from pathlib import Path
+from typing import (IO, Callable, Dict, Iterable, Iterator, List,
+                    NamedTuple, Optional, Tuple)
+
+MANIFEST_SUFFIX = ".sha256"
+# How much of a file gets hashed at a time
+CHUNK_SIZE = 1 << 20
+
+
+class ManifestEntry(NamedTuple):
+    name: str
+    size: int
+    sha256: str
+
+
+class HashingReader:
+    """A file that hashes everything that gets read from it"""
+
+    def __init__(self, f: IO[bytes]) -> None:
+        self._f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.sha256.update(data)
+        return data
+
+
+class ContentIndex:
+    """The contents already in an archive, by size and then digest"""
+
+    def __init__(self, entries: Iterable[ManifestEntry] = ()) -> None:
+        # {size: {sha256: name of the first file with those contents}}
+        self._names: Dict[int, Dict[str, str]] = {}
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: ManifestEntry) -> None:
+        self._names.setdefault(entry.size, {}).setdefault(
+            entry.sha256, entry.name
+        )
+
+    def find(self, path: Path, size: int) -> Optional[Tuple[str, str]]:
+        # (name, sha256) of the file in the archive with the contents of
+        # path. Empty files are not worth linking to.
+        if size == 0 or size not in self._names:
+            return None
+        sha256 = file_sha256(path)
+        name = self._names[size].get(sha256)
+        return None if name is None else (name, sha256)
+
+
+def file_sha256(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def manifest_path_of(archive_path: Path) -> Path:
+    return archive_path.with_name(archive_path.name + MANIFEST_SUFFIX)
+
+
+def read_manifest(manifest_path: Path) -> Dict[str, ManifestEntry]:
+    # {name: entry} for every complete line of the manifest. A file that is
+    # in it more than once (from an interrupted append) counts as its last
+    # line.
+    with open(manifest_path) as f:
+        return parse_manifest(f.read())
+
+
+def read_embedded_manifest(
+    archive_path: Path, member: str
+) -> Optional[Dict[str, ManifestEntry]]:
+    # The manifest that an (uncompressed) tar holds as its member, None when
+    # it does not have one. Only the headers of the other members are read.
+    with tarfile.open(archive_path, mode="r:") as tar:
+        for info in tar:
+            if info.name == member and info.isreg():
+                data = tar.extractfile(info)
+                assert data is not None
+                return parse_manifest(data.read().decode())
+    return None
+
+
+def parse_manifest(contents: str) -> Dict[str, ManifestEntry]:
+    entries: Dict[str, ManifestEntry] = {}
+    # Ignore a trailing line that has not been completely written yet
+    for line in contents.split("\n")[:-1]:
+        if not line:
+            continue
+        sha256, size, name = line.split(" ", 2)
+        entries[name] = ManifestEntry(name, int(size), sha256)
+    return entries
+
+
+def write_manifest(
+    manifest_path: Path, entries: List[ManifestEntry], append: bool = False
+) -> None:
+    with open(manifest_path, "a" if append else "w") as f:
+        f.write(format_manifest(entries))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def format_manifest(entries: List[ManifestEntry]) -> str:
+    return "".join(
+        f"{entry.sha256} {entry.size} {entry.name}\n" for entry in entries
+    )
+
+
+def add_path(
+    tar: tarfile.TarFile,
+    path: Path,
+    arcname: str,
+    contents: Optional[ContentIndex] = None,
+) -> Optional[ManifestEntry]:
+    # Add a single path (not what is in it) to tar, hashing it on the way
+    # when it is a regular file. With contents, a file whose contents are
+    # already in the archive is added as a hard link to them (it is still in
+    # the manifest with its own size).
+    info = tar.gettarinfo(path, arcname=arcname)
+    if not info.isreg():
+        tar.addfile(info)
+        return None
+    if contents is not None and (found := contents.find(path, info.size)):
+        linkname, sha256 = found
+        size = info.size
+        info.type = tarfile.LNKTYPE
+        info.linkname = linkname
+        info.size = 0
+        tar.addfile(info)
+        return ManifestEntry(arcname, size, sha256)
+    with open(path, "rb") as f:
+        reader = HashingReader(f)
+        tar.addfile(info, reader)  # type: ignore
+    entry = ManifestEntry(arcname, info.size, reader.sha256.hexdigest())
+    if contents is not None:
+        contents.add(entry)
+    return entry
+
+
+def _iter_paths(path: Path, excludes: List[str]) -> Iterator[Path]:
+    # path and everything in it in a stable order
+    yield path
+    if not path.is_dir() or path.is_symlink():
+        return
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in excludes)
+        for name in sorted(files):
+            if name not in excludes:
+                yield Path(root) / name
+        for name in dirs:
+            yield Path(root) / name
+
+
+def write_tar(
+    out: IO[bytes],
+    members: List[str],
+    *,
+    directory: Path = Path("."),
+    excludes: Optional[List[str]] = None,
+    manifest_member: Optional[str] = None,
+) -> List[ManifestEntry]:
+    # Write members (relative to directory) to out as a tar and return the
+    # manifest of its files, which also goes at the end of the tar as
+    # manifest_member when it is given
+    entries: List[ManifestEntry] = []
+    with tarfile.open(
+        fileobj=out, mode="w|", format=tarfile.GNU_FORMAT
+    ) as tar:
+        for member in members:
+            for path in _iter_paths(directory / member, excludes or []):
+                arcname = str(path.relative_to(directory))
+                if entry := add_path(tar, path, arcname):
+                    entries.append(entry)
+        if manifest_member is not None:
+            data = format_manifest(entries).encode()
+            info = tarfile.TarInfo(manifest_member)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return entries
+
+
+def write_compressed(
+    archive_path: Path,
+    write: Callable[[IO[bytes]], List[ManifestEntry]],
+    compress_program: Optional[str] = None,
+) -> List[ManifestEntry]:
+    # Have write write a tar to archive_path (through compress_program when
+    # given) and return the manifest it returns
+    with open(archive_path, "wb") as f:
+        if compress_program is None:
+            entries = write(f)
+        else:
+            process = subprocess.Popen(
+                shlex.split(compress_program), stdin=subprocess.PIPE, stdout=f
+            )
+            stdin: IO[bytes] = process.stdin  # type: ignore
+            broken_pipe: Optional[BrokenPipeError] = None
+            try:
+                entries = write(stdin)
+            except BrokenPipeError as e:
+                # The compressor went away (its exit status says why)
+                broken_pipe = e
+            finally:
+                try:
+                    stdin.close()
+                except BrokenPipeError:
+                    pass
+                process.wait()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(
+                    process.returncode, process.args
+                )
+            if broken_pipe is not None:
+                raise broken_pipe
+        f.flush()
+        os.fsync(f.fileno())
+    return entries
+
+
+def create_archive(
+    archive_path: Path,
+    members: List[str],
+    *,
+    directory: Path = Path("."),
+    excludes: Optional[List[str]] = None,
+    manifest_path: Optional[Path] = None,
+    manifest_member: Optional[str] = None,
+    compress_program: Optional[str] = None,
+) -> List[ManifestEntry]:
+    # Write members to archive_path (through compress_program when given)
+    # along with its manifest (next to the archive by default, or inside it
+    # as manifest_member)
+    archive_path = Path(archive_path)
+    if manifest_path is None:
+        manifest_path = manifest_path_of(archive_path)
+    entries = write_compressed(
+        archive_path,
+        lambda out: write_tar(
+            out,
+            members,
+            directory=directory,
+            excludes=excludes,
+            manifest_member=manifest_member,
+        ),
+        compress_program,
+    )
+    if manifest_member is None:
+        write_manifest(manifest_path, entries)
+    return entries
+
+
+def hash_members(
+    members: List[str],
+    *,
+    directory: Path = Path("."),
+    excludes: Optional[List[str]] = None,
+) -> List[ManifestEntry]:
+    # The manifest of the files of members (relative to directory) named
+    # like tar names them when it archives members from directory
+    entries: List[ManifestEntry] = []
+    for member in members:
+        for path in _iter_paths(directory / member, excludes or []):
+            if path.is_symlink() or not path.is_file():
+                continue
+            entries.append(
+                ManifestEntry(
+                    str(path.relative_to(directory)),
+                    path.stat().st_size,
+                    file_sha256(path),
+                )
+            )
+    return entries
+
+
+def _list_archive(
+    archive_path: Path, directory: Path
+) -> Dict[str, ManifestEntry]:
+    # What a manifest of an archive that does not have one would hold
+    # (without the digests, which would need the whole archive to be read).
+    # The tars of the times used to be written from their absolute paths so
+    # their names are made relative to directory again.
+    from simon.archive.codecs import (open_tar_stream,
+                                      split_compressed_extension)
+
+    _, extension = split_compressed_extension(archive_path.name)
+    if extension is None:
+        # The stream archives that have not been finalized yet
+        opened = tarfile.open(archive_path, mode="r|*")
+    else:
+        opened = open_tar_stream(archive_path)
+    prefix = f"{str(directory.resolve()).strip('/')}/"
+    # The hard links have the size of the file they link to
+    sizes: Dict[str, int] = {}
+    entries: Dict[str, ManifestEntry] = {}
+    with opened as tar:
+        for member in tar:
+            if member.isreg():
+                size = sizes[member.name] = member.size
+            elif member.islnk():
+                size = sizes.get(member.linkname, 0)
+            else:
+                continue
+            name = member.name
+            if name.startswith(prefix):
+                name = name[len(prefix) :]
+            entries[name] = ManifestEntry(name, size, "")
+    return entries
+
+
+def _iter_sources(
+    path: Path, excludes: List[str], fields: Optional[List[str]]
+) -> Iterator[Path]:
+    # The files in the directory path that go into its archives: only the
+    # given fields (and everything in the subdirectories) are kept at the
+    # top of it when fields is not None
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in excludes)
+        at_top = Path(root) == path
+        for name in sorted(files):
+            if name in excludes:
+                continue
+            if at_top and fields is not None and name not in fields:
+                continue
+            yield Path(root) / name
+
+
+def verify(
+    archive_path: Path,
+    names: List[str],
+    directory: Path = Path("."),
+    manifest_path: Optional[Path] = None,
+    *,
+    excludes: Optional[List[str]] = None,
+    fields: Optional[List[str]] = None,
+) -> List[str]:
+    # Check that the files of names (relative to directory) are all in the
+    # manifest of the archive with the size they have now. The files of a
+    # directory that were left out of it on purpose (excludes and, at its
+    # top, whatever is not one of fields) do not have to be. Returns what
+    # is wrong (nothing when they can be deleted).
+    archive_path = Path(archive_path)
+    if manifest_path is None:
+        manifest_path = manifest_path_of(archive_path)
+    if not archive_path.is_file():
+        return [f"{archive_path} does not exist"]
+    entries: Optional[Dict[str, ManifestEntry]] = None
+    try:
+        entries = read_manifest(manifest_path)
+    except FileNotFoundError:
+        if archive_path.name.endswith(".tar"):
+            entries = read_embedded_manifest(archive_path, manifest_path.name)
+    if entries is None:
+        entries = _list_archive(archive_path, directory)
+    problems: List[str] = []
+    for name in names:
+        path = directory / name
+        if path.is_dir() and not path.is_symlink():
+            sources = list(_iter_sources(path, excludes or [], fields))
+            prefix = f"{name.rstrip('/')}/"
+            if not any(e.startswith(prefix) for e in entries):
+                problems.append(f"Nothing in {name} is in {archive_path}")
+                continue
+        elif path.is_file():
+            sources = [path]
+        else:
+            # Nothing left to delete
+            continue
+        for source in sources:
+            source_name = str(source.relative_to(directory))
+            if source_name not in entries:
+                problems.append(f"{source_name} is not in {archive_path}")
+                continue
+            entry = entries[source_name]
+            try:
+                size = source.stat().st_size
+            except FileNotFoundError:
+                continue
+            if size != entry.size:
+                problems.append(
+                    f"{entry.name} is {size} bytes but {entry.size} bytes"
+                    f" were archived in {archive_path}"
+                )
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Write archives with a manifest and check their sources"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    tar_parser = subparsers.add_parser("tar")
+    tar_parser.add_argument("--directory", default=Path("."), type=Path)
+    tar_parser.add_argument(
+        "--exclude", action="append", default=[], dest="excludes"
+    )
+    manifest_group = tar_parser.add_mutually_exclusive_group()
+    manifest_group.add_argument("--manifest", default=None, type=Path)
+    manifest_group.add_argument("--manifest-member", default=None)
+    tar_parser.add_argument("--compress-program", default=None)
+    tar_parser.add_argument("archive", type=Path)
+    tar_parser.add_argument("members", nargs="+")
+    hash_parser = subparsers.add_parser("hash")
+    hash_parser.add_argument("--directory", default=Path("."), type=Path)
+    hash_parser.add_argument(
+        "--exclude", action="append", default=[], dest="excludes"
+    )
+    hash_parser.add_argument("manifest", type=Path)
+    hash_parser.add_argument("members", nargs="+")
+    verify_parser = subparsers.add_parser("verify")
+    verify_parser.add_argument("--directory", default=Path("."), type=Path)
+    verify_parser.add_argument(
+        "--exclude", action="append", default=[], dest="excludes"
+    )
+    verify_parser.add_argument("--fields", nargs="+", default=None)
+    verify_parser.add_argument("archive", type=Path)
+    verify_parser.add_argument("names", nargs="+")
+    args = parser.parse_args(argv)
+    if args.command == "tar":
+        create_archive(
+            args.archive,
+            args.members,
+            directory=args.directory,
+            excludes=args.excludes,
+            manifest_path=args.manifest,
+            manifest_member=args.manifest_member,
+            compress_program=args.compress_program,
+        )
+    elif args.command == "hash":
+        write_manifest(
+            args.manifest,
+            hash_members(
+                args.members, directory=args.directory, excludes=args.excludes
+            ),
+        )
+    elif args.command == "verify":
+        problems = verify(
+            args.archive,
+            args.names,
+            args.directory,
+            excludes=args.excludes,
+            fields=args.fields,
+        )
+        if problems:
+            sys.exit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,694 @@
+# Append time directories straight into a compressed group archive.
+#
+# The archive is a series of independently compressed gzip members (frames),
+# one per time, each holding the tar members of that time without the tar
+# end of archive blocks. Concatenated gzip members decompress as a single
+# stream, so once the end of archive blocks are appended in a last frame,
+# the whole file is an ordinary .tgz that tar can read. <archive>.idx lists
+# the time, byte offset and byte length of every complete frame.
+#
+# Since every time is a frame of its own, a single time can be extracted by
+# only reading (and decompressing) the bytes of its frame.
+#
+# The files of every frame are hashed while they are written and added to
+# the manifest of the archive (see simon/archive/manifest.py). An append
+# only succeeds once its files have been checked against the manifest, so
+# that the time can be deleted right after it. Once the archive has been
+# finalized, appends to it are refused for as long as the finished archive
+# is there.
+#
+# A file with the same contents as a file of an earlier frame (a static
+# field, polyMesh of a case whose mesh does not move, ...) is stored as a
+# hard link to it, so every content is only compressed once per archive.
+# Links only point to files stored in full under their own names, so a plain
+# tar -x restores them. Extracting a single time also reads the frames that
+# its links point to.
+#
+# Some fields can also be stored as zstd patches (<field>.zpatch, see
+# simon/archive/delta.py) against the latest earlier frame that holds them in
+# full. Every keyframe_every-th time of such a field is stored in full so
+# that restoring one takes a single patch and the frames are not all tied to
+# the first one. The frames are ordinary tar members either way, so a patched
+# field is only restored by extracting its time through this module (a plain
+# tar -x leaves its patches as they are).
+#
+# It is run as a module by the tasks that simon generates:
+#   python -m simon.archive.stream append ARCHIVE CASE_DIR TIME
+#       [--exclude NAME]... [--delta FIELD...] [--keyframe-every N]
+#       [--delta-level LEVEL]
+#   python -m simon.archive.stream finalize ARCHIVE FINAL_ARCHIVE
+#   python -m simon.archive.stream pack [--index INDEX] [--manifest MANIFEST]
+#       ARCHIVE MEMBER...
+#   python -m simon.archive.stream extract ARCHIVE TIME DEST_DIR
+
+import argparse
+import copy
+import fcntl
+import gzip
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from simon.archive import delta
+from simon.archive.manifest import (ContentIndex, ManifestEntry, add_path,
+                                    file_sha256, manifest_path_of,
+                                    read_manifest, write_manifest)
+from simon.archive.manifest import verify as verify_manifest
+
+TAR_BLOCK_SIZE = 512
+COMPRESS_LEVEL = 6
+INDEX_SUFFIX = ".idx"
+LOCK_SUFFIX = ".lock"
+# What finalize leaves in the lock file of the archive, followed by the path
+# of the finished archive
+FINALIZED = "finalized "
+
+
+def read_index(index_path: Path) -> Dict[str, Tuple[int, int]]:
+    # Return {time: (offset, length)} for every complete line of the index
+    try:
+        with open(index_path) as f:
+            contents = f.read()
+    except FileNotFoundError:
+        return {}
+    index: Dict[str, Tuple[int, int]] = {}
+    # Ignore a trailing line that has not been completely written yet
+    for line in contents.split("\n")[:-1]:
+        if not line:
+            continue
+        timestamp, offset, length = line.split()
+        index[timestamp] = (int(offset), int(length))
+    return index
+
+
+def index_path_of(archive_path: Path) -> Path:
+    return archive_path.with_name(archive_path.name + INDEX_SUFFIX)
+
+
+def time_of_member(member: str) -> str:
+    # The time that a top level member of a group archive holds (the tar
+    # mode archives hold <time>.tar files)
+    return member[: -len(".tar")] if member.endswith(".tar") else member
+
+
+def _is_in_time_dir(name: str, names: List[str]) -> bool:
+    # Whether name (time/...) is one of names directly in its time directory
+    parts = name.split("/")
+    return len(parts) == 2 and parts[1] in names
+
+
+def _iter_time_paths(
+    case_dir: Path,
+    timestamp: str,
+    excludes: List[str],
+    fields: Optional[List[str]],
+) -> Iterator[Path]:
+    # Walk case_dir/timestamp in a stable order. Only the given fields (and
+    # everything in the subdirectories) are kept when fields is not None.
+    time_dir = case_dir / timestamp
+    yield time_dir
+    for root, dirs, files in os.walk(time_dir):
+        dirs[:] = sorted(d for d in dirs if d not in excludes)
+        at_top = Path(root) == time_dir
+        for name in sorted(files):
+            if name in excludes:
+                continue
+            if at_top and fields is not None and name not in fields:
+                continue
+            yield Path(root) / name
+        for name in dirs:
+            yield Path(root) / name
+
+
+def _add_delta(
+    tar: tarfile.TarFile,
+    path: Path,
+    arcname: str,
+    reference: Path,
+    level: int,
+) -> ManifestEntry:
+    # Add the patch from reference to path as arcname.zpatch. The manifest
+    # describes the file itself.
+    info = tar.gettarinfo(path, arcname=arcname + delta.DELTA_SUFFIX)
+    entry = ManifestEntry(arcname, info.size, file_sha256(path))
+    patch = delta.encode(reference, path, level)
+    info.size = len(patch)
+    tar.addfile(info, io.BytesIO(patch))
+    return entry
+
+
+def write_time_frame(
+    out: gzip.GzipFile,
+    case_dir: Path,
+    timestamp: str,
+    excludes: List[str],
+    fields: Optional[List[str]] = None,
+    contents: Optional[ContentIndex] = None,
+    references: Optional[Dict[str, Path]] = None,
+    delta_level: int = delta.DELTA_LEVEL,
+) -> List[ManifestEntry]:
+    # Write the tar members of case_dir/timestamp (named timestamp/...)
+    # without the end of archive blocks and return the manifest of its
+    # files. The files directly in the time directory that have a reference
+    # ({name: path of an earlier version of it}) are written as patches
+    # against it and the files whose contents are already in the archive
+    # (according to contents) as hard links. The end of archive blocks are
+    # only written by TarFile.close so it is never called (the TarFile does
+    # not own out).
+    tar = tarfile.TarFile(fileobj=out, mode="w", format=tarfile.GNU_FORMAT)
+    time_dir = case_dir / timestamp
+    entries: List[ManifestEntry] = []
+    for path in _iter_time_paths(case_dir, timestamp, excludes, fields):
+        arcname = str(path.relative_to(case_dir))
+        reference = None
+        if references is not None and path.parent == time_dir:
+            reference = references.get(path.name)
+        if reference is not None and path.is_file():
+            entries.append(
+                _add_delta(tar, path, arcname, reference, delta_level)
+            )
+        elif entry := add_path(tar, path, arcname, contents):
+            entries.append(entry)
+    return entries
+
+
+def lock_path_of(archive_path: Path) -> Path:
+    return archive_path.with_name(archive_path.name + LOCK_SUFFIX)
+
+
+@contextmanager
+def _locked(archive_path: Path) -> Iterator[Optional[Path]]:
+    # Lock the archive and return the finished archive if it has been
+    # finalized. finalize leaves its path in the lock file so that a late
+    # append cannot start a new archive in place of the one it moved away.
+    # Once the finished archive is gone (e.g., merged by simon.archive.compact)
+    # the archive can be started over.
+    with open(lock_path_of(archive_path), "a+") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            lock_file.seek(0)
+            contents = lock_file.read()
+            finished = None
+            if contents.startswith(FINALIZED):
+                finished = Path(contents[len(FINALIZED) :].rstrip("\n"))
+                if not finished.exists():
+                    finished = None
+                    lock_file.truncate(0)
+            yield finished
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class StreamArchive:
+    """A group archive that is written to one time at a time"""
+
+    def __init__(
+        self,
+        path: Path,
+        index_path: Optional[Path] = None,
+        manifest_path: Optional[Path] = None,
+    ) -> None:
+        self.path = Path(path)
+        # The index (and the manifest) can be somewhere else than next to
+        # the archive (e.g., when the archive gets moved into place once it
+        # has been written)
+        self.index_path = (
+            index_path_of(self.path) if index_path is None else index_path
+        )
+        self.manifest_path = (
+            manifest_path_of(self.path)
+            if manifest_path is None
+            else manifest_path
+        )
+
+    def read_index(self) -> Dict[str, Tuple[int, int]]:
+        return read_index(self.index_path)
+
+    def append(
+        self,
+        case_dir: Path,
+        timestamp: str,
+        excludes: Optional[List[str]] = None,
+        fields: Optional[List[str]] = None,
+        compress_level: int = COMPRESS_LEVEL,
+        delta_fields: Optional[List[str]] = None,
+        keyframe_every: int = delta.KEYFRAME_EVERY,
+        delta_level: int = delta.DELTA_LEVEL,
+    ) -> bool:
+        # Append case_dir/timestamp (a time directory or a <time>.tar) as a
+        # new frame. Returns False if it had already been appended. Raises a
+        # ValueError when its files do not match the manifest afterwards.
+        # delta_fields are stored as patches against their latest full
+        # version in the archive unless it is keyframe_every - 1 patches old.
+        key = time_of_member(timestamp)
+        with _locked(self.path) as finished:
+            if finished is not None:
+                # A new stream would end up in place of the archive
+                raise ValueError(
+                    f"{self.path} has been finalized into {finished},"
+                    f" {timestamp} cannot be appended to it"
+                )
+            index = self.read_index()
+            if key in index:
+                self._verify(case_dir, timestamp, excludes, fields)
+                return False
+            # The files of delta_fields can be patches in the earlier frames
+            # (an archive is appended to with the same delta_fields), which
+            # a plain tar -x could not link to
+            contents = ContentIndex(
+                entry
+                for entry in self._archived_entries(index)
+                if not _is_in_time_dir(entry.name, delta_fields or [])
+            )
+            # Drop whatever an interrupted append left after the last
+            # complete frame
+            end = max((o + n for o, n in index.values()), default=0)
+            with open(self.path, "ab") as f:
+                f.truncate(end)
+            with tempfile.TemporaryDirectory(
+                dir=self.path.parent
+            ) as work_dir, open(self.path, "r+b") as f:
+                references = self._find_references(
+                    list(index),
+                    delta_fields or [],
+                    Path(work_dir),
+                    max_deltas=keyframe_every - 1,
+                )
+                f.seek(end)
+                with gzip.GzipFile(
+                    filename="",
+                    fileobj=f,
+                    mode="wb",
+                    compresslevel=compress_level,
+                    mtime=0,
+                ) as out:
+                    entries = write_time_frame(
+                        out,
+                        Path(case_dir),
+                        timestamp,
+                        excludes or [],
+                        fields,
+                        contents,
+                        references,
+                        delta_level,
+                    )
+                length = f.tell() - end
+                f.flush()
+                os.fsync(f.fileno())
+            # The manifest lines go before the index line so every indexed
+            # frame has them
+            write_manifest(self.manifest_path, entries, append=True)
+            with open(self.index_path, "a") as f:
+                f.write(f"{key} {end} {length}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._verify(case_dir, timestamp, excludes, fields)
+        return True
+
+    def _archived_entries(
+        self, index: Dict[str, Tuple[int, int]]
+    ) -> List[ManifestEntry]:
+        # The manifest entries of the complete frames (an interrupted append
+        # can have left some of the files of its time in the manifest)
+        try:
+            entries = read_manifest(self.manifest_path)
+        except FileNotFoundError:
+            return []
+        return [
+            entry
+            for entry in entries.values()
+            if time_of_member(entry.name.split("/")[0]) in index
+        ]
+
+    def _find_references(
+        self,
+        times: List[str],
+        names: List[str],
+        work_dir: Path,
+        max_deltas: Optional[int] = None,
+    ) -> Dict[str, Path]:
+        # Write the latest full version of each of names (files directly in
+        # the time directories) in the frames of times to work_dir and
+        # return {name: its path}. Only the frames back to it are read. A
+        # name with max_deltas patches after its latest full version (or
+        # that has none) is left out.
+        if max_deltas is not None and max_deltas <= 0:
+            return {}
+        num_deltas = {name: 0 for name in names}
+        references: Dict[str, Path] = {}
+        for t in reversed(times):
+            if not num_deltas:
+                break
+            with tarfile.open(
+                fileobj=io.BytesIO(self.read_frame(t)), mode="r:"
+            ) as tar:
+                tar.extraction_filter = getattr(tarfile, "data_filter", None)
+                members = {member.name: member for member in tar}
+                for name in list(num_deltas):
+                    member = members.get(f"{t}/{name}")
+                    if member is not None and member.isreg():
+                        del num_deltas[name]
+                        tar.extract(member, work_dir)
+                        references[name] = work_dir / member.name
+                    elif f"{t}/{name}{delta.DELTA_SUFFIX}" in members:
+                        num_deltas[name] += 1
+                        if max_deltas is not None and (
+                            num_deltas[name] >= max_deltas
+                        ):
+                            del num_deltas[name]
+        return references
+
+    def _verify(
+        self,
+        case_dir: Path,
+        timestamp: str,
+        excludes: Optional[List[str]],
+        fields: Optional[List[str]],
+    ) -> None:
+        # Checked while the archive is still locked (it cannot be finalized
+        # and moved in the meantime)
+        if problems := verify_manifest(
+            self.path,
+            [timestamp],
+            Path(case_dir),
+            self.manifest_path,
+            excludes=excludes,
+            fields=fields,
+        ):
+            raise ValueError("\n".join(problems))
+
+    def finalize(self, final_path: Optional[Path] = None) -> None:
+        # Close the tar stream and move the archive (and its index) to
+        # final_path. The lock file is left behind with final_path in it so
+        # that nothing can be appended once it is done.
+        with _locked(self.path) as finished:
+            if finished is not None:
+                return
+            index = self.read_index()
+            end = max((o + n for o, n in index.values()), default=0)
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+                f.seek(end)
+                with gzip.GzipFile(
+                    filename="", fileobj=f, mode="wb", mtime=0
+                ) as out:
+                    out.write(b"\0" * (2 * TAR_BLOCK_SIZE))
+                f.flush()
+                os.fsync(f.fileno())
+            final_path = self.path if final_path is None else Path(final_path)
+            if final_path != self.path:
+                os.replace(self.index_path, index_path_of(final_path))
+                if self.manifest_path.exists():
+                    os.replace(
+                        self.manifest_path, manifest_path_of(final_path)
+                    )
+                os.replace(self.path, final_path)
+            lock_path_of(self.path).write_text(
+                f"{FINALIZED}{final_path.absolute()}\n"
+            )
+
+    def read_frame(self, timestamp: str) -> bytes:
+        # The decompressed tar members of a single time
+        offset, length = self.read_index()[timestamp]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return gzip.decompress(f.read(length))
+
+    def extract(
+        self,
+        timestamp: str,
+        dest_dir: Path,
+        fields: Optional[List[str]] = None,
+    ) -> None:
+        # Restore the time directory of timestamp (or only some of its
+        # fields) into dest_dir by only reading its frame (and the frames
+        # holding the files it links to or is patched against)
+        dest_dir = Path(dest_dir)
+        links: Dict[str, str] = {}
+        with tarfile.open(
+            fileobj=io.BytesIO(self.read_frame(timestamp)), mode="r|"
+        ) as tar:
+            extract_members(tar, {timestamp}, dest_dir, fields, links)
+        self._extract_linked(links, dest_dir)
+        time_dir = dest_dir / timestamp
+        if time_dir.is_dir():
+            for patch in sorted(time_dir.glob(f"*{delta.DELTA_SUFFIX}")):
+                name = patch.name[: -len(delta.DELTA_SUFFIX)]
+                self._apply_patch(timestamp, name, patch, time_dir / name)
+
+    def _extract_linked(self, links: Dict[str, str], dest_dir: Path) -> None:
+        # Extract the files that links ({name: name of the file it links
+        # to}) point to under the names of the links
+        targets: Dict[str, Dict[str, List[str]]] = {}
+        for name, target in links.items():
+            t = time_of_member(target.split("/")[0])
+            targets.setdefault(t, {}).setdefault(target, []).append(name)
+        for t, names_of_targets in targets.items():
+            # The frame is in memory so it can be read out of order
+            with tarfile.open(
+                fileobj=io.BytesIO(self.read_frame(t)), mode="r:"
+            ) as tar:
+                tar.extraction_filter = getattr(tarfile, "data_filter", None)
+                members = {member.name: member for member in tar}
+                for target, names in names_of_targets.items():
+                    if target in members:
+                        for name in names:
+                            linked = copy.copy(members[target])
+                            linked.name = name
+                            tar.extract(linked, dest_dir)
+                        continue
+                    # The file linked to is a patch of its own
+                    patch = copy.copy(members[target + delta.DELTA_SUFFIX])
+                    patch.name = names[0] + delta.DELTA_SUFFIX
+                    tar.extract(patch, dest_dir)
+                    self._apply_patch(
+                        t,
+                        target.split("/", 1)[1],
+                        dest_dir / patch.name,
+                        dest_dir / names[0],
+                    )
+                    for name in names[1:]:
+                        shutil.copy2(dest_dir / names[0], dest_dir / name)
+
+    def _apply_patch(
+        self, timestamp: str, name: str, patch: Path, out: Path
+    ) -> None:
+        # Restore the file name of timestamp from its patch (which is
+        # removed) to out and check it against the manifest
+        index = list(self.read_index())
+        times = index[: index.index(timestamp)]
+        with tempfile.TemporaryDirectory(dir=out.parent) as work_dir:
+            references = self._find_references(times, [name], Path(work_dir))
+            if name not in references:
+                raise ValueError(
+                    f"{self.path} does not hold {name} in full before"
+                    f" {timestamp}"
+                )
+            delta.decode(references[name], patch, out)
+        shutil.copystat(patch, out)
+        patch.unlink()
+        try:
+            entry = read_manifest(self.manifest_path).get(
+                f"{timestamp}/{name}"
+            )
+        except FileNotFoundError:
+            return
+        if entry is not None and file_sha256(out) != entry.sha256:
+            raise ValueError(
+                f"{timestamp}/{name} was not restored as it was archived"
+            )
+
+
+def _is_wanted(member: tarfile.TarInfo, fields: Optional[List[str]]) -> bool:
+    # Only the given fields of the files directly in the time directory are
+    # wanted (everything in the subdirectories is)
+    parts = member.name.split("/")
+    if fields is None or member.isdir() or len(parts) != 2:
+        return True
+    name = parts[1]
+    if name.endswith(delta.DELTA_SUFFIX):
+        name = name[: -len(delta.DELTA_SUFFIX)]
+    return name in fields
+
+
+def _normalize(name: str) -> str:
+    return "/".join(part for part in name.split("/") if part not in ["", "."])
+
+
+def _locate_member(
+    name: str, timestamps: Set[str]
+) -> Optional[Tuple[str, str]]:
+    # (time, name relative to the case directory) of a member of one of
+    # timestamps. The tars of the times can hold them under the path of the
+    # case directory they were written from (e.g., ./0.1/U or case/0.1/U).
+    parts = [part for part in name.split("/") if part not in ["", "."]]
+    for i, part in enumerate(parts):
+        t = time_of_member(part)
+        if t in timestamps:
+            return t, "/".join(parts[i:])
+    return None
+
+
+def extract_members(
+    tar: tarfile.TarFile,
+    timestamps: Set[str],
+    dest_dir: Path,
+    fields: Optional[List[str]] = None,
+    links: Optional[Dict[str, str]] = None,
+) -> Set[str]:
+    # Extract the time directories of timestamps from a tar that is read in
+    # order, unpacking the <time>.tar members of tar mode group archives on
+    # the way. The members of a time are next to each other so the reading
+    # stops once all of timestamps have been passed. Returns the times that
+    # were found.
+    # Hard links to files that were extracted are extracted as copies of
+    # them. The others are added to links ({name: name of the file it links
+    # to}) for the caller to find the files they link to.
+    # Refuse members that would end up outside of dest_dir where this Python
+    # has extraction filters
+    tar.extraction_filter = getattr(tarfile, "data_filter", None)
+    found: Set[str] = set()
+    extracted: Set[str] = set()
+    for member in tar:
+        located = _locate_member(member.name, timestamps)
+        if located is None:
+            if found == timestamps:
+                break
+            continue
+        t, member.name = located
+        found.add(t)
+        if member.name == f"{t}.tar":
+            if member.isfile():
+                nested = tar.extractfile(member)
+                with tarfile.open(fileobj=nested, mode="r|") as nested_tar:
+                    extract_members(nested_tar, {t}, dest_dir, fields)
+            continue
+        if not _is_wanted(member, fields):
+            continue
+        if member.islnk():
+            target = _normalize(member.linkname)
+            if tar.extraction_filter is not None:
+                tar.extraction_filter(member, str(dest_dir))
+            if target in extracted:
+                (dest_dir / member.name).parent.mkdir(
+                    parents=True, exist_ok=True
+                )
+                shutil.copy2(dest_dir / target, dest_dir / member.name)
+            elif links is not None:
+                links[member.name] = target
+            else:
+                raise ValueError(
+                    f"{member.name} links to {target}, which is not being"
+                    " extracted"
+                )
+            continue
+        tar.extract(member, dest_dir)
+        extracted.add(member.name)
+    return found
+
+
+def pack(
+    archive_path: Path,
+    members: List[str],
+    *,
+    case_dir: Path = Path("."),
+    index_path: Optional[Path] = None,
+    manifest_path: Optional[Path] = None,
+    compress_level: int = COMPRESS_LEVEL,
+) -> None:
+    # Write members (time directories or <time>.tar files in case_dir) to a
+    # new seekable group archive with one frame per member
+    archive_path = Path(archive_path)
+    archive = StreamArchive(archive_path, index_path, manifest_path)
+    # Start over from whatever an earlier run left behind
+    for path in [
+        archive.path,
+        archive.index_path,
+        archive.manifest_path,
+        lock_path_of(archive.path),
+    ]:
+        if path.exists():
+            path.unlink()
+    for member in members:
+        archive.append(case_dir, member, compress_level=compress_level)
+    archive.finalize()
+    # Nothing else writes to it
+    lock_path_of(archive.path).unlink()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Write and read seekable group archives"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    append_parser = subparsers.add_parser("append")
+    append_parser.add_argument("archive", type=Path)
+    append_parser.add_argument("case_dir", type=Path)
+    append_parser.add_argument("time")
+    append_parser.add_argument(
+        "--exclude", action="append", default=[], dest="excludes"
+    )
+    append_parser.add_argument("--fields", nargs="+", default=None)
+    append_parser.add_argument(
+        "--level", type=int, default=COMPRESS_LEVEL, dest="compress_level"
+    )
+    append_parser.add_argument(
+        "--delta", nargs="+", default=None, dest="delta_fields"
+    )
+    append_parser.add_argument(
+        "--keyframe-every", type=int, default=delta.KEYFRAME_EVERY
+    )
+    append_parser.add_argument(
+        "--delta-level", type=int, default=delta.DELTA_LEVEL
+    )
+    finalize_parser = subparsers.add_parser("finalize")
+    finalize_parser.add_argument("archive", type=Path)
+    finalize_parser.add_argument("final_archive", type=Path)
+    pack_parser = subparsers.add_parser("pack")
+    pack_parser.add_argument("--index", default=None, type=Path)
+    pack_parser.add_argument("--manifest", default=None, type=Path)
+    pack_parser.add_argument(
+        "--level", type=int, default=COMPRESS_LEVEL, dest="compress_level"
+    )
+    pack_parser.add_argument("archive", type=Path)
+    pack_parser.add_argument("members", nargs="+")
+    extract_parser = subparsers.add_parser("extract")
+    extract_parser.add_argument("archive", type=Path)
+    extract_parser.add_argument("time")
+    extract_parser.add_argument("dest_dir", type=Path)
+    extract_parser.add_argument("--fields", nargs="+", default=None)
+    args = parser.parse_args(argv)
+    if args.command == "pack":
+        pack(
+            args.archive,
+            args.members,
+            index_path=args.index,
+            manifest_path=args.manifest,
+            compress_level=args.compress_level,
+        )
+        return
+    archive = StreamArchive(args.archive)
+    if args.command == "append":
+        archive.append(
+            args.case_dir,
+            args.time,
+            excludes=args.excludes,
+            fields=args.fields,
+            compress_level=args.compress_level,
+            delta_fields=args.delta_fields,
+            keyframe_every=args.keyframe_every,
+            delta_level=args.delta_level,
+        )
+    elif args.command == "finalize":
+        archive.finalize(args.final_archive)
+    elif args.command == "extract":
+        archive.extract(args.time, args.dest_dir, fields=args.fields)
+
+
+if __name__ == "__main__":
+    main()
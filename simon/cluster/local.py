@@ -5,14 +5,19 @@ from contextlib import contextmanager
 from pathlib import Path
 from typing import Iterator, List
 
+from simon.archive.codecs import GZIP, Codec
+from simon.archive.manifest import MANIFEST_SUFFIX
+from simon.archive.stream import INDEX_SUFFIX
 from simon.task import Task
 
 JOB_NAME_REGEX = re.compile(r"#SBATCH\s+-J\s+([a-zA-Z0-9_-]+)$")
 
 
 class LocalJobManager:
-    def __init__(self, case_dir: Path) -> None:
+    def __init__(self, case_dir: Path, codec: Codec = GZIP) -> None:
         self.case_dir = case_dir
+        # What the compress jobs compress the tars with
+        self.codec = codec
 
     def _get_process_status(self, pid: str) -> str:
         command_output = (
@@ -41,14 +46,35 @@ class LocalJobManager:
         # So don't do anything
         pass
 
+    def hold_job(self) -> None:
+        # There is no requeued job to hold on the local system
+        pass
+
+    def release_job(self) -> None:
+        pass
+
     def _create_compress_command(self, tgz_file: str, files: List[str]) -> str:
         # $$ gets the PID
-        tar_command = f"tar -czvf {tgz_file}.inprogress.$$"
+        # The manifest lets the tars be checked before they get deleted
+        tar_command = self.codec.tar_create_command(
+            f"{tgz_file}.inprogress.$$",
+            index=f"{tgz_file}{INDEX_SUFFIX}",
+            manifest_file=f"{tgz_file}{MANIFEST_SUFFIX}",
+        )
+        manifest_command = self.codec.manifest_create_command(
+            f"{tgz_file}{MANIFEST_SUFFIX}"
+        )
         for f in files:
             tar_command += f" {f}"
+            if manifest_command is not None:
+                manifest_command += f" {f}"
         commands = [
             f"mv {tgz_file}.queued {tgz_file}.inprogress.$$",
             tar_command,
+        ]
+        if manifest_command is not None:
+            commands.append(manifest_command)
+        commands += [
             f"mv {tgz_file}.inprogress.$$ {tgz_file}",
             f"echo Done compressing {tgz_file}!",
         ]
@@ -128,11 +154,14 @@ class LocalJobManager:
         ) as filled_compress_script:
             # This needs to be run from the case directory because all the
             # filenames are specified relative to the case directory
+            # The script is opened before it gets cleaned up and the
+            # compression in the background reads it from there (running it
+            # by its name could find it gone already)
             cwd = os.getcwd()
             command = (
                 f"cd {self.case_dir}"
                 f" && touch {tgz_path}.queued"
-                f" && sh {filled_compress_script} &"
+                f" && {{ sh <&3 & }} 3< {filled_compress_script}"
                 f"\ncd {cwd}"
             )
             Task(command=command, priority=0).run(block=True)
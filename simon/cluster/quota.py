@@ -0,0 +1,117 @@
+import subprocess
+from typing import Callable, List, Optional, Tuple
+
+
+def parse_lfs_quota_output(
+    output: str,
+) -> Tuple[int, int, Optional[int], Optional[int]]:
+    # Parse the output of `lfs quota -q -u <user> <path>` which looks like:
+    #   /storage 1234 0 5000 - 56 0 1000 -
+    # i.e., filesystem, kbytes used, soft quota, hard limit, grace, files
+    # used, soft quota, hard limit, grace. The filesystem can be on a line of
+    # its own when its name is long and usage over the quota is marked with a
+    # trailing "*".
+    # Returns (files used, bytes used, files limit, bytes limit) where the
+    # limits are None if there is no limit set.
+    tokens = output.split()
+    for i, token in enumerate(tokens):
+        if token.rstrip("*").isdigit():
+            # The first number is the kbytes used
+            fields = [t.rstrip("*") for t in tokens[i : i + 8]]
+            break
+    else:
+        raise ValueError(f"Could not parse quota output:\n{output}")
+    if len(fields) < 7:
+        raise ValueError(f"Could not parse quota output:\n{output}")
+    kbytes, kbytes_soft, kbytes_hard = (int(f) for f in fields[0:3])
+    files, files_soft, files_hard = (int(f) for f in fields[4:7])
+    # Prefer the hard limit but fall back to the soft quota; 0 means no limit
+    files_limit = files_hard or files_soft or None
+    kbytes_limit = kbytes_hard or kbytes_soft or None
+    return (
+        files,
+        kbytes * 1024,
+        files_limit,
+        kbytes_limit * 1024 if kbytes_limit else None,
+    )
+
+
+class QuotaMonitor:
+    """Decide when the case is close enough to its quota to start draining
+
+    The usage is either measured by simon (usage returns (files, bytes)) or
+    read from the output of quota_command (e.g., lfs quota -q -u $USER /path).
+    Draining starts when either the file count or the bytes used cross
+    high_water of their limits and stops once both fall back below low_water
+    so that simon does not flip in and out of drain mode on every update.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_files: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        high_water: float = 0.9,
+        low_water: float = 0.8,
+        usage: Optional[Callable[[], Tuple[int, int]]] = None,
+        quota_command: Optional[str] = None,
+    ) -> None:
+        if usage is None and quota_command is None:
+            raise ValueError("Either usage or quota_command is needed")
+        if not 0 < low_water <= high_water <= 1:
+            raise ValueError(
+                f"Need 0 < low_water ({low_water})"
+                f" <= high_water ({high_water}) <= 1"
+            )
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.high_water = high_water
+        self.low_water = low_water
+        self.usage = usage
+        self.quota_command = quota_command
+        self.draining = False
+        self.files_used = 0
+        self.bytes_used = 0
+
+    def _measure(self) -> Tuple[int, int, Optional[int], Optional[int]]:
+        if self.quota_command is not None:
+            output = subprocess.check_output(
+                self.quota_command, shell=True
+            ).decode("utf-8")
+            files, nbytes, files_limit, bytes_limit = parse_lfs_quota_output(
+                output
+            )
+        else:
+            assert self.usage is not None
+            files, nbytes = self.usage()
+            files_limit, bytes_limit = None, None
+        # Limits set explicitly take precedence over the reported ones
+        if self.max_files is not None:
+            files_limit = self.max_files
+        if self.max_bytes is not None:
+            bytes_limit = self.max_bytes
+        return files, nbytes, files_limit, bytes_limit
+
+    def update(self) -> bool:
+        files, nbytes, files_limit, bytes_limit = self._measure()
+        self.files_used = files
+        self.bytes_used = nbytes
+        fractions: List[float] = []
+        if files_limit:
+            fractions.append(files / files_limit)
+        if bytes_limit:
+            fractions.append(nbytes / bytes_limit)
+        if not fractions:
+            self.draining = False
+        elif not self.draining and max(fractions) >= self.high_water:
+            self.draining = True
+        elif self.draining and max(fractions) < self.low_water:
+            self.draining = False
+        return self.draining
+
+    def __str__(self) -> str:
+        state = "draining" if self.draining else "normal"
+        return (
+            f"[Quota: {self.files_used} files / {self.bytes_used} bytes"
+            f" ({state})]"
+        )
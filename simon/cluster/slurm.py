@@ -6,6 +6,9 @@ from contextlib import contextmanager
 from pathlib import Path
 from typing import Iterator, List
 
+from simon.archive.codecs import GZIP, Codec
+from simon.archive.manifest import MANIFEST_SUFFIX
+from simon.archive.stream import INDEX_SUFFIX
 from simon.task import Task
 
 JOB_NAME_REGEX = re.compile(r"#SBATCH\s+-J\s+([a-zA-Z0-9_-]+)$")
@@ -13,12 +16,19 @@ JOB_NAME_REGEX = re.compile(r"#SBATCH\s+-J\s+([a-zA-Z0-9_-]+)$")
 
 class SlurmJobManager:
     def __init__(
-        self, case_dir: Path, job_sfile: str, job_id: str, compress_sfile: str
+        self,
+        case_dir: Path,
+        job_sfile: str,
+        job_id: str,
+        compress_sfile: str,
+        codec: Codec = GZIP,
     ) -> None:
         self.case_dir = case_dir
         self.job_sfile = job_sfile
         self.job_id = job_id
         self.compress_sfile = compress_sfile
+        # What the compress jobs compress the tars with
+        self.codec = codec
         self._verify_directory_is_valid()
         self.job_name = self._read_job_name()
 
@@ -65,11 +75,15 @@ class SlurmJobManager:
     def _get_dependent_jobs(self, job_id: str) -> List[str]:
         dependent_jobs: List[str] = []
         squeue_output = (
-            subprocess.check_output(f"squeue --me -o '%A %E'")
+            subprocess.check_output(f"squeue --me -o '%A %E'", shell=True)
             .decode("utf-8")
             .split("\n")
         )
-        dependency_regex = re.compile(r"([0-9]+)\s+[0-9a-zA-Z:]*{job_id}")
+        # The job ID has to be the whole number (job 12 is not a dependency
+        # on job 123)
+        dependency_regex = re.compile(
+            rf"([0-9]+)\s+[0-9a-zA-Z:]*(?<![0-9]){job_id}(?![0-9])"
+        )
         for line in squeue_output:
             if line == "":
                 continue
@@ -118,13 +132,46 @@ class SlurmJobManager:
         # TODO: Make sure that this gets higher priority than anyone else
         Task(command=" && ".join(commands), priority=0).run(block=True)
 
+    def hold_job(self) -> None:
+        # Hold the requeued job(s) waiting on this one so that the simulation
+        # does not restart (and write out more files) while simon is draining
+        dependent_jobs = self._get_dependent_jobs(self.job_id)
+        if not dependent_jobs:
+            return
+        Task(
+            command=f"scontrol hold {','.join(dependent_jobs)}", priority=0
+        ).run(block=True)
+
+    def release_job(self) -> None:
+        dependent_jobs = self._get_dependent_jobs(self.job_id)
+        if not dependent_jobs:
+            return
+        Task(
+            command=f"scontrol release {','.join(dependent_jobs)}",
+            priority=0,
+        ).run(block=True)
+
     def _create_compress_command(self, tgz_file: str, files: List[str]) -> str:
-        tar_command = f"tar -czvf {tgz_file}.inprogress.$SLURM_JOB_ID"
+        # The manifest lets the tars be checked before they get deleted
+        tar_command = self.codec.tar_create_command(
+            f"{tgz_file}.inprogress.$SLURM_JOB_ID",
+            index=f"{tgz_file}{INDEX_SUFFIX}",
+            manifest_file=f"{tgz_file}{MANIFEST_SUFFIX}",
+        )
+        manifest_command = self.codec.manifest_create_command(
+            f"{tgz_file}{MANIFEST_SUFFIX}"
+        )
         for f in files:
             tar_command += f" {f}"
+            if manifest_command is not None:
+                manifest_command += f" {f}"
         commands = [
             f"mv {tgz_file}.queued {tgz_file}.inprogress.$SLURM_JOB_ID",
             tar_command,
+        ]
+        if manifest_command is not None:
+            commands.append(manifest_command)
+        commands += [
             f"mv {tgz_file}.inprogress.$SLURM_JOB_ID {tgz_file}",
             f"echo Done compressing {tgz_file}!",
         ]
@@ -0,0 +1,80 @@
+import os
+import time
+from decimal import Decimal
+from typing import Callable, Optional
+
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.solver_log import SolverLog
+
+
+class WriteCompletionDetector:
+    """Decide whether OpenFOAM has finished writing out a split time
+
+    A split time is complete once the solver log shows that the solver has
+    moved on to a later time step (or has ended). Without a log, or while
+    the log has not moved on yet, it is complete once every processor has
+    written its uniform/time (OpenFOAM writes it when it starts writing out
+    a time) and nothing in the time directories has been modified for
+    quiet_seconds. Inotify is not available from the standard library, so
+    the modification times are used to tell when the writes have stopped.
+    """
+
+    def __init__(
+        self,
+        state: OFFileState,
+        *,
+        quiet_seconds: float = 30.0,
+        solver_log: Optional[SolverLog] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.state = state
+        self.quiet_seconds = quiet_seconds
+        self.solver_log = solver_log
+        self.clock = clock
+
+    def _solver_has_moved_on(self, timestamp: str) -> bool:
+        if self.solver_log is None:
+            return False
+        self.solver_log.update()
+        if self.solver_log.finished:
+            return True
+        latest_time = self.solver_log.latest_time
+        return latest_time is not None and latest_time > Decimal(timestamp)
+
+    @staticmethod
+    def _latest_mtime(directory: str) -> float:
+        # The latest modification time of anything in the directory tree
+        latest = os.stat(directory).st_mtime
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    latest = max(
+                        latest,
+                        WriteCompletionDetector._latest_mtime(entry.path),
+                    )
+                else:
+                    latest = max(
+                        latest, entry.stat(follow_symlinks=False).st_mtime
+                    )
+        return latest
+
+    def _is_quiet(self, timestamp: str) -> bool:
+        time_dirs = [
+            processor_dir / timestamp
+            for processor_dir in self.state.get_processor_dirs()
+        ]
+        if not time_dirs:
+            return False
+        try:
+            if not all((d / "uniform" / "time").is_file() for d in time_dirs):
+                return False
+            latest_mtime = max(self._latest_mtime(str(d)) for d in time_dirs)
+        except FileNotFoundError:
+            # Still being created (or already removed)
+            return False
+        return self.clock() - latest_mtime >= self.quiet_seconds
+
+    def is_complete(self, timestamp: str) -> bool:
+        return self._solver_has_moved_on(timestamp) or self._is_quiet(
+            timestamp
+        )
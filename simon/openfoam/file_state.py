@@ -1,58 +1,194 @@
+import bisect
 import decimal
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-RECONSTRUCTION_DONE_MARKER_FILENAME = ".__reconstruction_done"
+from simon.archive.codecs import split_compressed_extension
+from simon.archive.stream import INDEX_SUFFIX as STREAM_INDEX_SUFFIX
+from simon.archive.stream import read_index
+from simon.openfoam.registry import (RECONSTRUCTION_DONE_MARKER_FILENAME,
+                                     RECONSTRUCTION_PART_MARKER_PREFIX,
+                                     MarkerFileRegistry,
+                                     ReconstructionRegistry,
+                                     create_reconstruction_registry)
 
 
 class OFFileState:
     def __init__(
         self,
         case_dir: Path,
+        num_scan_threads: Optional[int] = None,
+        reconstruction_registry: str = "marker",
+        require_processor_dirs: bool = True,
     ) -> None:
-        if not self._is_valid_openfoam_dir(case_dir):
+        # Only what is done with the archives of a case (e.g., once it has
+        # finished and its processor directories are gone) can go without
+        # require_processor_dirs
+        if not self._is_valid_openfoam_dir(case_dir, require_processor_dirs):
             raise ValueError(
                 "This does not appear to be a valid OpenFOAM root case dir."
             )
         self.case_dir = case_dir
+        # The number of threads used to scan the processor directories
+        # (None lets the thread pool pick a default based on the CPU count)
+        self.num_scan_threads = num_scan_threads
+        # How completely reconstructed times are recorded (see registry.py)
+        self.registry: ReconstructionRegistry = (
+            create_reconstruction_registry(reconstruction_registry, case_dir)
+        )
 
     @staticmethod
-    def _is_valid_openfoam_dir(case_dir: Path) -> bool:
+    def _is_valid_openfoam_dir(
+        case_dir: Path, require_processor_dirs: bool = True
+    ) -> bool:
         # To check that we're in an OpenFOAM case dir, check to see if we have:
         # - a constant dir
         # - a system dir
-        # - a processor0 dir
+        # - a processor0 dir (uncollated) or a processorsN dir (collated)
+        #   when require_processor_dirs
         if not (case_dir / "constant").is_dir():
             return False
         if not (case_dir / "system").is_dir():
             return False
-        if not (case_dir / "processor0").is_dir():
-            return False
-        return True
+        if not require_processor_dirs:
+            return True
+        if (case_dir / "processor0").is_dir():
+            return True
+        if any(d.is_dir() for d in case_dir.glob("processors[0-9]*")):
+            return True
+        return False
 
-    def get_split_times(self) -> List[str]:
-        processor0_directory = self.case_dir / "processor0"
+    @property
+    def is_collated(self) -> bool:
+        # With the collated file handler, OpenFOAM writes all the processors
+        # into a single processorsN directory (or a few processorsN_a-b
+        # directories when distributed over multiple roots) with one file per
+        # field instead of one file per field per processor
+        return any(
+            d.is_dir() for d in self.case_dir.glob("processors[0-9]*")
+        )
+
+    @property
+    def processor_glob(self) -> str:
+        # Shell glob that matches all the processor directories of the case
+        if self.is_collated:
+            return "processors*"
+        return "processor*"
+
+    def get_processor_dirs(self) -> List[Path]:
+        if self.is_collated:
+            return sorted(
+                d
+                for d in self.case_dir.glob("processors[0-9]*")
+                if d.is_dir()
+            )
         return sorted(
             [
-                t.name
-                for t in processor0_directory.glob("[0-9]*")
-                if t.is_dir()
+                d
+                for d in self.case_dir.glob("processor[0-9]*")
+                if d.is_dir()
             ],
-            key=float,
+            key=lambda d: int(d.name[len("processor") :]),
         )
 
+    @staticmethod
+    def _scan_time_dirs(directory: Path) -> List[str]:
+        # List the names of all the time directories in directory
+        try:
+            with os.scandir(directory) as entries:
+                return [
+                    entry.name
+                    for entry in entries
+                    if entry.name[:1].isdigit() and entry.is_dir()
+                ]
+        except FileNotFoundError:
+            # The directory could have been removed since it was listed
+            return []
+
+    def get_time_dirs(self) -> List[str]:
+        # The names of all the time directories in the case directory
+        # (reconstructed or not)
+        return self._scan_time_dirs(self.case_dir)
+
+    def get_split_time_dirs(self) -> List[Path]:
+        # All the split time directories of all the processor directories
+        # (complete or not)
+        processor_dirs = self.get_processor_dirs()
+        if not processor_dirs:
+            return []
+        with ThreadPoolExecutor(max_workers=self.num_scan_threads) as pool:
+            return [
+                processor_dir / t
+                for processor_dir, time_dirs in zip(
+                    processor_dirs,
+                    pool.map(self._scan_time_dirs, processor_dirs),
+                )
+                for t in time_dirs
+            ]
+
+    def get_split_time_counts(self) -> Dict[str, int]:
+        # Find out how many processor directories each split time is present
+        # in. Listing every processor directory sequentially gets slow for
+        # cases with hundreds of processors on a parallel filesystem so the
+        # directories are scanned concurrently.
+        processor_dirs = self.get_processor_dirs()
+        counts: Dict[str, int] = {}
+        if not processor_dirs:
+            return counts
+        with ThreadPoolExecutor(max_workers=self.num_scan_threads) as pool:
+            for time_dirs in pool.map(self._scan_time_dirs, processor_dirs):
+                for t in time_dirs:
+                    counts[t] = counts.get(t, 0) + 1
+        return counts
+
+    def get_split_times(self) -> List[str]:
+        return sorted(self.get_split_time_counts(), key=float)
+
+    def get_split_field_sizes(self, timestamp: str) -> Dict[str, int]:
+        # Return the fields written out for a split time along with their
+        # sizes in the first processor directory (a stand-in for their
+        # relative sizes in all the processor directories)
+        processor_dirs = self.get_processor_dirs()
+        if not processor_dirs:
+            return {}
+        try:
+            with os.scandir(processor_dirs[0] / timestamp) as entries:
+                return {
+                    entry.name: entry.stat().st_size
+                    for entry in entries
+                    if entry.is_file() and not entry.name.startswith(".")
+                }
+        except FileNotFoundError:
+            return {}
+
     def get_reconstructed_times(self) -> List[str]:
         return sorted(
-            [
-                t.name
-                for t in self.case_dir.glob("[0-9]*")
-                if t.is_dir()
-                and (t / RECONSTRUCTION_DONE_MARKER_FILENAME).is_file()
-            ],
+            self.registry.filter_reconstructed(
+                self._scan_time_dirs(self.case_dir)
+            ),
             key=float,
         )
 
+    def migrate_reconstruction_markers(self) -> List[str]:
+        # Move the times recorded with marker files over to the registry in
+        # use and remove the marker files
+        if isinstance(self.registry, MarkerFileRegistry):
+            return []
+        marker_registry = MarkerFileRegistry(self.case_dir)
+        migrated = marker_registry.filter_reconstructed(
+            self._scan_time_dirs(self.case_dir)
+        )
+        if not migrated:
+            return []
+        self.registry.mark_reconstructed(*migrated)
+        for t in migrated:
+            (self.case_dir / t / RECONSTRUCTION_DONE_MARKER_FILENAME).unlink()
+        return sorted(migrated, key=float)
+
     def get_tarred_times(self) -> List[str]:
         return sorted(
             [
@@ -62,17 +198,70 @@ class OFFileState:
             key=float,
         )
 
+    @staticmethod
+    def _is_compressed_filename(filename: str) -> bool:
+        # The format of the compressed files is times_start_end_step.ext
+        # where ext depends on the codec (see simon/archive/codecs.py)
+        if not filename.startswith("times_"):
+            return False
+        base, extension = split_compressed_extension(filename)
+        if extension is None:
+            return False
+        try:
+            _, start, end, step = base.split("_")
+            for value in [start, end, step]:
+                Decimal(value)
+        except (ValueError, decimal.InvalidOperation):
+            return False
+        return True
+
     def get_compressed_files(self) -> List[str]:
-        compressed_files = [t.name for t in self.case_dir.glob("times_*.tgz")]
+        compressed_files = [
+            t.name
+            for t in self.case_dir.glob("times_*")
+            if self._is_compressed_filename(t.name)
+        ]
         # Sort the compressed files by the start time
-        # The format of the compressed files is times_start_end_step.tgz
         return sorted(compressed_files, key=lambda fn: float(fn.split("_")[1]))
 
-    def is_reconstructed(self, timestamp: str) -> bool:
-        reconstruction_done_marker_filepath = (
-            self.case_dir / timestamp / RECONSTRUCTION_DONE_MARKER_FILENAME
+    def get_compressed_file_index(
+        self, filename: str
+    ) -> Dict[str, Tuple[int, int]]:
+        # {time: (offset, length)} of the frames of a seekable compressed
+        # file (empty when it is not seekable)
+        return read_index(self.case_dir / f"{filename}{STREAM_INDEX_SUFFIX}")
+
+    def get_stream_files(self) -> List[str]:
+        # The group archives that times are being streamed into (see
+        # simon/archive/stream.py)
+        return sorted(
+            t.name for t in self.case_dir.glob("stream_*.inprogress")
         )
-        return reconstruction_done_marker_filepath.is_file()
+
+    def get_streamed_times(self) -> Dict[str, str]:
+        # Return {time: stream file} for all the times that have been
+        # completely appended to the group archives that are being written
+        streamed_times: Dict[str, str] = {}
+        for stream_file in self.get_stream_files():
+            for t in read_index(
+                self.case_dir / f"{stream_file}{STREAM_INDEX_SUFFIX}"
+            ):
+                streamed_times[t] = stream_file
+        return streamed_times
+
+    @staticmethod
+    def create_stream_filename(window: int, compress_every: str) -> str:
+        # The group archive for the times in [window, window + 1) *
+        # compress_every while it is being written
+        return f"stream_{window}_{compress_every}.inprogress"
+
+    @staticmethod
+    def extract_stream_file_params(filename: str) -> Tuple[int, Decimal]:
+        _, window, compress_every = Path(filename).stem.split("_")
+        return (int(window), Decimal(compress_every))
+
+    def is_reconstructed(self, timestamp: str) -> bool:
+        return self.registry.is_reconstructed(timestamp)
 
     def is_tarred(self, timestamp: str) -> bool:
         if (self.case_dir / f"{timestamp}.tar").is_file():
@@ -81,29 +270,60 @@ class OFFileState:
             return False
 
     def is_compressed(self, timestamp: str) -> bool:
-        # Check if this timestamp is in any of the compressed files based on
-        # the filename
+        return self.find_compressed_file(timestamp) is not None
+
+    def find_compressed_file(self, timestamp: str) -> Optional[str]:
+        # Find the compressed file that this timestamp is in based on the
+        # filenames
         t = Decimal(timestamp)
-        for compressed_file in self.case_dir.glob("times_*.tgz"):
+        for compressed_file in self.get_compressed_files():
             start_time, end_time, step = self.extract_compressed_file_params(
-                compressed_file.name
+                compressed_file
             )
             if t < start_time:
                 continue
             if t > end_time:
                 continue
             if t % step == 0:
-                return True
-        return False
+                return compressed_file
+        return None
+
+    def get_compressed_time_files(
+        self,
+        timestamps: List[str],
+        compressed_files: Optional[List[str]] = None,
+    ) -> Dict[str, str]:
+        # Return {timestamp: compressed file} for the timestamps that are in
+        # any of the compressed files. This parses the names of the
+        # compressed files once instead of once per timestamp like
+        # find_compressed_file does.
+        if compressed_files is None:
+            compressed_files = self.get_compressed_files()
+        ranges = sorted(
+            (*self.extract_compressed_file_params(f), f)
+            for f in compressed_files
+        )
+        start_times = [start_time for start_time, _, _, _ in ranges]
+        # The latest end time of all the compressed files up to each index
+        latest_end_times = list(
+            itertools.accumulate((end for _, end, _, _ in ranges), max)
+        )
+        compressed_times: Dict[str, str] = {}
+        for timestamp in timestamps:
+            t = Decimal(timestamp)
+            # Only the compressed files starting at or before t can hold it
+            # and we can stop as soon as none of the remaining ones reach t
+            i = bisect.bisect_right(start_times, t) - 1
+            while i >= 0 and latest_end_times[i] >= t:
+                _, end_time, step, compressed_file = ranges[i]
+                if t <= end_time and t % step == 0:
+                    compressed_times[timestamp] = compressed_file
+                    break
+                i -= 1
+        return compressed_times
 
     def is_compressed_file(self, filename: str) -> bool:
-        if not filename.endswith(".tgz"):
-            return False
-        if not filename.startswith("times_"):
-            return False
-        try:
-            self.extract_compressed_file_params(filename)
-        except decimal.InvalidOperation:
+        if not self._is_compressed_filename(filename):
             return False
         if (self.case_dir / filename).is_file():
             return True
@@ -121,13 +341,15 @@ class OFFileState:
         # This checks that the split timestamp directory exists in at least one
         # of the processor directories. It does not make any guarantees that it
         # is fully written
-        for processor_directory in self.case_dir.glob("processor*"):
+        for processor_directory in self.get_processor_dirs():
             if (processor_directory / timestamp).is_dir():
                 return True
         return False
 
     @staticmethod
-    def create_compressed_filename(start: str, end: str, step: str) -> str:
+    def create_compressed_filename(
+        start: str, end: str, step: str, extension: str = "tgz"
+    ) -> str:
         try:
             Decimal(start)
         except decimal.InvalidOperation:
@@ -146,14 +368,15 @@ class OFFileState:
             raise ValueError(
                 f"step {step} must be a string that can be turned into a float"
             )
-        return f"times_{start}_{end}_{step}.tgz"
+        return f"times_{start}_{end}_{step}.{extension}"
 
     @staticmethod
     def extract_compressed_file_params(
         filename: str,
     ) -> Tuple[Decimal, Decimal, Decimal]:
-        # Remove the file extension
-        filename = Path(filename).stem
+        # Remove the file extension (which can have more than one part, e.g.
+        # .tar.zst)
+        filename, _ = split_compressed_extension(Path(filename).name)
         # Everything should now be separated by underscores
         _, start, end, step = filename.split("_")
         return (Decimal(start), Decimal(end), Decimal(step))
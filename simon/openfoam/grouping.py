@@ -0,0 +1,140 @@
+import math
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+
+class CompressionGrouper:
+    """Buckets tarred times into compress_every windows as they appear
+
+    Window i holds the times t with i * compress_every <= t < (i + 1) *
+    compress_every. Every tarred time is parsed and put into its window only
+    once, when it first shows up, and a window is handed back as a
+    compression candidate as soon as it holds compress_every / keep_every
+    times, so the cost per update scales with the number of tars that came
+    or went rather than with the number of tars on the disk.
+
+    With max_bytes, a window is split into groups of consecutive times that
+    are closed as soon as their tars add up to max_bytes (or the window
+    ends), whichever comes first. Every group still covers all the keep_every
+    times from its first to its last one so that its name says which times
+    it holds.
+    """
+
+    def __init__(
+        self,
+        keep_every: Decimal,
+        compress_every: Decimal,
+        max_bytes: Optional[int] = None,
+        size_of: Optional[Callable[[str], int]] = None,
+    ) -> None:
+        self.keep_every = keep_every
+        self.compress_every = compress_every
+        # compress_every is a multiple of keep_every
+        self.num_times_per_window = int(compress_every / keep_every)
+        if max_bytes is not None and size_of is None:
+            raise ValueError("The sizes of the tars are needed for max_bytes")
+        self.max_bytes = max_bytes
+        self._size_of = size_of
+        self._windows: Dict[int, Set[str]] = {}
+        self._window_of: Dict[str, int] = {}
+        # The size of every tar, taken when it shows up (the tars are moved
+        # into place once they have been written)
+        self._sizes: Dict[str, int] = {}
+
+    def window_index(self, timestamp: str) -> int:
+        return math.floor(Decimal(timestamp) / self.compress_every)
+
+    def update(
+        self,
+        tarred_times: Iterable[str],
+        find_archived: Optional[Callable[[List[str]], Set[str]]] = None,
+    ) -> List[List[str]]:
+        # Return the windows (or groups of them with max_bytes) that became
+        # full since the last update, each as its sorted list of times.
+        # find_archived tells which of the given times are already in (or
+        # on their way into) a compressed file, which ends the groups that
+        # come before them.
+        current = set(tarred_times)
+        for t in self._window_of.keys() - current:
+            i = self._window_of.pop(t)
+            self._sizes.pop(t, None)
+            self._windows[i].discard(t)
+            if not self._windows[i]:
+                del self._windows[i]
+        touched: Set[int] = set()
+        for t in current - self._window_of.keys():
+            i = self.window_index(t)
+            self._window_of[t] = i
+            self._windows.setdefault(i, set()).add(t)
+            if self._size_of is not None:
+                self._sizes[t] = self._size_of(t)
+            touched.add(i)
+        candidates: List[List[str]] = []
+        for i in sorted(touched):
+            if self.max_bytes is not None:
+                candidates.extend(self._split_window(i, find_archived))
+            elif len(self._windows[i]) >= self.num_times_per_window:
+                times = sorted(self._windows[i], key=Decimal)
+                candidates.append(times[: self.num_times_per_window])
+        return candidates
+
+    def _split_window(
+        self,
+        i: int,
+        find_archived: Optional[Callable[[List[str]], Set[str]]],
+    ) -> List[List[str]]:
+        # Walk the keep_every times of window i in order, closing a group
+        # whenever its tars reach max_bytes. The walk stops at the first
+        # time that has not been tarred yet (the group it would be in is not
+        # complete).
+        assert self.max_bytes is not None
+        tarred = {Decimal(t): t for t in self._windows[i]}
+        start = i * self.compress_every
+        grid = [
+            start + k * self.keep_every
+            for k in range(self.num_times_per_window)
+        ]
+        archived: Set[Decimal] = set()
+        if find_archived is not None:
+            archived = {
+                Decimal(t)
+                for t in find_archived([tarred.get(t, str(t)) for t in grid])
+            }
+        groups: List[List[str]] = []
+        group: List[str] = []
+        num_bytes = 0
+        for t in grid:
+            if t in archived:
+                # Nothing after it can join the group
+                if group:
+                    groups.append(group)
+                group, num_bytes = [], 0
+                continue
+            if t not in tarred:
+                return groups
+            group.append(tarred[t])
+            num_bytes += self._sizes.get(tarred[t], 0)
+            if num_bytes >= self.max_bytes:
+                groups.append(group)
+                group, num_bytes = [], 0
+        if group:
+            groups.append(group)
+        return groups
+
+    def __len__(self) -> int:
+        return len(self._window_of)
+
+
+def partition_by_size(
+    sizes: Dict[str, int], num_parts: int
+) -> List[List[str]]:
+    # Split the items into at most num_parts groups of about the same total
+    # size by putting the largest remaining item into the smallest group
+    # (the one with the fewest items when they are just as big)
+    groups: List[List[str]] = [[] for _ in range(min(num_parts, len(sizes)))]
+    totals = [0] * len(groups)
+    for name in sorted(sizes, key=lambda name: (-sizes[name], name)):
+        i = min(range(len(groups)), key=lambda i: (totals[i], len(groups[i])))
+        groups[i].append(name)
+        totals[i] += sizes[name]
+    return [sorted(group) for group in groups]
@@ -0,0 +1,177 @@
+import bisect
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+class TimeRanges:
+    """A compact set of times
+
+    Times that are integer multiples of step are stored as runs of
+    consecutive multiples ([first, last] index pairs) so that a month of kept
+    times takes a handful of ranges instead of one string per time. Any other
+    times are kept as they are in a plain set.
+    """
+
+    def __init__(self, step: Optional[Decimal] = None) -> None:
+        self.step = step
+        # Sorted, non-overlapping and non-adjacent ranges of indices
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+        self._off_grid: Set[Decimal] = set()
+
+    def _index(self, t: Decimal) -> Optional[int]:
+        if self.step is None:
+            return None
+        i, remainder = divmod(t, self.step)
+        if remainder:
+            return None
+        return int(i)
+
+    def add(self, timestamp: str) -> None:
+        t = Decimal(timestamp)
+        i = self._index(t)
+        if i is None:
+            self._off_grid.add(t)
+            return
+        pos = bisect.bisect_right(self._starts, i) - 1
+        if pos >= 0 and self._ends[pos] >= i:
+            # Already in a range
+            return
+        joins_left = pos >= 0 and self._ends[pos] == i - 1
+        joins_right = (
+            pos + 1 < len(self._starts) and self._starts[pos + 1] == i + 1
+        )
+        if joins_left and joins_right:
+            self._ends[pos] = self._ends[pos + 1]
+            del self._starts[pos + 1]
+            del self._ends[pos + 1]
+        elif joins_left:
+            self._ends[pos] = i
+        elif joins_right:
+            self._starts[pos + 1] = i
+        else:
+            self._starts.insert(pos + 1, i)
+            self._ends.insert(pos + 1, i)
+
+    def discard_off_grid(self, timestamps: Iterable[str]) -> None:
+        # Forget the given times if they are not multiples of step
+        for timestamp in timestamps:
+            self._off_grid.discard(Decimal(timestamp))
+
+    def __contains__(self, timestamp: object) -> bool:
+        if not isinstance(timestamp, str):
+            return False
+        t = Decimal(timestamp)
+        i = self._index(t)
+        if i is None:
+            return t in self._off_grid
+        pos = bisect.bisect_right(self._starts, i) - 1
+        return pos >= 0 and self._ends[pos] >= i
+
+    def __len__(self) -> int:
+        return len(self._off_grid) + sum(
+            end - start + 1 for start, end in zip(self._starts, self._ends)
+        )
+
+    @property
+    def num_ranges(self) -> int:
+        return len(self._starts)
+
+    def times(self) -> Iterable[Decimal]:
+        assert self.step is not None or not self._starts
+        for start, end in zip(self._starts, self._ends):
+            for i in range(start, end + 1):
+                yield i * self.step  # type: ignore
+        yield from self._off_grid
+
+    def rebased(self, step: Optional[Decimal]) -> "TimeRanges":
+        # Return the same set of times stored over a different step
+        rebased = TimeRanges(step)
+        for t in self.times():
+            rebased.add(str(t))
+        return rebased
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "step": None if self.step is None else str(self.step),
+            "ranges": [
+                [start, end] for start, end in zip(self._starts, self._ends)
+            ],
+            "times": sorted(str(t) for t in self._off_grid),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TimeRanges":
+        step = data["step"]
+        time_ranges = cls(None if step is None else Decimal(step))
+        for start, end in data["ranges"]:
+            time_ranges._starts.append(int(start))
+            time_ranges._ends.append(int(end))
+        time_ranges._off_grid = {Decimal(t) for t in data["times"]}
+        return time_ranges
+
+
+class ProcessedTimes:
+    """The times that a stage of the listener has already dealt with
+
+    Every call to pending compares the current listing of the stage against
+    the listing from the previous call (as hash sets) so that only the times
+    that appeared since then, plus the ones that were left unprocessed, are
+    handed back. The cost per call therefore scales with the number of changes
+    rather than with the history of the case. The processed times are kept in
+    a TimeRanges over step; the ones that are not multiples of step are
+    forgotten once they are gone from the disk so the memory stays bounded.
+    """
+
+    def __init__(self, step: Optional[Decimal] = None) -> None:
+        self._processed = TimeRanges(step)
+        # The listing seen on the previous call to pending
+        self._snapshot: Set[str] = set()
+        # Times in the snapshot that have not been processed yet
+        self._pending: Set[str] = set()
+        # Whether to recheck every time on the disk on the next call to pending
+        self._recheck = False
+
+    def pending(self, current: Iterable[str]) -> List[str]:
+        # Return the times in current that still need to be processed, in
+        # increasing order
+        current_set = set(current)
+        new_times = current_set - self._snapshot
+        if self._recheck:
+            self._pending |= new_times
+            self._recheck = False
+        else:
+            self._pending |= {
+                t for t in new_times if t not in self._processed
+            }
+        self._pending &= current_set
+        self._processed.discard_off_grid(self._snapshot - current_set)
+        self._snapshot = current_set
+        return sorted(self._pending, key=float)
+
+    def add(self, timestamp: str) -> None:
+        # Mark timestamp as processed
+        self._processed.add(timestamp)
+        self._pending.discard(timestamp)
+
+    def rebase(self, step: Optional[Decimal]) -> None:
+        self._processed = self._processed.rebased(step)
+
+    def __contains__(self, timestamp: object) -> bool:
+        return timestamp in self._processed
+
+    def __len__(self) -> int:
+        return len(self._processed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._processed.to_dict()
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProcessedTimes":
+        processed_times = cls()
+        processed_times._processed = TimeRanges.from_dict(data)
+        # Any times still on the disk were possibly being worked on when
+        # this was saved, so look at them again instead of trusting that
+        # their tasks finished
+        processed_times._recheck = True
+        return processed_times
@@ -1,13 +1,35 @@
-import math
+import json
+import os
 from decimal import Decimal
 from pathlib import Path
-from typing import List, Protocol
+from typing import Any, Dict, List, Optional, Protocol, Set, Tuple
 
+from simon.archive import compact, delta, module_command
+from simon.archive.catalog import ArchiveCatalog
+from simon.archive.codecs import GZIP, Codec
+from simon.archive.manifest import MANIFEST_SUFFIX
+from simon.cluster.quota import QuotaMonitor
+from simon.openfoam.completion import WriteCompletionDetector
 from simon.openfoam.file_state import (RECONSTRUCTION_DONE_MARKER_FILENAME,
+                                       RECONSTRUCTION_PART_MARKER_PREFIX,
                                        OFFileState)
+from simon.openfoam.grouping import CompressionGrouper, partition_by_size
+from simon.openfoam.history import ProcessedTimes
+from simon.openfoam.timegrid import TimeGrid
+from simon.openfoam.usage import OFUsageTracker
 from simon.task import Task
 
 
+ARCHIVE_MODES = ["tar", "stream"]
+# Run by the stream, catalog, compact, tar and delete tasks
+STREAM_ARCHIVER = module_command("stream")
+CATALOGER = module_command("catalog")
+COMPACTOR = module_command("compact")
+MANIFEST_TOOL = module_command("manifest")
+# Where monitor keeps the history of the listener between runs
+HISTORY_FILENAME = ".simon_history.json"
+
+
 class ExternalJobManager(Protocol):
     def requeue_job(self) -> None:
         ...
@@ -15,6 +37,12 @@ class ExternalJobManager(Protocol):
     def compress(self, tgz_file: str, files: List[str]) -> None:
         ...
 
+    def hold_job(self) -> None:
+        ...
+
+    def release_job(self) -> None:
+        ...
+
 
 class OFListener:
     def __init__(
@@ -25,6 +53,20 @@ class OFListener:
         compress_every: Decimal,
         cluster: ExternalJobManager,
         requeue: bool = True,
+        usage: Optional[OFUsageTracker] = None,
+        quota: Optional[QuotaMonitor] = None,
+        hold_job_when_draining: bool = False,
+        completion: Optional[WriteCompletionDetector] = None,
+        reconstruct_batch_size: int = 1,
+        reconstruct_field_parts: int = 1,
+        fields: Optional[List[str]] = None,
+        archive_mode: str = "tar",
+        codec: Codec = GZIP,
+        catalog: Optional[ArchiveCatalog] = None,
+        delta_fields: Optional[List[str]] = None,
+        keyframe_every: int = delta.KEYFRAME_EVERY,
+        max_group_bytes: Optional[int] = None,
+        compact_bytes: Optional[int] = None,
     ) -> None:
         self.state = state
         self.__verify_compress_every_and_keep_every_are_valid(
@@ -34,144 +76,451 @@ class OFListener:
         self._compress_every = compress_every
         self.cluster = cluster
         self.requeue = requeue
+        self.usage = usage
+        self.quota = quota
+        self.hold_job_when_draining = hold_job_when_draining
+        self.completion = completion
+        if reconstruct_batch_size < 1:
+            raise ValueError(
+                "reconstruct_batch_size must be at least 1"
+                f" (got {reconstruct_batch_size})"
+            )
+        self.reconstruct_batch_size = reconstruct_batch_size
+        # How many concurrent reconstructPar runs to split the fields of a
+        # time over when it gets reconstructed on its own
+        self.reconstruct_field_parts = reconstruct_field_parts
+        # The fields to keep (all of them when None). The others are not
+        # reconstructed or archived and go when their split time is deleted.
+        self.fields = fields
+        if archive_mode not in ARCHIVE_MODES:
+            raise ValueError(
+                f"Unknown archive mode {archive_mode}"
+                f" (choose from {', '.join(ARCHIVE_MODES)})"
+            )
+        # Whether reconstructed times get tarred (and the tars grouped into
+        # compressed files later) or streamed straight into the compressed
+        # group archive of their window
+        self.archive_mode = archive_mode
+        # What the cluster compresses the tars with, which decides the
+        # extension of the compressed files. The stream archives are always
+        # gzip (the stream appender only uses the standard library).
+        self.codec = codec
+        if delta_fields and archive_mode != "stream":
+            raise ValueError(
+                "Fields can only be stored as patches in the stream archives"
+            )
+        if keyframe_every < 1:
+            raise ValueError(
+                f"keyframe_every must be at least 1 (got {keyframe_every})"
+            )
+        # The fields that the stream archives store as patches against
+        # their latest full version (every keyframe_every-th time is stored
+        # in full)
+        self.delta_fields = delta_fields
+        self.keyframe_every = keyframe_every
+        if max_group_bytes is not None and max_group_bytes < 1:
+            raise ValueError(
+                f"max_group_bytes must be at least 1 (got {max_group_bytes})"
+            )
+        # The tars of a compress_every window are split into compressed
+        # files of about this many bytes (they are grouped by the window
+        # alone when None)
+        self.max_group_bytes = max_group_bytes
+        if compact_bytes is not None and compact_bytes < 1:
+            raise ValueError(
+                f"compact_bytes must be at least 1 (got {compact_bytes})"
+            )
+        # Adjacent compressed files smaller than this get merged into ones
+        # of up to this many bytes (they are left as they are when None)
+        self.compact_bytes = compact_bytes
+        # {merged compressed file: the compressed files merged into it}
+        self._requested_compactions: Dict[str, List[str]] = {}
+        # {compressed file: (bytes, whether it is seekable)}. They are only
+        # moved into place once they are complete and never change after
+        # that, so they are looked at once.
+        self._compressed_file_info: Dict[str, Tuple[int, bool]] = {}
+        # Records the times held by every compressed file as they appear
+        self.catalog = catalog
+        self._requested_catalog_files: Set[str] = set()
+        self.latest_split_time: Optional[str] = None
+        self.draining = False
         self._requeued = False
-        self._processed_split_times: List[str] = []
-        self._processed_reconstructed_times: List[str] = []
-        self._deleted_reconstructed_times: List[str] = []
-        self._requested_compressed_files: List[str] = []
-        self._deleted_tarred_times: List[str] = []
+        self._processed_split_times = ProcessedTimes(keep_every)
+        # The latest split times that were reconstructed before a later
+        # time was written (they are kept until then)
+        self._reconstructed_latest_times: Set[str] = set()
+        self._processed_reconstructed_times = ProcessedTimes(keep_every)
+        self._deleted_reconstructed_times = ProcessedTimes(keep_every)
+        self._requested_compressed_files: Set[str] = set()
+        self._requested_tar_times: Set[str] = set()
+        self._deleted_tarred_times = ProcessedTimes(keep_every)
+        self._keep_grid = TimeGrid(keep_every)
+        self._compression_grouper = self._create_compression_grouper()
 
     def get_new_tasks(self) -> List[Task]:
         new_tasks: List[Task] = []
+        # Keep the per-stage file accounting up to date with whatever the
+        # previously generated tasks have done
+        if self.usage is not None:
+            self.usage.update()
+        self._update_drain_mode()
         # Get the current state of the files
-        split_times = self.state.get_split_times()
+        split_time_counts = self.state.get_split_time_counts()
+        split_times = sorted(split_time_counts, key=float)
+        self.latest_split_time = split_times[-1] if split_times else None
         reconstructed_times = self.state.get_reconstructed_times()
         tarred_times = self.state.get_tarred_times()
         compressed_files = self.state.get_compressed_files()
+        # Once a requested compressed file exists it no longer needs to be
+        # remembered (it gets checked for before being requested again)
+        self._requested_compressed_files.difference_update(compressed_files)
         # Generate the new tasks based on the current state
-        new_tasks.extend(self._process_split_times(split_times))
         new_tasks.extend(
-            self._process_reconstructed_times(reconstructed_times, split_times)
+            self._process_split_times(split_times, split_time_counts)
+        )
+        # {time: the archive it is in}
+        archived_times: Dict[str, str] = {}
+        if self.archive_mode == "stream":
+            streamed_times = self.state.get_streamed_times()
+            archived_times.update(streamed_times)
+            archived_times.update(
+                self.state.get_compressed_time_files(
+                    reconstructed_times, compressed_files
+                )
+            )
+            new_tasks.extend(self._finalize_streams(streamed_times))
+        new_tasks.extend(
+            self._process_reconstructed_times(
+                reconstructed_times, split_times, archived_times
+            )
+        )
+        new_tasks.extend(
+            self._process_tarred_times(tarred_times, compressed_files)
+        )
+        new_tasks.extend(
+            self._process_compressed_files(tarred_times, compressed_files)
+        )
+        new_tasks.extend(self._catalog_compressed_files(compressed_files))
+        new_tasks.extend(
+            self._compact_compressed_files(
+                compressed_files, tarred_times + reconstructed_times
+            )
         )
-        new_tasks.extend(self._process_tarred_times(tarred_times))
-        new_tasks.extend(self._process_compressed_files(tarred_times))
         return new_tasks
 
-    def _process_split_times(self, split_times: List[str]) -> List[Task]:
+    def _update_drain_mode(self) -> None:
+        # In drain mode, no new reconstructions are started (they are the
+        # only tasks that create files before any get removed) so that the
+        # tasks that free up space get to run
+        if self.quota is None:
+            return
+        # (monitor reports the switches along with the usage)
+        draining = self.quota.update()
+        if self.hold_job_when_draining:
+            if draining and not self.draining:
+                self.cluster.hold_job()
+            elif not draining and self.draining:
+                self.cluster.release_job()
+        self.draining = draining
+
+    def _process_split_times(
+        self, split_times: List[str], split_time_counts: Dict[str, int]
+    ) -> List[Task]:
         new_tasks: List[Task] = []
-        # Remove the last split time from consideration. This is because it is
-        # possible that OpenFOAM is still writing out the last split time
-        # files, in which case, it's not ready for further processing
-        # (reconstruction) yet.
-        for t in split_times[:-1]:
-            if t in self._processed_split_times:
+        num_processors = len(self.state.get_processor_dirs())
+        to_reconstruct: List[str] = []
+        pending_times = self._processed_split_times.pending(split_times)
+        # Whether each of them is one of the times to keep
+        kept = dict(
+            zip(pending_times, self._keep_grid.classify(pending_times))
+        )
+        for t in pending_times:
+            if t in self._reconstructed_latest_times:
+                if t == split_times[-1] or not self._is_archived(t):
+                    # Still the latest or still being reconstructed
+                    continue
+                # Its reconstructed time deletes it from here on
+                # (_process_reconstructed_times) unless it has been
+                # archived and deleted already
+                if not self.state.is_reconstructed(t):
+                    new_tasks.append(self._create_delete_split_task(t))
+                self._reconstructed_latest_times.discard(t)
+                self._processed_split_times.add(t)
                 continue
-            if self._delete_without_processing(Decimal(t)):
+            if t == split_times[-1]:
+                # It is possible that OpenFOAM is still writing out the last
+                # split time files, in which case, it's not ready for further
+                # processing (reconstruction) yet. It is also where the job
+                # restarts from so it never gets deleted.
+                if not kept[t] or not self._is_write_complete(t):
+                    continue
+                if self.state.is_reconstructed(t) or self.state.is_tarred(t):
+                    continue
+            if not kept[t]:
                 new_tasks.append(self._create_delete_split_task(t))
-                self._processed_split_times.append(t)
+                self._processed_split_times.add(t)
             elif self.state.is_reconstructed(t) or self.state.is_tarred(t):
                 new_tasks.append(self._create_delete_split_task(t))
-                self._processed_split_times.append(t)
+                self._processed_split_times.add(t)
+            elif self.draining:
+                # Leave it for when we are out of drain mode
+                continue
+            elif split_time_counts.get(t, 0) < num_processors:
+                # Some of the processors have not written this time out yet
+                # so reconstructPar would fail on it. Don't mark it as
+                # processed so that it gets picked up again once it is
+                # complete.
+                print(
+                    f"Split time {t} is present on"
+                    f" {split_time_counts.get(t, 0)} of {num_processors}"
+                    " processors. Waiting for the rest..."
+                )
             else:
-                new_tasks.append(self._create_reconstruct_task(t))
-                self._processed_split_times.append(t)
+                to_reconstruct.append(t)
+                if t == split_times[-1]:
+                    # Its split time can only go once a later time has
+                    # been written
+                    self._reconstructed_latest_times.add(t)
+                else:
+                    self._processed_split_times.add(t)
                 if self.requeue and not self._requeued:
                     self.cluster.requeue_job()
+        new_tasks.extend(self._create_reconstruct_tasks(to_reconstruct))
         return new_tasks
 
+    def _is_archived(self, timestamp: str) -> bool:
+        # Whether the reconstructed time is done with or is in an archive
+        if self.state.is_reconstructed(timestamp):
+            return True
+        if self.state.is_tarred(timestamp):
+            return True
+        if self.state.is_compressed(timestamp):
+            return True
+        return (
+            self.archive_mode == "stream"
+            and timestamp in self.state.get_streamed_times()
+        )
+
+    def _is_write_complete(self, timestamp: str) -> bool:
+        if self.completion is None:
+            return False
+        return self.completion.is_complete(timestamp)
+
     def _process_reconstructed_times(
-        self, reconstructed_times: List[str], split_times: List[str]
+        self,
+        reconstructed_times: List[str],
+        split_times: List[str],
+        archived_times: Optional[Dict[str, str]] = None,
     ) -> List[Task]:
         new_tasks: List[Task] = []
-        for t in reconstructed_times:
-            if t in self._processed_reconstructed_times:
-                continue
-            if not self.state.is_tarred(t):
+        # Only the last split time can stay reconstructed across updates
+        # (its split time is kept) so don't ask for it to be archived again
+        self._requested_tar_times &= set(reconstructed_times)
+        for t in self._processed_reconstructed_times.pending(
+            reconstructed_times
+        ):
+            if t in self._requested_tar_times:
+                pass
+            elif self.archive_mode == "stream":
+                # Streamed times are removed by the stream task itself
+                if archived_times is not None and t in archived_times:
+                    new_tasks.append(
+                        self._create_delete_reconstructed_task(
+                            t, archive=archived_times[t]
+                        )
+                    )
+                else:
+                    new_tasks.append(self._create_stream_task(t))
+                self._requested_tar_times.add(t)
+            elif not self.state.is_tarred(t):
                 new_tasks.append(self._create_tar_task(t))
+                self._requested_tar_times.add(t)
             # Delete its split time if it is not the last split time
             if split_times and t != split_times[-1]:
                 new_tasks.append(self._create_delete_split_task(t))
                 # Mark the time as completed if the split time is deleted
                 # because the tar task has already been dealt with
-                self._processed_reconstructed_times.append(t)
+                self._processed_reconstructed_times.add(t)
         return new_tasks
 
-    def _process_tarred_times(self, tarred_times: List[str]) -> List[Task]:
+    def _finalize_streams(self, streamed_times: Dict[str, str]) -> List[Task]:
+        # A group archive is complete once all the times of its window have
+        # been appended to it
         new_tasks: List[Task] = []
-        for t in tarred_times:
-            if t in self._deleted_reconstructed_times:
+        times_per_stream: Dict[str, List[str]] = {}
+        for t, stream_file in streamed_times.items():
+            times_per_stream.setdefault(stream_file, []).append(t)
+        for stream_file, times in times_per_stream.items():
+            _, compress_every = self.state.extract_stream_file_params(
+                stream_file
+            )
+            if len(times) < int(compress_every / self.keep_every):
                 continue
-            new_tasks.append(self._create_delete_reconstructed_task(t))
-            self._deleted_reconstructed_times.append(t)
-        self._compress_tars(tarred_times)
+            times.sort(key=Decimal)
+            final_filename = self.state.create_compressed_filename(
+                start=times[0], end=times[-1], step=str(self.keep_every)
+            )
+            if final_filename in self._requested_compressed_files:
+                continue
+            new_tasks.append(
+                self._create_finalize_stream_task(stream_file, final_filename)
+            )
+            self._requested_compressed_files.add(final_filename)
         return new_tasks
 
-    def _compress_tars(self, tarred_times: List[str]) -> None:
-        # We can find how many timestamps are in each compression candidate
-        # because compress_every is a multiple of keep_every
-        num_tars_to_compress = int(self.compress_every / self.keep_every)
-        # If we don't have enough tars, then we can just quit here
-        if len(tarred_times) < num_tars_to_compress:
-            return
-        # Idea:
-        # let ce = how often we need to compress files (compress_every)
-        # let t0 = the first tarred time available
-        # let tN = the last tarred time available
-        t0 = Decimal(tarred_times[0])
-        tN = Decimal(tarred_times[-1])
-        # Let i be an integer > 1
-        # Then we can express the start times as: ts_i = i * ce
-        # We'll define the end times as: te_i = ts_i + ce
-        # This should work similar to python range objects which do not include
-        # the end value in the list of items
-        # Now we can find the list of start times that are currently available
-        # To do this, we can find the values of i corresponding to the first
-        # available start time and last available start time
-        i_start = math.floor(t0 / self.compress_every)
-        i_end = math.ceil(tN / self.compress_every)
-        start_times = iter(
-            [i * self.compress_every for i in range(i_start, i_end + 1)]
-        )
-        # Now we can loop over the available times to see if we have the tars
-        # needed for each compression candidate
-        # And all the times are sorted so that should make things a lot easier
-        ts = next(start_times)
-        # Next we can find the corresponding end time
-        te = ts + self.compress_every
-        # Create a list that will store the current compression candidate
-        compression_candidate: List[str] = []
-        for t in tarred_times:
-            if Decimal(t) < ts:
+    def _process_tarred_times(
+        self,
+        tarred_times: List[str],
+        compressed_files: Optional[List[str]] = None,
+    ) -> List[Task]:
+        new_tasks: List[Task] = []
+        for t in self._deleted_reconstructed_times.pending(tarred_times):
+            new_tasks.append(
+                self._create_delete_reconstructed_task(t, archive=f"{t}.tar")
+            )
+            self._deleted_reconstructed_times.add(t)
+        self._compress_tars(tarred_times, compressed_files)
+        return new_tasks
+
+    def _compress_tars(
+        self,
+        tarred_times: List[str],
+        compressed_files: Optional[List[str]] = None,
+    ) -> None:
+        # Only the tars that appeared since the last update get bucketed into
+        # their compression windows, and the windows that just became full
+        # (or their groups that reached max_group_bytes) are the compression
+        # candidates
+        if compressed_files is None:
+            compressed_files = self.state.get_compressed_files()
+        # The times of the compressed files that have been requested are
+        # already taken as well
+        archives = compressed_files + sorted(
+            self._requested_compressed_files
+        )
+
+        def find_archived(timestamps: List[str]) -> Set[str]:
+            return set(
+                self.state.get_compressed_time_files(timestamps, archives)
+            )
+
+        for compression_candidate in self._compression_grouper.update(
+            tarred_times, find_archived
+        ):
+            tgz_filename = self.state.create_compressed_filename(
+                start=compression_candidate[0],
+                end=compression_candidate[-1],
+                step=str(self.keep_every),
+                extension=self.codec.extension,
+            )
+            if tgz_filename in self._requested_compressed_files:
                 continue
-            if Decimal(t) >= te:
-                # We've started the next compression candidate
-                ts = next(start_times)
-                te = ts + self.compress_every
-                compression_candidate = []
-            compression_candidate.append(t)
-            if len(compression_candidate) == num_tars_to_compress:
-                # We've found a complete compression candidate
-                tgz_filename = self.state.create_compressed_filename(
-                    start=compression_candidate[0],
-                    end=compression_candidate[-1],
-                    step=str(self.keep_every),
-                )
-                if tgz_filename in self._requested_compressed_files:
-                    continue
-                if self.state.is_compressed_file(tgz_filename):
-                    continue
-                self.cluster.compress(tgz_filename, compression_candidate)
-                self._requested_compressed_files.append(tgz_filename)
+            if self.state.is_compressed_file(tgz_filename):
+                continue
+            self.cluster.compress(
+                tgz_filename, [f"{t}.tar" for t in compression_candidate]
+            )
+            self._requested_compressed_files.add(tgz_filename)
 
-    def _process_compressed_files(self, tarred_times: List[str]) -> List[Task]:
+    def _process_compressed_files(
+        self, tarred_times: List[str], compressed_files: List[str]
+    ) -> List[Task]:
         new_tasks: List[Task] = []
-        for t in tarred_times:
-            if not self.state.is_compressed(t):
+        pending_times = self._deleted_tarred_times.pending(tarred_times)
+        for t, compressed_file in self.state.get_compressed_time_files(
+            pending_times, compressed_files
+        ).items():
+            new_tasks.append(self._create_delete_tar_task(t, compressed_file))
+            self._deleted_tarred_times.add(t)
+        return new_tasks
+
+    def _catalog_compressed_files(
+        self, compressed_files: List[str]
+    ) -> List[Task]:
+        # Cataloging does not free up any space so it waits until the
+        # draining is over
+        if self.catalog is None or self.draining:
+            return []
+        uncataloged = self.catalog.uncataloged(
+            self.state.case_dir, compressed_files
+        )
+        # The ones that have been cataloged since they were requested no
+        # longer need to be remembered
+        self._requested_catalog_files.intersection_update(uncataloged)
+        new_tasks: List[Task] = []
+        for compressed_file in uncataloged:
+            if compressed_file in self._requested_catalog_files:
                 continue
-            if t in self._deleted_tarred_times:
+            new_tasks.append(self._create_catalog_task(compressed_file))
+            self._requested_catalog_files.add(compressed_file)
+        return new_tasks
+
+    def _compact_compressed_files(
+        self, compressed_files: List[str], busy_times: List[str]
+    ) -> List[Task]:
+        # Compaction rewrites archives without freeing up much space so it
+        # waits until the draining is over
+        if self.compact_bytes is None or self.draining:
+            return []
+        existing = set(compressed_files)
+        unfinished = compact.find_merged(self.state.case_dir)
+        # The compactions whose inputs (and records) are all gone are done
+        self._requested_compactions = {
+            output: inputs
+            for output, inputs in self._requested_compactions.items()
+            if existing.intersection(inputs) or output in unfinished
+        }
+        taken: Set[str] = set(self._requested_catalog_files)
+        for output, inputs in self._requested_compactions.items():
+            taken.add(output)
+            taken.update(inputs)
+        # The compressed files that tars or reconstructed times are still
+        # waiting on to be deleted have to stay where they are
+        taken.update(
+            self.state.get_compressed_time_files(
+                busy_times, compressed_files
+            ).values()
+        )
+        new_tasks: List[Task] = []
+        # Finish the compactions that were interrupted (only the compressed
+        # files in their records get removed)
+        for output, inputs in unfinished.items():
+            if taken.intersection([output, *inputs]):
+                continue
+            new_tasks.append(self._create_compact_task(output, inputs))
+            self._requested_compactions[output] = inputs
+            taken.add(output)
+            taken.update(inputs)
+        candidates = [f for f in compressed_files if f not in taken]
+        self._compressed_file_info = {
+            f: info
+            for f, info in self._compressed_file_info.items()
+            if f in existing
+        }
+        for f in candidates:
+            if f in taken or f in self._compressed_file_info:
+                continue
+            try:
+                size = (self.state.case_dir / f).stat().st_size
+            except FileNotFoundError:
                 continue
-            new_tasks.append(self._create_delete_tar_task(t))
-            self._deleted_tarred_times.append(t)
+            self._compressed_file_info[f] = (
+                size,
+                bool(self.state.get_compressed_file_index(f)),
+            )
+        candidates = [
+            f
+            for f in candidates
+            if f not in taken and f in self._compressed_file_info
+        ]
+        sizes = {f: self._compressed_file_info[f][0] for f in candidates}
+        seekable = [f for f in candidates if self._compressed_file_info[f][1]]
+        for inputs in compact.plan(
+            candidates, sizes, self.compact_bytes, seekable
+        ):
+            output = compact.compacted_name(inputs)
+            new_tasks.append(self._create_compact_task(output, inputs))
+            self._requested_compactions[output] = inputs
         return new_tasks
 
     def get_cleanup_tasks(self) -> List[Task]:
@@ -242,17 +591,34 @@ class OFListener:
             untar_command = (
                 f"tar -xvf {tar_path} --directory={self.state.case_dir}"
             )
-            reconstruction_done_marker_filepath = (
-                Path(self.state.case_dir)
-                / newest_tar_time
-                / RECONSTRUCTION_DONE_MARKER_FILENAME
+            post_untar_command = self.state.registry.create_mark_command(
+                newest_tar_time
             )
-            post_untar_command = f"touch {reconstruction_done_marker_filepath}"
             command = " && ".join([untar_command, post_untar_command])
             task = Task(command=command)
             task.run(block=True)
             print("Restored a reconstructed time! Ready to proceed!")
             return
+        # Otherwise, pull the last archived time out of the newest seekable
+        # compressed file (only the bytes of that time get read)
+        for compressed_file in reversed(self.state.get_compressed_files()):
+            index = self.state.get_compressed_file_index(compressed_file)
+            if not index:
+                continue
+            newest_time = max(index, key=Decimal)
+            print(f"Extracting {newest_time} from {compressed_file}...")
+            extract_command = (
+                f"{STREAM_ARCHIVER} extract"
+                f" {self.state.case_dir}/{compressed_file} {newest_time}"
+                f" {self.state.case_dir}"
+            )
+            post_extract_command = self.state.registry.create_mark_command(
+                newest_time
+            )
+            command = " && ".join([extract_command, post_extract_command])
+            Task(command=command).run(block=True)
+            print("Restored a reconstructed time! Ready to proceed!")
+            return
         # If we managed to get here, then there is no suitable decomposition
         # candidate so we can't proceed
         raise Exception("Could not restore case directory to a good state.")
@@ -263,58 +629,177 @@ class OFListener:
         # timestep is a Decimal to deal with floating point weirdnesses
         # The timestamp is a "multiple" of self.keep_every if the timestamp
         # does not have a fractional part when divided by self.keep_every
-        quotient = timestep / self.keep_every
-        return quotient % 1 != 0
+        return not self._keep_grid.is_multiple(str(timestep))
 
-    def _create_reconstruct_task(self, timestamp: str) -> Task:
-        reconstruct_command = f"reconstructPar -time {timestamp}"
+    def _create_reconstruct_tasks(self, timestamps: List[str]) -> List[Task]:
+        # Every reconstructPar run reads the mesh and the decomposition
+        # addressing in again so reconstruct several times per run
+        tasks: List[Task] = []
+        batch_size = self.reconstruct_batch_size
+        for i in range(0, len(timestamps), batch_size):
+            batch = timestamps[i : i + batch_size]
+            if len(batch) == 1 and self.reconstruct_field_parts > 1:
+                tasks.extend(self._create_field_reconstruct_tasks(batch[0]))
+            elif len(batch) == 1:
+                tasks.append(self._create_reconstruct_task(batch[0]))
+            else:
+                tasks.append(self._create_batch_reconstruct_task(batch))
+        return tasks
+
+    def _create_reconstruct_par_command(
+        self, timestamps: List[str], fields: Optional[List[str]] = None
+    ) -> str:
+        time_selection = ",".join(timestamps)
+        if len(timestamps) > 1:
+            time_selection = f"'{time_selection}'"
+        reconstruct_command = f"reconstructPar -time {time_selection}"
         if self.state.case_dir != Path("."):
             reconstruct_command += f" -case {self.state.case_dir}"
-        if timestamp == "0":
+        if "0" in timestamps:
             reconstruct_command += " -withZero"
-        reconstruction_done_marker_filepath = (
+        if self.state.is_collated:
+            reconstruct_command += " -fileHandler collated"
+        if fields is None:
+            fields = self.fields
+        if fields is not None:
+            reconstruct_command += f" -fields '({' '.join(fields)})'"
+        return reconstruct_command
+
+    def _create_reconstruct_command(self, timestamps: List[str]) -> str:
+        reconstruct_command = self._create_reconstruct_par_command(timestamps)
+        # Every time gets marked as reconstructed on its own
+        return " && ".join(
+            [reconstruct_command]
+            + [
+                self.state.registry.create_mark_command(t)
+                for t in timestamps
+            ]
+        )
+
+    def _create_reconstruct_task(self, timestamp: str) -> Task:
+        return Task(
+            command=self._create_reconstruct_command([timestamp]),
+            priority=2,
+            short_string=f"Reconstruct {timestamp}",
+        )
+
+    def _create_field_reconstruct_tasks(self, timestamp: str) -> List[Task]:
+        # reconstructPar is single threaded so reconstruct disjoint subsets
+        # of the fields of a single time concurrently. Each part leaves a
+        # marker behind and whichever part finishes last (and so sees all
+        # the markers) removes them and marks the time as reconstructed.
+        field_sizes = self.state.get_split_field_sizes(timestamp)
+        if self.fields is not None:
+            field_sizes = {
+                field: size
+                for field, size in field_sizes.items()
+                if field in self.fields
+            }
+        parts = partition_by_size(field_sizes, self.reconstruct_field_parts)
+        if len(parts) <= 1:
+            return [self._create_reconstruct_task(timestamp)]
+        part_marker_prefix = (
             Path(self.state.case_dir)
             / timestamp
-            / RECONSTRUCTION_DONE_MARKER_FILENAME
+            / RECONSTRUCTION_PART_MARKER_PREFIX
         )
-        post_reconstruct_command = (
-            f"touch {reconstruction_done_marker_filepath}"
+        finalize_command = (
+            f"if [ $(ls {part_marker_prefix}* 2>/dev/null | wc -l)"
+            f" -eq {len(parts)} ]; then"
+            f" rm -f {part_marker_prefix}*"
+            f" && {self.state.registry.create_mark_command(timestamp)}; fi"
         )
-        command = " && ".join([reconstruct_command, post_reconstruct_command])
+        tasks: List[Task] = []
+        for i, fields in enumerate(parts):
+            command = " && ".join(
+                [
+                    self._create_reconstruct_par_command([timestamp], fields),
+                    f"touch {part_marker_prefix}{i}",
+                    finalize_command,
+                ]
+            )
+            tasks.append(
+                Task(
+                    command=command,
+                    priority=2,
+                    short_string=(
+                        f"Reconstruct {timestamp}"
+                        f" (fields {i + 1}/{len(parts)})"
+                    ),
+                )
+            )
+        return tasks
+
+    def _create_batch_reconstruct_task(self, timestamps: List[str]) -> Task:
         return Task(
-            command=command,
+            command=self._create_reconstruct_command(timestamps),
             priority=2,
-            short_string=f"Reconstruct {timestamp}",
+            short_string=(
+                f"Reconstruct {len(timestamps)} times"
+                f" ({timestamps[0]} to {timestamps[-1]})"
+            ),
         )
 
     def _create_delete_split_task(self, timestamp: str) -> Task:
         return Task(
-            command=f"rm -rf {self.state.case_dir}/processor*/{timestamp}",
+            command=(
+                f"rm -rf {self.state.case_dir}/{self.state.processor_glob}"
+                f"/{timestamp}"
+            ),
             priority=0,
             short_string=f"DeleteSplit {timestamp}",
         )
 
-    def _create_delete_reconstructed_task(self, timestamp: str) -> Task:
+    def _create_verify_command(self, archive: str, names: List[str]) -> str:
+        # Fails unless the files of names are in the manifest of archive
+        # (with the sizes they have now), apart from the ones that are not
+        # archived on purpose
+        command = (
+            f"{MANIFEST_TOOL} verify"
+            f" --directory {self.state.case_dir}"
+            f" --exclude {RECONSTRUCTION_DONE_MARKER_FILENAME}"
+            f" {self.state.case_dir}/{archive} {' '.join(names)}"
+        )
+        if self.fields is not None:
+            command += f" --fields {' '.join(self.fields)}"
+        return command
+
+    def _create_delete_reconstructed_task(
+        self, timestamp: str, archive: Optional[str] = None
+    ) -> Task:
+        # Only deleted once it checks out against the manifest of archive
+        # when there is one (the incomplete times have not been archived)
+        command = f"rm -rf {self.state.case_dir}/{timestamp}"
+        if archive is not None:
+            command = (
+                f"{self._create_verify_command(archive, [timestamp])}"
+                f" && {command}"
+            )
+        if unmark_command := self.state.registry.create_unmark_command(
+            timestamp
+        ):
+            command += f" && {unmark_command}"
         return Task(
-            command=f"rm -rf {self.state.case_dir}/{timestamp}",
+            command=command,
             priority=0,
             short_string=f"DeleteReconstructed {timestamp}",
         )
 
     def _create_tar_task(self, timestamp: str) -> Task:
-        reconstruction_done_marker_filepath = (
-            Path(self.state.case_dir)
-            / timestamp
-            / RECONSTRUCTION_DONE_MARKER_FILENAME
-        )
         tar_in_progress_path = (
             f"{self.state.case_dir}/{timestamp}.tar.inprogress"
         )
         tar_path = f"{self.state.case_dir}/{timestamp}.tar"
-        timestamp_path = f"{self.state.case_dir}/{timestamp}"
+        members = " ".join(self._get_tar_members(timestamp))
+        # Written from the case directory (the members are relative to it)
+        # with the manifest that the time is checked against before it gets
+        # deleted as its last member
         tar_command = (
-            f"tar --exclude {reconstruction_done_marker_filepath} "
-            + f"-cvf {tar_in_progress_path} {timestamp_path}"
+            f"{MANIFEST_TOOL} tar"
+            f" --directory {self.state.case_dir}"
+            f" --exclude {RECONSTRUCTION_DONE_MARKER_FILENAME}"
+            f" --manifest-member {timestamp}.tar{MANIFEST_SUFFIX}"
+            f" {tar_in_progress_path} {members}"
         )
         post_tar_command = f"mv {tar_in_progress_path} {tar_path}"
         command = " && ".join([tar_command, post_tar_command])
@@ -322,9 +807,113 @@ class OFListener:
             command=command, priority=1, short_string=f"Tar {timestamp}"
         )
 
-    def _create_delete_tar_task(self, timestamp: str) -> Task:
+    def _create_stream_task(self, timestamp: str) -> Task:
+        # Append the time straight into the group archive of its
+        # compress_every window (no intermediate tar) and remove it
+        stream_file = self.state.create_stream_filename(
+            self._compression_grouper.window_index(timestamp),
+            str(self.compress_every),
+        )
+        stream_command = (
+            f"{STREAM_ARCHIVER} append"
+            f" {self.state.case_dir}/{stream_file}"
+            f" {self.state.case_dir} {timestamp}"
+            f" --exclude {RECONSTRUCTION_DONE_MARKER_FILENAME}"
+        )
+        if self.fields is not None:
+            stream_command += f" --fields {' '.join(self.fields)}"
+        if self.delta_fields:
+            stream_command += (
+                f" --delta {' '.join(self.delta_fields)}"
+                f" --keyframe-every {self.keyframe_every}"
+            )
+        delete_command = self._create_delete_reconstructed_task(
+            timestamp
+        ).command
+        return Task(
+            command=" && ".join([stream_command, delete_command]),
+            priority=1,
+            short_string=f"Stream {timestamp}",
+        )
+
+    def _create_finalize_stream_task(
+        self, stream_file: str, final_filename: str
+    ) -> Task:
         return Task(
-            command=f"rm {self.state.case_dir}/{timestamp}.tar",
+            command=(
+                f"{STREAM_ARCHIVER} finalize"
+                f" {self.state.case_dir}/{stream_file}"
+                f" {self.state.case_dir}/{final_filename}"
+            ),
+            priority=3,
+            short_string=f"FinalizeStream {final_filename}",
+        )
+
+    def _create_catalog_task(self, compressed_file: str) -> Task:
+        assert self.catalog is not None
+        return Task(
+            command=(
+                f"{CATALOGER} add {self.catalog.path}"
+                f" {self.state.case_dir}/{compressed_file}"
+            ),
+            priority=5,
+            short_string=f"Catalog {compressed_file}",
+        )
+
+    def _create_compact_task(self, output: str, inputs: List[str]) -> Task:
+        command = f"{COMPACTOR} --output {output}"
+        if self.catalog is not None:
+            command += f" --catalog {self.catalog.path}"
+        # Re-encoded with the settings of the codec when it wrote them
+        compress_program = self.codec.compress_program()
+        if (
+            compress_program is not None
+            and output.endswith(f".{self.codec.extension}")
+        ):
+            command += f" --compress-program '{compress_program}'"
+        return Task(
+            command=f"{command} {self.state.case_dir} {' '.join(inputs)}",
+            priority=6,
+            short_string=f"Compact {output}",
+        )
+
+    def _get_tar_members(self, timestamp: str) -> List[str]:
+        # Relative to the case directory
+        if self.fields is None:
+            return [timestamp]
+        # Only the fields to keep along with everything in the
+        # subdirectories (uniform, polyMesh, lagrangian, ...)
+        members: List[str] = []
+        try:
+            with os.scandir(self.state.case_dir / timestamp) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if entry.is_dir() or entry.name in self.fields:
+                        members.append(f"{timestamp}/{entry.name}")
+        except FileNotFoundError:
+            return [timestamp]
+        # None of the fields were written at this time, so keep all of it
+        # rather than leave manifest tar without anything to archive
+        return members or [timestamp]
+
+    def _create_delete_tar_task(
+        self, timestamp: str, compressed_file: Optional[str] = None
+    ) -> Task:
+        # The tar only goes once it checks out against the manifest of the
+        # compressed file (along with the manifest next to it that the tars
+        # used to be written with)
+        if compressed_file is None:
+            compressed_file = self.state.find_compressed_file(timestamp)
+            if compressed_file is None:
+                raise ValueError(f"{timestamp} is not in a compressed file")
+        tar_path = f"{self.state.case_dir}/{timestamp}.tar"
+        verify_command = self._create_verify_command(
+            compressed_file, [f"{timestamp}.tar"]
+        )
+        return Task(
+            command=(
+                f"{verify_command} && rm {tar_path}"
+                f" && rm -f {tar_path}{MANIFEST_SUFFIX}"
+            ),
             priority=4,
             short_string=f"DeleteTar {timestamp}",
         )
@@ -351,6 +940,7 @@ class OFListener:
             compress_every=value, keep_every=self.keep_every
         )
         self._compress_every = value
+        self._reset_time_grouping()
 
     @property
     def keep_every(self) -> Decimal:
@@ -362,6 +952,8 @@ class OFListener:
             compress_every=self.compress_every, keep_every=value
         )
         self._keep_every = value
+        self._rebase_history()
+        self._reset_time_grouping()
 
     def update_processing_frequencies(
         self, *, keep_every: Decimal, compress_every: Decimal
@@ -371,3 +963,98 @@ class OFListener:
         )
         self._keep_every = keep_every
         self._compress_every = compress_every
+        self._rebase_history()
+        self._reset_time_grouping()
+
+    def _reset_time_grouping(self) -> None:
+        # The windows depend on both frequencies so all the tars get
+        # bucketed again on the next update
+        self._keep_grid = TimeGrid(self.keep_every)
+        self._compression_grouper = self._create_compression_grouper()
+
+    def _create_compression_grouper(self) -> CompressionGrouper:
+        return CompressionGrouper(
+            self.keep_every,
+            self.compress_every,
+            max_bytes=self.max_group_bytes,
+            size_of=self._tar_size,
+        )
+
+    def _tar_size(self, timestamp: str) -> int:
+        try:
+            return (self.state.case_dir / f"{timestamp}.tar").stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _rebase_history(self) -> None:
+        # Keep the processed times compact over the new keep_every grid
+        for processed_times in self._history.values():
+            processed_times.rebase(self.keep_every)
+
+    @property
+    def _history(self) -> Dict[str, ProcessedTimes]:
+        return {
+            "processed_split_times": self._processed_split_times,
+            "processed_reconstructed_times": (
+                self._processed_reconstructed_times
+            ),
+            "deleted_reconstructed_times": self._deleted_reconstructed_times,
+            "deleted_tarred_times": self._deleted_tarred_times,
+        }
+
+    def dump_history(self) -> Dict[str, Any]:
+        # Serialize what has been processed so far so that it can be
+        # restored with load_history after a restart
+        history: Dict[str, Any] = {
+            name: processed_times.to_dict()
+            for name, processed_times in self._history.items()
+        }
+        history["requested_compressed_files"] = sorted(
+            self._requested_compressed_files
+        )
+        history["reconstructed_latest_times"] = sorted(
+            self._reconstructed_latest_times
+        )
+        return history
+
+    def load_history(self, history: Dict[str, Any]) -> None:
+        self._processed_split_times = ProcessedTimes.from_dict(
+            history["processed_split_times"]
+        )
+        self._processed_reconstructed_times = ProcessedTimes.from_dict(
+            history["processed_reconstructed_times"]
+        )
+        self._deleted_reconstructed_times = ProcessedTimes.from_dict(
+            history["deleted_reconstructed_times"]
+        )
+        self._deleted_tarred_times = ProcessedTimes.from_dict(
+            history["deleted_tarred_times"]
+        )
+        self._requested_compressed_files = set(
+            history["requested_compressed_files"]
+        )
+        self._reconstructed_latest_times = set(
+            history.get("reconstructed_latest_times", [])
+        )
+        self._rebase_history()
+
+    def save_history(self) -> None:
+        # Written next to it first so that being stopped halfway through
+        # leaves the previous history in place
+        path = self.state.case_dir / HISTORY_FILENAME
+        in_progress = path.with_name(f"{path.name}.inprogress")
+        with open(in_progress, "w") as f:
+            json.dump(self.dump_history(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(in_progress, path)
+
+    def restore_history(self) -> bool:
+        # Pick up where the last run left off (False when there was none)
+        try:
+            with open(self.state.case_dir / HISTORY_FILENAME) as f:
+                history = json.load(f)
+        except FileNotFoundError:
+            return False
+        self.load_history(history)
+        return True
@@ -0,0 +1,199 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Protocol, Set
+
+RECONSTRUCTION_DONE_MARKER_FILENAME = ".__reconstruction_done"
+# Marks a subset of the fields of a time as reconstructed (followed by the
+# part number)
+RECONSTRUCTION_PART_MARKER_PREFIX = ".__reconstruction_part_"
+RECONSTRUCTION_MANIFEST_FILENAME = ".simon_reconstructed"
+RECONSTRUCTION_XATTR_NAME = "user.simon.reconstructed"
+
+
+class ReconstructionRegistry(Protocol):
+    # Keeps track of which reconstructed times have been completely written
+    # out by reconstructPar
+
+    def is_reconstructed(self, timestamp: str) -> bool:
+        ...
+
+    def filter_reconstructed(self, timestamps: List[str]) -> List[str]:
+        ...
+
+    def mark_reconstructed(self, *timestamps: str) -> None:
+        ...
+
+    def create_mark_command(self, timestamp: str) -> str:
+        ...
+
+    def create_unmark_command(self, timestamp: str) -> str:
+        ...
+
+
+class MarkerFileRegistry:
+    # The original scheme: an empty marker file inside every reconstructed
+    # time directory. It costs an inode per time and a stat per time to query.
+
+    def __init__(self, case_dir: Path) -> None:
+        self.case_dir = case_dir
+
+    def _marker_path(self, timestamp: str) -> Path:
+        return (
+            Path(self.case_dir)
+            / timestamp
+            / RECONSTRUCTION_DONE_MARKER_FILENAME
+        )
+
+    def is_reconstructed(self, timestamp: str) -> bool:
+        return self._marker_path(timestamp).is_file()
+
+    def filter_reconstructed(self, timestamps: List[str]) -> List[str]:
+        return [t for t in timestamps if self.is_reconstructed(t)]
+
+    def mark_reconstructed(self, *timestamps: str) -> None:
+        for t in timestamps:
+            self._marker_path(t).touch()
+
+    def create_mark_command(self, timestamp: str) -> str:
+        return f"touch {self._marker_path(timestamp)}"
+
+    def create_unmark_command(self, timestamp: str) -> str:
+        # The marker goes away with the time directory
+        return ""
+
+
+class ManifestRegistry:
+    # A single manifest file in the case directory with one reconstructed time
+    # per line. All the updates are made while holding a lock on a separate
+    # lock file: appends are a single short write and removals rewrite the
+    # manifest to a temporary file that is renamed over it, so readers always
+    # see a complete manifest.
+
+    def __init__(self, case_dir: Path) -> None:
+        self.case_dir = case_dir
+        self.manifest_path = Path(case_dir) / RECONSTRUCTION_MANIFEST_FILENAME
+        self.lock_path = self.manifest_path.with_name(
+            RECONSTRUCTION_MANIFEST_FILENAME + ".lock"
+        )
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Set[str]:
+        try:
+            with open(self.manifest_path) as f:
+                contents = f.read()
+        except FileNotFoundError:
+            return set()
+        # Ignore a trailing line that has not been completely written yet
+        lines = contents.split("\n")[:-1]
+        return {line for line in lines if line}
+
+    def is_reconstructed(self, timestamp: str) -> bool:
+        if not (Path(self.case_dir) / timestamp).is_dir():
+            return False
+        return timestamp in self._read()
+
+    def filter_reconstructed(self, timestamps: List[str]) -> List[str]:
+        # The time directories are listed by the caller so any stale entries
+        # (whose directories have gone) are ignored here
+        reconstructed = self._read()
+        return [t for t in timestamps if t in reconstructed]
+
+    def mark_reconstructed(self, *timestamps: str) -> None:
+        with self._locked():
+            with open(self.manifest_path, "a") as f:
+                f.write("".join(f"{t}\n" for t in timestamps))
+
+    def unmark_reconstructed(self, *timestamps: str) -> None:
+        with self._locked():
+            remaining = self._read() - set(timestamps)
+            temporary_path = self.manifest_path.with_name(
+                RECONSTRUCTION_MANIFEST_FILENAME + ".tmp"
+            )
+            with open(temporary_path, "w") as f:
+                f.write("".join(f"{t}\n" for t in sorted(remaining)))
+            os.replace(temporary_path, self.manifest_path)
+
+    def create_mark_command(self, timestamp: str) -> str:
+        return (
+            f"flock {self.lock_path}"
+            f" sh -c 'echo {timestamp} >> {self.manifest_path}'"
+        )
+
+    def create_unmark_command(self, timestamp: str) -> str:
+        # sed -i writes a new file and renames it over the manifest. There is
+        # nothing to remove without a manifest (and the time has already
+        # been deleted by then, so the task must not fail)
+        pattern = timestamp.replace(".", "\\.")
+        return (
+            f"flock {self.lock_path} sh -c '[ ! -f {self.manifest_path} ]"
+            f' || sed -i "/^{pattern}$/d" {self.manifest_path}\''
+        )
+
+
+class XattrRegistry:
+    # A user extended attribute on the reconstructed time directory. It does
+    # not need any extra inodes and is removed along with the directory. Tar
+    # does not store extended attributes by default so they do not end up in
+    # the archives.
+
+    def __init__(self, case_dir: Path) -> None:
+        self.case_dir = case_dir
+
+    def is_reconstructed(self, timestamp: str) -> bool:
+        try:
+            os.getxattr(
+                Path(self.case_dir) / timestamp, RECONSTRUCTION_XATTR_NAME
+            )
+        except OSError:
+            # The directory or the attribute do not exist
+            return False
+        return True
+
+    def filter_reconstructed(self, timestamps: List[str]) -> List[str]:
+        return [t for t in timestamps if self.is_reconstructed(t)]
+
+    def mark_reconstructed(self, *timestamps: str) -> None:
+        for t in timestamps:
+            os.setxattr(
+                Path(self.case_dir) / t, RECONSTRUCTION_XATTR_NAME, b"1"
+            )
+
+    def create_mark_command(self, timestamp: str) -> str:
+        return (
+            f"setfattr -n {RECONSTRUCTION_XATTR_NAME} -v 1"
+            f" {Path(self.case_dir) / timestamp}"
+        )
+
+    def create_unmark_command(self, timestamp: str) -> str:
+        # The attribute goes away with the time directory
+        return ""
+
+
+RECONSTRUCTION_REGISTRIES = {
+    "marker": MarkerFileRegistry,
+    "manifest": ManifestRegistry,
+    "xattr": XattrRegistry,
+}
+
+
+def create_reconstruction_registry(
+    name: str, case_dir: Path
+) -> ReconstructionRegistry:
+    try:
+        registry_class = RECONSTRUCTION_REGISTRIES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown reconstruction registry {name}"
+            f" (choose from {', '.join(RECONSTRUCTION_REGISTRIES)})"
+        )
+    return registry_class(case_dir)
@@ -0,0 +1,114 @@
+import statistics
+import time
+from collections import deque
+from decimal import Decimal
+from typing import Callable, Deque, Optional
+
+from simon.openfoam.solver_log import SolverLog
+
+# How many of the latest writes to estimate the write interval from
+NUM_WRITES = 10
+
+
+class WriteScheduler:
+    """Predict when the solver is going to write out its next time
+
+    The simulation time advanced per second of wall clock comes from the Time
+    and ClockTime lines of the latest time steps in the solver log, and the
+    write interval from the spacing of the latest split times to appear.
+    Together they give how long it is until the next write so that the
+    monitor can sleep until then (within min_sleep and max_sleep) and keep
+    task slots free for the tasks that the write brings.
+    """
+
+    def __init__(
+        self,
+        solver_log: SolverLog,
+        *,
+        min_sleep: float = 1.0,
+        max_sleep: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not 0 < min_sleep <= max_sleep:
+            raise ValueError(
+                f"Need 0 < min_sleep ({min_sleep})"
+                f" <= max_sleep ({max_sleep})"
+            )
+        self.solver_log = solver_log
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.clock = clock
+        self._writes: Deque[Decimal] = deque(maxlen=NUM_WRITES)
+        # When the log was last seen to move on, and to which time. The log
+        # may be shared with the write completion detector, which may have
+        # read its new lines already, so it is compared to what was last seen
+        self._log_advanced_at: Optional[float] = None
+        self._log_time: Optional[Decimal] = None
+
+    def update(self, latest_written_time: Optional[str]) -> None:
+        self.solver_log.update()
+        if self.solver_log.latest_time != self._log_time:
+            self._log_time = self.solver_log.latest_time
+            self._log_advanced_at = self.clock()
+        if latest_written_time is None:
+            return
+        t = Decimal(latest_written_time)
+        if self._writes and t < self._writes[-1]:
+            # The case has been restarted from an earlier time
+            self._writes.clear()
+        if not self._writes or t > self._writes[-1]:
+            self._writes.append(t)
+
+    @property
+    def simulation_rate(self) -> Optional[float]:
+        # Simulation time advanced per second of wall clock
+        timings = self.solver_log.timings
+        if len(timings) < 2:
+            return None
+        (t_first, clock_first), (t_last, clock_last) = timings[0], timings[-1]
+        if clock_last <= clock_first or t_last <= t_first:
+            return None
+        return float(t_last - t_first) / (clock_last - clock_first)
+
+    @property
+    def write_interval(self) -> Optional[Decimal]:
+        if len(self._writes) < 2:
+            return None
+        writes = list(self._writes)
+        return statistics.median(b - a for a, b in zip(writes, writes[1:]))
+
+    @property
+    def next_write_time(self) -> Optional[Decimal]:
+        write_interval = self.write_interval
+        if write_interval is None:
+            return None
+        return self._writes[-1] + write_interval
+
+    def seconds_until_next_write(self) -> Optional[float]:
+        rate = self.simulation_rate
+        next_write_time = self.next_write_time
+        latest_time = self.solver_log.latest_time
+        if (
+            rate is None
+            or next_write_time is None
+            or latest_time is None
+            or self._log_advanced_at is None
+        ):
+            return None
+        seconds = float(next_write_time - latest_time) / rate
+        # The solver has kept going since the log was last seen to move on
+        return seconds - (self.clock() - self._log_advanced_at)
+
+    def next_sleep(self, default: float) -> float:
+        # Sleep until the next write is expected, or for default when there
+        # is not enough to go on yet
+        if self.solver_log.finished:
+            return self.max_sleep
+        seconds = self.seconds_until_next_write()
+        if seconds is None:
+            return default
+        return min(max(seconds, self.min_sleep), self.max_sleep)
+
+    def write_is_imminent(self, within: float) -> bool:
+        seconds = self.seconds_until_next_write()
+        return seconds is not None and seconds <= within
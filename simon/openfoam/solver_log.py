@@ -0,0 +1,101 @@
+import re
+from collections import deque
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Deque, List, Optional, Tuple
+
+# Newer OpenFOAM versions print the time with its unit (e.g., Time = 0.1s)
+TIME_LINE = re.compile(r"^Time = (\S+?)s?\s*$")
+EXECUTION_TIME_LINE = re.compile(
+    r"^ExecutionTime = (\S+) s\s+ClockTime = (\S+) s"
+)
+END_LINE = "End"
+SOLVER_LOG_PATTERNS = ["log.*", "Report-*.out"]
+# How many (simulation time, clock time) pairs to keep for estimating rates
+NUM_TIMINGS = 50
+
+
+def find_solver_log(case_dir: Path) -> Optional[Path]:
+    # The most recently written log in the case directory is the one of the
+    # solver that is running (the logs of the utilities run before it, such
+    # as log.blockMesh, are older)
+    logs = [
+        path
+        for pattern in SOLVER_LOG_PATTERNS
+        for path in Path(case_dir).glob(pattern)
+        if path.is_file()
+    ]
+    if not logs:
+        return None
+    return max(logs, key=lambda path: path.stat().st_mtime)
+
+
+class SolverLog:
+    """Follow an OpenFOAM solver log as it gets written
+
+    Every update only reads what has been appended since the previous one.
+    A line that is still being written is held back until it is complete,
+    and the log is read again from the start if it gets truncated (e.g., when
+    a requeued job writes to the same log file).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._offset = 0
+        self._partial_line = ""
+        self.latest_time: Optional[Decimal] = None
+        self.latest_execution_time: Optional[float] = None
+        self.latest_clock_time: Optional[float] = None
+        # The wall clock seconds since the solver started at the end of each
+        # of the latest time steps
+        self.timings: Deque[Tuple[Decimal, float]] = deque(maxlen=NUM_TIMINGS)
+        self.finished = False
+
+    def _read_new_lines(self) -> List[str]:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, 2)
+                size = f.tell()
+                if size < self._offset:
+                    # The log has been truncated so start over
+                    self._offset = 0
+                    self._partial_line = ""
+                    self.finished = False
+                    self.timings.clear()
+                f.seek(self._offset)
+                data = f.read(size - self._offset)
+        except FileNotFoundError:
+            return []
+        self._offset += len(data)
+        text = self._partial_line + data.decode("utf-8", errors="replace")
+        lines = text.split("\n")
+        self._partial_line = lines.pop()
+        return lines
+
+    def update(self) -> List[Decimal]:
+        # Return the simulation times that were started since the last update
+        new_times: List[Decimal] = []
+        for line in self._read_new_lines():
+            line = line.rstrip("\r")
+            match = TIME_LINE.match(line)
+            if match is not None:
+                try:
+                    t = Decimal(match.group(1))
+                except InvalidOperation:
+                    continue
+                self.latest_time = t
+                self.finished = False
+                new_times.append(t)
+                continue
+            match = EXECUTION_TIME_LINE.match(line)
+            if match is not None:
+                self.latest_execution_time = float(match.group(1))
+                self.latest_clock_time = float(match.group(2))
+                if self.latest_time is not None:
+                    self.timings.append(
+                        (self.latest_time, self.latest_clock_time)
+                    )
+                continue
+            if line.strip() == END_LINE:
+                self.finished = True
+        return new_times
@@ -0,0 +1,24 @@
+from decimal import Decimal
+from typing import Iterable, List
+
+
+class TimeGrid:
+    """Exact checks of timestamps against the multiples of a quantum
+
+    A timestamp is a multiple of the quantum when the remainder of
+    Decimal(t) % quantum is zero. Decimal remainders are exact, unlike the
+    quotient of a division, which is rounded to the context precision.
+    """
+
+    def __init__(self, quantum: Decimal) -> None:
+        if quantum <= 0:
+            raise ValueError(f"The quantum must be positive (got {quantum})")
+        self.quantum = quantum
+
+    def is_multiple(self, timestamp: str) -> bool:
+        return not Decimal(timestamp) % self.quantum
+
+    def classify(self, timestamps: Iterable[str]) -> List[bool]:
+        # Return whether each timestamp is a multiple of the quantum
+        quantum = self.quantum
+        return [not t % quantum for t in map(Decimal, timestamps)]
@@ -0,0 +1,210 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from simon.openfoam.file_state import OFFileState
+
+STAGES = ["split", "reconstructed", "tarred", "compressed", "other"]
+
+
+class StageUsage(NamedTuple):
+    # Every inode (files, directories, links) counts against the file count
+    # quota so directories are included in files
+    files: int = 0
+    bytes: int = 0
+
+    def __add__(self, other: object) -> "StageUsage":
+        if not isinstance(other, StageUsage):
+            return NotImplemented
+        return StageUsage(self.files + other.files, self.bytes + other.bytes)
+
+
+class _CachedDirectory(NamedTuple):
+    mtime_ns: int
+    files: List[str]
+    subdirectories: List[str]
+
+
+class OFUsageTracker:
+    """Keep track of the number of files and bytes held by each stage
+
+    The stages are the split times (in the processor directories), the
+    reconstructed times, the tars and the compressed archives. Everything
+    else in the case directory (the mesh, the settings, the logs and the
+    manifests, indexes, locks and catalog kept next to the archives) is
+    counted as other so that the total is what the case holds. Directory
+    listings are cached by their modification time so that an update only
+    re-lists the directories that had entries added or removed since the
+    previous update. The files are stat'ed on every update since a file that
+    is still being written grows without changing the modification time of
+    its directory.
+    """
+
+    def __init__(
+        self, state: OFFileState, num_scan_threads: Optional[int] = None
+    ) -> None:
+        self.state = state
+        self.num_scan_threads = num_scan_threads
+        self._cache: Dict[str, _CachedDirectory] = {}
+        self._usage: Dict[str, StageUsage] = {
+            stage: StageUsage() for stage in STAGES
+        }
+
+    def _list_directory(self, path: str) -> Optional[_CachedDirectory]:
+        # The files and subdirectories of path (None when it is gone)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cache.get(path)
+        if cached is None or cached.mtime_ns != mtime_ns:
+            files: List[str] = []
+            subdirectories: List[str] = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                        else:
+                            files.append(entry.path)
+            except FileNotFoundError:
+                return None
+            cached = _CachedDirectory(mtime_ns, files, subdirectories)
+            self._cache[path] = cached
+        return cached
+
+    @staticmethod
+    def _lstat_files(files: List[str]) -> StageUsage:
+        usage = StageUsage()
+        for file in files:
+            try:
+                usage += StageUsage(1, os.lstat(file).st_size)
+            except FileNotFoundError:
+                # Removed while we were looking at it
+                continue
+        return usage
+
+    def _scan_directory(self, path: str) -> Tuple[StageUsage, List[str]]:
+        # Walk the directory tree rooted at path and return its usage (the
+        # directory itself included) along with all the directories visited
+        cached = self._list_directory(path)
+        if cached is None:
+            return StageUsage(), []
+        usage = StageUsage(1, 0) + self._lstat_files(cached.files)
+        visited = [path]
+        for subdirectory in cached.subdirectories:
+            subdirectory_usage, subdirectory_visited = self._scan_directory(
+                subdirectory
+            )
+            usage += subdirectory_usage
+            visited.extend(subdirectory_visited)
+        return usage, visited
+
+    def _scan_directories(
+        self, directories: List[str]
+    ) -> Tuple[StageUsage, List[str]]:
+        usage = StageUsage()
+        visited: List[str] = []
+        if not directories:
+            return usage, visited
+        with ThreadPoolExecutor(max_workers=self.num_scan_threads) as pool:
+            for directory_usage, directory_visited in pool.map(
+                self._scan_directory, directories
+            ):
+                usage += directory_usage
+                visited.extend(directory_visited)
+        return usage, visited
+
+    def _scan_other(
+        self, counted: Set[str]
+    ) -> Tuple[StageUsage, List[str]]:
+        # The usage of everything in the case directory and the processor
+        # directories (those directories included) that is not in counted
+        roots = [str(self.state.case_dir)] + [
+            str(d) for d in self.state.get_processor_dirs()
+        ]
+        usage = StageUsage()
+        visited: List[str] = []
+        other_directories: List[str] = []
+        for root in roots:
+            cached = self._list_directory(root)
+            if cached is None:
+                continue
+            visited.append(root)
+            usage += StageUsage(1, 0) + self._lstat_files(
+                [f for f in cached.files if f not in counted]
+            )
+            other_directories.extend(
+                d
+                for d in cached.subdirectories
+                if d not in counted and d not in roots
+            )
+        other_usage, other_visited = self._scan_directories(other_directories)
+        return usage + other_usage, visited + other_visited
+
+    @staticmethod
+    def _files_usage(paths: List[Path]) -> StageUsage:
+        usage = StageUsage()
+        for path in paths:
+            try:
+                usage += StageUsage(1, path.stat().st_size)
+            except FileNotFoundError:
+                continue
+        return usage
+
+    def update(self) -> Dict[str, StageUsage]:
+        case_dir = self.state.case_dir
+        split_dirs = [str(d) for d in self.state.get_split_time_dirs()]
+        reconstructed_dirs = [
+            str(case_dir / t) for t in self.state.get_time_dirs()
+        ]
+        tars = list(case_dir.glob("[0-9]*.tar"))
+        compressed_files = [
+            case_dir / f for f in self.state.get_compressed_files()
+        ]
+        split_usage, split_visited = self._scan_directories(split_dirs)
+        reconstructed_usage, reconstructed_visited = self._scan_directories(
+            reconstructed_dirs
+        )
+        other_usage, other_visited = self._scan_other(
+            set(split_dirs)
+            | set(reconstructed_dirs)
+            | {str(f) for f in tars + compressed_files}
+        )
+        # Forget about the directories that no longer exist so that the cache
+        # does not grow with the history of the case
+        visited = (
+            set(split_visited)
+            | set(reconstructed_visited)
+            | set(other_visited)
+        )
+        self._cache = {
+            path: cached
+            for path, cached in self._cache.items()
+            if path in visited
+        }
+        self._usage = {
+            "split": split_usage,
+            "reconstructed": reconstructed_usage,
+            "tarred": self._files_usage(tars),
+            "compressed": self._files_usage(compressed_files),
+            "other": other_usage,
+        }
+        return self.report()
+
+    def report(self) -> Dict[str, StageUsage]:
+        # Return the usage from the last update
+        return dict(self._usage)
+
+    @property
+    def total(self) -> StageUsage:
+        return sum(self._usage.values(), StageUsage())
+
+    def __str__(self) -> str:
+        lines = [f"{'stage':<15}{'files':>12}{'bytes':>18}"]
+        for stage, usage in self._usage.items():
+            lines.append(f"{stage:<15}{usage.files:>12}{usage.bytes:>18}")
+        total = self.total
+        lines.append(f"{'total':<15}{total.files:>12}{total.bytes:>18}")
+        return "\n".join(lines)
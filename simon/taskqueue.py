@@ -7,10 +7,17 @@ from simon.task import Task
 class TaskQueue:
     def __init__(self, num_simultaneous_tasks: int = 6) -> None:
         self.num_simultaneous_tasks = num_simultaneous_tasks
+        # Slots that are kept free for tasks that are about to be added
+        self.reserved = 0
         self._running: list[Task] = []
         self._queue: PriorityList[Task] = PriorityList()
 
+    def reserve(self, num_tasks: int) -> None:
+        # Keep num_tasks slots free until the next call to add
+        self.reserved = num_tasks
+
     def add(self, *tasks: Task) -> None:
+        self.reserved = 0
         for task in tasks:
             self._queue.add(task, task.priority)
         self.update()
@@ -23,7 +30,8 @@ class TaskQueue:
                 # TODO: Consider if we need to do something here depending on
                 # task success / failure
         # Ensure that the running list is filled back up with pending tasks
-        while len(self._running) < self.num_simultaneous_tasks and self._queue:
+        num_slots = self.num_simultaneous_tasks - self.reserved
+        while len(self._running) < num_slots and self._queue:
             next_pending_task = self._queue.pop()
             self._running.append(next_pending_task)
             self._running[-1].run()
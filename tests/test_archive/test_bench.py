@@ -0,0 +1,76 @@
+import random
+from pathlib import Path
+
+import pytest
+from simon.archive.bench import (CompressionResult, create_synthetic_sample,
+                                 recommend, run_benchmark,
+                                 write_synthetic_field)
+from simon.archive.codecs import Codec
+
+
+def test_synthetic_fields_compress_worse_with_more_entropy(
+    tmp_path: Path,
+) -> None:
+    ratios = []
+    for entropy in [0.0, 0.5, 1.0]:
+        sample_dir = tmp_path / str(entropy)
+        members = create_synthetic_sample(
+            sample_dir, num_fields=1, field_size=100000, entropy=entropy
+        )
+        (result,) = run_benchmark(
+            sample_dir, members, sample_dir, codecs=["gzip"], levels=[1]
+        )
+        ratios.append(result.ratio)
+    assert ratios[0] > ratios[1] > ratios[2] > 1
+
+
+def test_synthetic_field_is_about_the_requested_size(tmp_path: Path) -> None:
+    write_synthetic_field(tmp_path / "p", 10000, 0.5, random.Random(0))
+    size = (tmp_path / "p").stat().st_size
+    assert 10000 <= size < 11000
+    with pytest.raises(ValueError):
+        write_synthetic_field(tmp_path / "U", 10000, 1.5, random.Random(0))
+
+
+def test_run_benchmark_measures_each_codec_and_supported_level(
+    tmp_path: Path,
+) -> None:
+    members = create_synthetic_sample(
+        tmp_path / "case", num_fields=2, field_size=50000
+    )
+    results = run_benchmark(
+        tmp_path / "case",
+        members,
+        tmp_path,
+        codecs=["gzip", "none"],
+        levels=[1, 10],
+    )
+    # gzip does not have a level 10 and none does not take levels
+    assert [r.codec for r in results] == [
+        Codec("gzip", level=1),
+        Codec("none"),
+    ]
+    gzip, none = results
+    assert gzip.input_bytes == none.input_bytes == none.output_bytes
+    assert gzip.output_bytes < gzip.input_bytes
+    assert gzip.seconds > 0
+    assert gzip.peak_memory_bytes > 0
+    assert not list(tmp_path.glob("compressed.*"))
+
+
+def test_recommend_picks_the_best_ratio_that_meets_the_target() -> None:
+    def result(
+        name: str, output_bytes: int, seconds: float
+    ) -> CompressionResult:
+        return CompressionResult(Codec(name), 1000, output_bytes, seconds, 0)
+
+    fast = result("lz4", 500, 1)
+    medium = result("zstd", 300, 4)
+    slow = result("xz", 200, 20)
+    results = [fast, medium, slow]
+    # The window is 10 times the sample
+    assert recommend(results, 10000, 50) == medium
+    assert recommend(results, 10000, 1000) == slow
+    # Nothing is fast enough so go with the fastest
+    assert recommend(results, 10000, 1) == fast
+    assert recommend([], 10000, 1) is None
@@ -0,0 +1,163 @@
+import subprocess
+import tarfile
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from simon.archive.catalog import ArchiveCatalog, main, scan_archive
+from simon.archive.manifest import create_archive
+from simon.archive.stream import StreamArchive
+
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    case_dir = tmp_path / "case"
+    for t in ["0.1", "0.2", "0.3", "0.5"]:
+        (case_dir / t / "uniform").mkdir(parents=True)
+        (case_dir / t / "uniform" / "time").write_text(t)
+        (case_dir / t / "U").write_text(f"U at {t}")
+    return case_dir
+
+
+@pytest.fixture
+def catalog(tmp_path: Path) -> ArchiveCatalog:
+    return ArchiveCatalog(tmp_path / "catalog.sqlite")
+
+
+def create_tgz(case_dir: Path, name: str, times: list) -> Path:
+    with tarfile.open(case_dir / name, "w:gz") as tar:
+        for t in times:
+            tar.add(case_dir / t, arcname=t)
+    return case_dir / name
+
+
+def create_seekable(case_dir: Path, name: str, times: list) -> Path:
+    archive = StreamArchive(case_dir / f"{name}.inprogress")
+    for t in times:
+        archive.append(case_dir, t)
+    archive.finalize(case_dir / name)
+    return case_dir / name
+
+
+def test_seekable_and_plain_archives_describe_times_the_same_way(
+    case_dir: Path,
+) -> None:
+    plain = scan_archive(
+        create_tgz(case_dir, "times_0.1_0.2_0.1.tgz", ["0.1", "0.2"])
+    )
+    seekable = scan_archive(
+        create_seekable(case_dir, "times_0.1_0.2_0.1b.tgz", ["0.1", "0.2"])
+    )
+    assert [t.time for t in plain] == ["0.1", "0.2"]
+    assert [t.time for t in seekable] == ["0.1", "0.2"]
+    assert [t.sha256 for t in plain] == [t.sha256 for t in seekable]
+    assert [t.bytes for t in plain] == [len("U at 0.1") + 3] * 2
+    assert plain[0].offset is None
+    assert seekable[0].offset == 0
+    assert seekable[1].offset == seekable[0].length
+
+
+def test_finds_times_and_missing_times(
+    case_dir: Path, catalog: ArchiveCatalog
+) -> None:
+    catalog.add_archive(
+        create_tgz(case_dir, "times_0.1_0.2_0.1.tgz", ["0.1", "0.2"])
+    )
+    catalog.add_archive(
+        create_seekable(case_dir, "times_0.3_0.5_0.1.tgz", ["0.3", "0.5"])
+    )
+    (found,) = catalog.find("0.30")
+    assert found.archive == "times_0.3_0.5_0.1.tgz"
+    assert found.offset == 0
+    assert catalog.find("0.4") == []
+    assert catalog.times() == ["0.1", "0.2", "0.3", "0.5"]
+    assert catalog.times(start="0.15", end="0.3") == ["0.2", "0.3"]
+    assert catalog.missing_times(Decimal("0.1")) == ["0.4"]
+    assert catalog.missing_times(Decimal("0.1"), end="0.7") == [
+        "0.4",
+        "0.6",
+        "0.7",
+    ]
+    assert [
+        (r.name, r.num_times, r.first_time, r.last_time, r.indexed)
+        for r in catalog.archives()
+    ] == [
+        ("times_0.1_0.2_0.1.tgz", 2, "0.1", "0.2", False),
+        ("times_0.3_0.5_0.1.tgz", 2, "0.3", "0.5", True),
+    ]
+
+
+def test_sync_adds_new_and_changed_archives_and_drops_removed_ones(
+    case_dir: Path, catalog: ArchiveCatalog
+) -> None:
+    create_tgz(case_dir, "times_0.1_0.2_0.1.tgz", ["0.1", "0.2"])
+    create_tgz(case_dir, "times_0.3_0.3_0.1.tgz", ["0.3"])
+    archives = ["times_0.1_0.2_0.1.tgz", "times_0.3_0.3_0.1.tgz"]
+    assert catalog.sync(case_dir, archives) == archives
+    assert catalog.sync(case_dir, archives) == []
+    # Replaced (e.g., compacted) archives get cataloged again
+    create_tgz(case_dir, "times_0.3_0.3_0.1.tgz", ["0.3", "0.5"])
+    assert catalog.uncataloged(case_dir, archives) == [archives[1]]
+    catalog.sync(case_dir, archives[1:])
+    assert catalog.times() == ["0.3", "0.5"]
+
+
+def test_reads_archives_that_tarfile_cannot(
+    case_dir: Path, catalog: ArchiveCatalog
+) -> None:
+    try:
+        subprocess.run(
+            "tar -I zstd -cf times_0.1_0.1_0.1.tar.zst 0.1",
+            shell=True,
+            check=True,
+            cwd=case_dir,
+            capture_output=True,
+        )
+    except subprocess.CalledProcessError:
+        pytest.skip("zstd is not installed")
+    plain = scan_archive(
+        create_tgz(case_dir, "times_0.1_0.1_0.1.tgz", ["0.1"])
+    )
+    assert scan_archive(case_dir / "times_0.1_0.1_0.1.tar.zst")[0].sha256 == (
+        plain[0].sha256
+    )
+
+
+def test_describes_archives_from_their_manifest(case_dir: Path) -> None:
+    archive = case_dir / "times_0.1_0.2_0.1.tgz"
+    create_archive(
+        archive, ["0.1", "0.2"], directory=case_dir, compress_program="gzip"
+    )
+    from_manifest = scan_archive(archive)
+    archive.with_name(f"{archive.name}.sha256").unlink()
+    assert from_manifest == scan_archive(archive)
+    # The manifest of a seekable archive can have the files of an
+    # interrupted append that did not make it into the index
+    seekable = create_seekable(case_dir, "times_0.1_0.2_0.1b.tgz", ["0.1"])
+    with open(seekable.with_name(f"{seekable.name}.sha256"), "a") as f:
+        f.write(f"{'0' * 64} 8 0.2/U\n")
+    assert [t.time for t in scan_archive(seekable)] == ["0.1"]
+
+
+def test_linked_files_are_described_like_the_files_they_link_to(
+    case_dir: Path,
+) -> None:
+    for t in ["0.1", "0.2"]:
+        (case_dir / t / "T").write_text("T" * 100)
+    plain = scan_archive(
+        create_tgz(case_dir, "times_0.1_0.2_0.1.tgz", ["0.1", "0.2"])
+    )
+    seekable = create_seekable(
+        case_dir, "times_0.1_0.2_0.1b.tgz", ["0.1", "0.2"]
+    )
+    from_manifest = scan_archive(seekable)
+    seekable.with_name(f"{seekable.name}.sha256").unlink()
+    assert scan_archive(seekable) == from_manifest
+    assert [t.sha256 for t in from_manifest] == [t.sha256 for t in plain]
+    assert [t.bytes for t in from_manifest] == [t.bytes for t in plain]
+
+
+def test_command_line(case_dir: Path, tmp_path: Path) -> None:
+    archive = create_tgz(case_dir, "times_0.1_0.1_0.1.tgz", ["0.1"])
+    main(["add", str(tmp_path / "catalog.sqlite"), str(archive)])
+    assert ArchiveCatalog(tmp_path / "catalog.sqlite").times() == ["0.1"]
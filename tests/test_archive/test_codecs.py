@@ -0,0 +1,137 @@
+import hashlib
+import subprocess
+from pathlib import Path
+
+import pytest
+from simon.archive.codecs import (CODECS, Codec, split_compressed_extension,
+                                  tar_read_flags)
+from simon.archive.manifest import ManifestEntry, read_manifest, verify
+
+
+@pytest.mark.parametrize(
+    "codec, tar_command",
+    [
+        (Codec(), "tar -czvf out"),
+        (Codec("gzip", level=9), "tar -I 'gzip -9' -cvf out"),
+        (Codec("pigz"), "tar -I 'pigz' -cvf out"),
+        (Codec("pigz", level=6, threads=4), "tar -I 'pigz -p 4 -6' -cvf out"),
+        (Codec("zstd"), "tar -I 'zstd -T0' -cvf out"),
+        (Codec("zstd", level=22), "tar -I 'zstd -T0 --ultra -22' -cvf out"),
+        (Codec("xz", level=3, threads=2), "tar -I 'xz -T2 -3' -cvf out"),
+        (Codec("lz4", level=1), "tar -I 'lz4 -1' -cvf out"),
+        (Codec("none"), "tar -cvf out"),
+    ],
+)
+def test_tar_create_command(codec: Codec, tar_command: str) -> None:
+    assert codec.tar_create_command("out") == tar_command
+
+
+@pytest.mark.parametrize(
+    "name, level, threads",
+    [
+        ("bzip2", None, None),
+        ("gzip", 10, None),
+        ("zstd", 0, None),
+        ("none", 1, None),
+        ("gzip", None, 4),
+        ("lz4", None, 4),
+        ("zstd", None, -1),
+    ],
+)
+def test_invalid_codecs_raise_value_error(
+    name: str, level: int, threads: int
+) -> None:
+    with pytest.raises(ValueError):
+        Codec(name, level=level, threads=threads)
+
+
+@pytest.mark.parametrize(
+    "filename, split",
+    [
+        ("times_0.1_0.2_0.05.tgz", ("times_0.1_0.2_0.05", "tgz")),
+        ("times_0.1_0.2_0.05.tar.zst", ("times_0.1_0.2_0.05", "tar.zst")),
+        ("times_0.1_0.2_0.05.tar.xz", ("times_0.1_0.2_0.05", "tar.xz")),
+        ("times_0.1_0.2_0.05.tar.lz4", ("times_0.1_0.2_0.05", "tar.lz4")),
+        ("times_0.1_0.2_0.05.tar", ("times_0.1_0.2_0.05", "tar")),
+        (
+            "times_0.1_0.2_0.05.tgz.queued",
+            ("times_0.1_0.2_0.05.tgz.queued", None),
+        ),
+    ],
+)
+def test_split_compressed_extension(filename: str, split: tuple) -> None:
+    assert split_compressed_extension(filename) == split
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_tar_can_read_what_each_codec_writes(
+    tmp_path: Path, name: str
+) -> None:
+    codec = Codec(name)
+    program = codec.compress_program()
+    if program is not None and subprocess.run(
+        f"command -v {program.split()[0]}", shell=True, capture_output=True
+    ).returncode:
+        pytest.skip(f"{program.split()[0]} is not installed")
+    (tmp_path / "0.1").mkdir()
+    (tmp_path / "0.1" / "U").write_text("uniform (0 0 0);")
+    archive = f"out.{codec.extension}"
+    subprocess.run(
+        f"{codec.tar_create_command(archive)} 0.1",
+        shell=True,
+        check=True,
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    listing = subprocess.run(
+        f"tar {tar_read_flags(archive)} -tf {archive}",
+        shell=True,
+        check=True,
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert listing.split() == ["0.1/", "0.1/U"]
+
+
+def test_manifests_are_written_once_tar_is_done(tmp_path: Path) -> None:
+    codec = Codec()
+    (tmp_path / "0.1.tar").write_text("the tar of 0.1")
+    command = codec.manifest_create_command("out.tgz.sha256")
+    assert command is not None
+    subprocess.run(
+        f"{codec.tar_create_command('out.tgz')} 0.1.tar && {command} 0.1.tar",
+        shell=True,
+        check=True,
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert verify(tmp_path / "out.tgz", ["0.1.tar"], tmp_path) == []
+    assert read_manifest(tmp_path / "out.tgz.sha256") == {
+        "0.1.tar": ManifestEntry(
+            "0.1.tar",
+            14,
+            hashlib.sha256(b"the tar of 0.1").hexdigest(),
+        )
+    }
+    # The seekable archives get theirs while they are written
+    assert Codec(seekable=True).manifest_create_command("x.sha256") is None
+    command = Codec(seekable=True).tar_create_command(
+        "out.tgz", index="out.tgz.idx", manifest_file="out.tgz.sha256"
+    )
+    assert command.endswith(
+        "simon.archive.stream pack --index out.tgz.idx"
+        " --manifest out.tgz.sha256 out.tgz"
+    )
+
+
+def test_seekable_gzip_is_written_by_the_stream_archiver() -> None:
+    codec = Codec("gzip", level=9, seekable=True)
+    command = codec.tar_create_command("out.tgz.inprogress", index="out.idx")
+    assert command.endswith(
+        "simon.archive.stream pack --index out.idx --level 9"
+        " out.tgz.inprogress"
+    )
+    assert codec.extension == "tgz"
+    with pytest.raises(ValueError):
+        Codec("zstd", seekable=True)
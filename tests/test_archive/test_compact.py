@@ -0,0 +1,284 @@
+import subprocess
+import tarfile
+from pathlib import Path
+
+import pytest
+from simon.archive.catalog import ArchiveCatalog, scan_archive
+from simon.archive import compact as compact_module
+from simon.archive.compact import (compact, compacted_name, find_merged,
+                                   main, plan)
+from simon.archive.manifest import create_archive, read_manifest
+from simon.archive.stream import StreamArchive, read_index
+
+TIMES = ["0.1", "0.2", "0.3", "0.4", "0.5", "0.6"]
+
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    case_dir = tmp_path / "case"
+    for t in TIMES:
+        (case_dir / t / "uniform").mkdir(parents=True)
+        (case_dir / t / "uniform" / "time").write_text(t)
+        (case_dir / t / "U").write_text(f"U at {t}")
+        # The same in every time (linked to in the seekable archives)
+        (case_dir / t / "T").write_text("T" * 100)
+    return case_dir
+
+
+def create_seekable(case_dir: Path, times: list) -> str:
+    name = f"times_{times[0]}_{times[-1]}_0.1.tgz"
+    # Streamed like the listener does
+    archive = StreamArchive(case_dir / f"stream_{times[0]}.inprogress")
+    for t in times:
+        archive.append(case_dir, t)
+    archive.finalize(case_dir / name)
+    return name
+
+
+def create_plain(case_dir: Path, times: list, extension: str = "tgz") -> str:
+    name = f"times_{times[0]}_{times[-1]}_0.1.{extension}"
+    program = {"tgz": "gzip", "tar.zst": "zstd", "tar": None}[extension]
+    create_archive(
+        case_dir / name, times, directory=case_dir, compress_program=program
+    )
+    return name
+
+
+def digests(case_dir: Path, archives: list) -> dict:
+    return {
+        t.time: t.sha256
+        for archive in archives
+        for t in scan_archive(case_dir / archive)
+    }
+
+
+def test_names_the_merged_archive_after_its_times() -> None:
+    assert compacted_name(
+        ["times_0_0.1_0.05.tgz", "times_0.15_0.15_0.05.tgz"]
+    ) == ("times_0_0.15_0.05.tgz")
+    with pytest.raises(ValueError):
+        compacted_name(["times_0_0.1_0.05.tgz", "times_0.2_0.25_0.05.tgz"])
+    with pytest.raises(ValueError):
+        compacted_name(["times_0_0.1_0.05.tgz", "times_0.15_0.2_0.05.tar"])
+
+
+def test_plans_runs_of_small_adjacent_archives() -> None:
+    archives = [
+        "times_0_0_1.tgz",
+        "times_1_1_1.tgz",
+        "times_2_2_1.tgz",
+        "times_3_3_1.tgz",
+        "times_4_4_1.tgz",
+        "times_5_5_1.tgz",
+        "times_7_7_1.tgz",
+        "times_8_8_1.tgz",
+    ]
+    sizes = dict(zip(archives, [10, 10, 10, 10, 10, 10, 10, 10]))
+    # Merged by fanout, and the rest waits for the archives after it
+    assert plan(archives, sizes, 100) == [archives[:4]]
+    assert plan(archives, sizes, 100, fanout=2) == [
+        archives[:2],
+        archives[2:4],
+        archives[4:6],
+        archives[6:],
+    ]
+    # Closed by the size of the next archive
+    sizes["times_2_2_1.tgz"] = 85
+    assert plan(archives, sizes, 100) == [archives[:2], archives[2:4]]
+    # Large enough already, and the gap at 6 has not been archived yet
+    sizes["times_2_2_1.tgz"] = 100
+    assert plan(archives, sizes, 100) == [archives[:2]]
+    # Seekable archives are only merged with each other
+    sizes["times_2_2_1.tgz"] = 10
+    assert plan(archives, sizes, 100, seekable=archives[:2]) == [
+        archives[:2],
+        archives[2:6],
+    ]
+
+
+def test_records_the_archives_being_merged(
+    case_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    archives = [
+        create_plain(case_dir, TIMES[:3]),
+        create_plain(case_dir, TIMES[3:]),
+    ]
+
+    def interrupt(output_path: Path, paths: list) -> None:
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(compact_module, "_check_merged", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        compact(case_dir, archives)
+    assert find_merged(case_dir) == {"times_0.1_0.6_0.1.tgz": archives}
+
+
+def test_merges_seekable_archives_by_copying_their_frames(
+    case_dir: Path,
+) -> None:
+    archives = [
+        create_seekable(case_dir, TIMES[:2]),
+        create_seekable(case_dir, TIMES[2:3]),
+        create_seekable(case_dir, TIMES[3:]),
+    ]
+    before = digests(case_dir, archives)
+    frames = b"".join(
+        StreamArchive(case_dir / a).read_frame(t)
+        for a in archives
+        for t in read_index(case_dir / f"{a}.idx")
+    )
+    output = compact(case_dir, archives)
+    assert output == "times_0.1_0.6_0.1.tgz"
+    assert sorted(p.name for p in case_dir.glob("times_*")) == [
+        output,
+        f"{output}.idx",
+        f"{output}.sha256",
+    ]
+    assert digests(case_dir, [output]) == before
+    merged = StreamArchive(case_dir / output)
+    assert list(merged.read_index()) == TIMES
+    assert b"".join(merged.read_frame(t) for t in TIMES) == frames
+    assert len(read_manifest(case_dir / f"{output}.sha256")) == 3 * 6
+    # Still a tgz, and single times (and their links) can be extracted
+    with tarfile.open(case_dir / output) as tar:
+        assert "0.6/U" in tar.getnames()
+    merged.extract("0.4", case_dir / "restored")
+    assert (case_dir / "restored" / "0.4" / "T").read_text() == "T" * 100
+
+
+@pytest.mark.parametrize("extension", ["tgz", "tar.zst", "tar"])
+def test_merges_other_archives_without_extracting_them(
+    case_dir: Path, extension: str
+) -> None:
+    try:
+        archives = [
+            create_plain(case_dir, TIMES[:3], extension),
+            create_plain(case_dir, TIMES[3:], extension),
+        ]
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        pytest.skip(f"Cannot write {extension} archives")
+    before = digests(case_dir, archives)
+    output = compact(case_dir, archives)
+    assert output == f"times_0.1_0.6_0.1.{extension}"
+    assert sorted(p.name for p in case_dir.glob("times_*")) == [
+        output,
+        f"{output}.sha256",
+    ]
+    assert digests(case_dir, [output]) == before
+    # The digests also hold without the manifest
+    (case_dir / f"{output}.sha256").unlink()
+    assert digests(case_dir, [output]) == before
+
+
+def test_mixed_archives_are_merged_by_reading_them(case_dir: Path) -> None:
+    archives = [
+        create_seekable(case_dir, TIMES[:3]),
+        create_plain(case_dir, TIMES[3:]),
+    ]
+    before = digests(case_dir, archives)
+    output = compact(case_dir, archives)
+    assert not (case_dir / f"{output}.idx").exists()
+    assert digests(case_dir, [output]) == before
+
+
+def test_finishes_an_interrupted_compaction(case_dir: Path) -> None:
+    archives = [
+        create_plain(case_dir, TIMES[:3]),
+        create_plain(case_dir, TIMES[3:]),
+    ]
+    output = compact(case_dir, archives)
+    assert find_merged(case_dir) == {}
+    # As if the first archive had not been removed yet
+    create_plain(case_dir, TIMES[:3])
+    (case_dir / f"{output}.merged").write_text(
+        "".join(f"{a}\n" for a in archives)
+    )
+    mtime = (case_dir / output).stat().st_mtime_ns
+    compact(case_dir, archives[:1], output=output)
+    assert not (case_dir / archives[0]).exists()
+    assert (case_dir / output).stat().st_mtime_ns == mtime
+    assert find_merged(case_dir) == {}
+
+
+def test_only_removes_the_archives_recorded_as_merged(
+    case_dir: Path,
+) -> None:
+    archives = [
+        create_plain(case_dir, TIMES[:3]),
+        create_plain(case_dir, TIMES[3:]),
+    ]
+    output = compact(case_dir, archives)
+    # Holds the same times but was not merged into it
+    create_plain(case_dir, TIMES[:3])
+    with pytest.raises(ValueError, match="not merged from"):
+        compact(case_dir, archives[:1], output=output)
+    assert (case_dir / archives[0]).exists()
+
+
+def test_checks_the_copied_frames_before_removing_anything(
+    case_dir: Path,
+) -> None:
+    archives = [
+        create_seekable(case_dir, TIMES[:3]),
+        create_seekable(case_dir, TIMES[3:]),
+    ]
+    output = compact(case_dir, archives)
+    archives = [
+        create_seekable(case_dir, TIMES[:3]),
+        create_seekable(case_dir, TIMES[3:]),
+    ]
+    (case_dir / f"{output}.merged").write_text(
+        "".join(f"{a}\n" for a in archives)
+    )
+    # A frame that did not make it to disk intact (the manifest still says
+    # that the time is in it)
+    offset, length = StreamArchive(case_dir / output).read_index()["0.5"]
+    with open(case_dir / output, "r+b") as f:
+        f.seek(offset + length // 2)
+        byte = f.read(1)
+        f.seek(offset + length // 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    with pytest.raises(ValueError, match="0.5"):
+        compact(case_dir, archives, output=output)
+    assert (case_dir / archives[0]).exists()
+    assert (case_dir / archives[1]).exists()
+
+
+def test_keeps_archives_that_are_not_in_the_merged_one(
+    case_dir: Path,
+) -> None:
+    archives = [
+        create_plain(case_dir, TIMES[:3]),
+        create_plain(case_dir, TIMES[3:]),
+    ]
+    # Not what the archives hold
+    create_plain(case_dir, ["0.1", "0.2"])
+    (case_dir / "times_0.1_0.2_0.1.tgz").rename(
+        case_dir / "times_0.1_0.6_0.1.tgz"
+    )
+    with pytest.raises(ValueError):
+        compact(case_dir, archives)
+    assert (case_dir / archives[0]).exists()
+    assert (case_dir / archives[1]).exists()
+
+
+def test_updates_the_catalog(case_dir: Path, tmp_path: Path) -> None:
+    archives = [
+        create_seekable(case_dir, TIMES[:3]),
+        create_seekable(case_dir, TIMES[3:]),
+    ]
+    catalog = ArchiveCatalog(tmp_path / "catalog.sqlite")
+    for archive in archives:
+        catalog.add_archive(case_dir / archive)
+    main(
+        [
+            "--catalog",
+            str(catalog.path),
+            str(case_dir),
+            *archives,
+        ]
+    )
+    assert [r.name for r in catalog.archives()] == ["times_0.1_0.6_0.1.tgz"]
+    (found,) = catalog.find("0.5")
+    assert found.archive == "times_0.1_0.6_0.1.tgz"
+    assert found.offset is not None
@@ -0,0 +1,135 @@
+import tarfile
+from pathlib import Path
+from typing import List
+
+import pytest
+from simon.archive.catalog import ArchiveCatalog
+from simon.archive.extract import extract_times, find_catalog, locate
+from simon.archive.stream import StreamArchive, pack
+from simon.openfoam.file_state import OFFileState
+
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    case_dir = tmp_path / "case"
+    (case_dir / "constant").mkdir(parents=True)
+    (case_dir / "system").mkdir()
+    (case_dir / "processor0").mkdir()
+    return case_dir
+
+
+@pytest.fixture
+def state(case_dir: Path) -> OFFileState:
+    return OFFileState(case_dir)
+
+
+def create_times(case_dir: Path, times: List[str]) -> None:
+    for t in times:
+        (case_dir / t / "uniform").mkdir(parents=True)
+        (case_dir / t / "uniform" / "time").write_text(t)
+        for field in ["U", "p", "T"]:
+            (case_dir / t / field).write_text(f"{field} at {t}")
+
+
+def create_tars(case_dir: Path, times: List[str]) -> None:
+    # Like the tar tasks, the members are under the path of the case
+    create_times(case_dir, times)
+    for t in times:
+        with tarfile.open(case_dir / f"{t}.tar", "w") as tar:
+            tar.add(case_dir / t)
+
+
+def remove_times(case_dir: Path, times: List[str]) -> None:
+    for t in times:
+        for path in sorted((case_dir / t).rglob("*"), reverse=True):
+            path.rmdir() if path.is_dir() else path.unlink()
+        (case_dir / t).rmdir()
+
+
+def test_extracts_fields_from_a_seekable_tar_mode_archive(
+    case_dir: Path, state: OFFileState, tmp_path: Path
+) -> None:
+    create_tars(case_dir, ["0.1", "0.2"])
+    pack(
+        case_dir / "times_0.1_0.2_0.1.tgz",
+        ["0.1.tar", "0.2.tar"],
+        case_dir=case_dir,
+    )
+    remove_times(case_dir, ["0.1", "0.2"])
+    for t in ["0.1", "0.2"]:
+        (case_dir / f"{t}.tar").unlink()
+    location = locate(state, "0.2")
+    assert location is not None and location.seekable
+    dest_dir = tmp_path / "out"
+    assert extract_times(state, ["0.2"], dest_dir, fields=["U"]) == {
+        "0.2": "times_0.1_0.2_0.1.tgz"
+    }
+    assert sorted(
+        str(p.relative_to(dest_dir)) for p in dest_dir.rglob("*")
+    ) == ["0.2", "0.2/U", "0.2/uniform", "0.2/uniform/time"]
+    assert (dest_dir / "0.2" / "U").read_text() == "U at 0.2"
+
+
+def test_extracts_several_times_from_plain_archives_and_tars(
+    case_dir: Path, state: OFFileState, tmp_path: Path
+) -> None:
+    create_times(case_dir, ["0.1", "0.2", "0.3"])
+    with tarfile.open(case_dir / "times_0.1_0.3_0.1.tar.xz", "w:xz") as tar:
+        for t in ["0.1", "0.2", "0.3"]:
+            tar.add(case_dir / t, arcname=t)
+    remove_times(case_dir, ["0.1", "0.2", "0.3"])
+    create_tars(case_dir, ["0.4"])
+    remove_times(case_dir, ["0.4"])
+    location = locate(state, "0.3")
+    assert location is not None and not location.seekable
+    dest_dir = tmp_path / "out"
+    extracted = extract_times(
+        state, ["0.1", "0.3", "0.4"], dest_dir, num_workers=2
+    )
+    assert extracted == {
+        "0.1": "times_0.1_0.3_0.1.tar.xz",
+        "0.3": "times_0.1_0.3_0.1.tar.xz",
+        "0.4": "0.4.tar",
+    }
+    assert sorted(p.name for p in dest_dir.iterdir()) == ["0.1", "0.3", "0.4"]
+    assert (dest_dir / "0.4" / "T").read_text() == "T at 0.4"
+
+
+def test_extracts_from_cases_without_processor_dirs(
+    case_dir: Path, tmp_path: Path
+) -> None:
+    # A finished case that only kept its archives
+    create_tars(case_dir, ["0.5"])
+    remove_times(case_dir, ["0.5"])
+    (case_dir / "processor0").rmdir()
+    state = OFFileState(case_dir, require_processor_dirs=False)
+    extract_times(state, ["0.5"], tmp_path / "out")
+    assert (tmp_path / "out" / "0.5" / "U").read_text() == "U at 0.5"
+
+
+def test_uses_the_catalog_when_the_case_has_one(
+    case_dir: Path, state: OFFileState, tmp_path: Path
+) -> None:
+    assert find_catalog(case_dir) is None
+    create_times(case_dir, ["0.1", "0.2"])
+    # The name of this archive does not say that it holds 0.1
+    archive = StreamArchive(case_dir / "stream.inprogress")
+    archive.append(case_dir, "0.1")
+    archive.append(case_dir, "0.2")
+    archive.finalize(case_dir / "times_0.2_0.2_0.1.tgz")
+    remove_times(case_dir, ["0.1", "0.2"])
+    assert locate(state, "0.1") is None
+    ArchiveCatalog.for_case(case_dir).add_archive(
+        case_dir / "times_0.2_0.2_0.1.tgz"
+    )
+    catalog = find_catalog(case_dir)
+    assert catalog is not None
+    extract_times(state, ["0.1"], tmp_path / "out", catalog=catalog)
+    assert (tmp_path / "out" / "0.1" / "p").read_text() == "p at 0.1"
+
+
+def test_raises_for_times_that_are_not_archived(
+    state: OFFileState, tmp_path: Path
+) -> None:
+    with pytest.raises(FileNotFoundError):
+        extract_times(state, ["0.1"], tmp_path / "out")
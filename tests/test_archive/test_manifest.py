@@ -0,0 +1,185 @@
+import hashlib
+import shutil
+import subprocess
+import tarfile
+from pathlib import Path
+
+import pytest
+from simon.archive import module_command
+from simon.archive.codecs import open_tar_stream
+from simon.archive.manifest import (create_archive, manifest_path_of,
+                                    read_embedded_manifest, read_manifest,
+                                    verify)
+
+MARKER = ".__reconstruction_done"
+
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    case_dir = tmp_path / "case"
+    for t in ["0.1", "0.2"]:
+        (case_dir / t / "uniform").mkdir(parents=True)
+        (case_dir / t / "uniform" / "time").write_text(t)
+        (case_dir / t / "U").write_text(f"U at {t}")
+        (case_dir / t / MARKER).touch()
+    return case_dir
+
+
+@pytest.mark.parametrize(
+    "name, compress_program", [("out.tar", None), ("out.tgz", "gzip -1")]
+)
+def test_manifest_has_the_digest_of_every_archived_file(
+    case_dir: Path, name: str, compress_program: str
+) -> None:
+    archive = case_dir / name
+    entries = create_archive(
+        archive,
+        ["0.1", "0.2"],
+        directory=case_dir,
+        excludes=[MARKER],
+        compress_program=compress_program,
+    )
+    assert read_manifest(manifest_path_of(archive)) == {
+        e.name: e for e in entries
+    }
+    with open_tar_stream(archive) as tar:
+        archived = {
+            member.name: hashlib.sha256(
+                tar.extractfile(member).read()  # type: ignore
+            ).hexdigest()
+            for member in tar
+            if member.isfile()
+        }
+    assert archived == {e.name: e.sha256 for e in entries}
+    assert sorted(archived) == [
+        "0.1/U",
+        "0.1/uniform/time",
+        "0.2/U",
+        "0.2/uniform/time",
+    ]
+
+
+def test_failing_compressor_fails_the_archive(case_dir: Path) -> None:
+    with pytest.raises(subprocess.CalledProcessError):
+        create_archive(
+            case_dir / "out.tgz",
+            ["0.1"],
+            directory=case_dir,
+            compress_program="false",
+        )
+    assert not manifest_path_of(case_dir / "out.tgz").exists()
+
+
+def test_verifies_sources_against_the_manifest(case_dir: Path) -> None:
+    archive = case_dir / "out.tar"
+    create_archive(archive, ["0.1", "0.2"], directory=case_dir)
+    assert verify(archive, ["0.1", "0.2/U"], case_dir) == []
+    # Sources that are gone have nothing left to delete
+    assert verify(archive, ["0.3"], case_dir) == []
+    (case_dir / "0.2" / "U").write_text("U changed after archiving")
+    assert verify(archive, ["0.1"], case_dir) == []
+    assert len(verify(archive, ["0.2"], case_dir)) == 1
+    (case_dir / "0.3").mkdir()
+    assert verify(archive, ["0.3"], case_dir) == [
+        f"Nothing in 0.3 is in {archive}"
+    ]
+    (case_dir / "0.3.tar").touch()
+    assert verify(archive, ["0.3.tar"], case_dir) == [
+        f"0.3.tar is not in {archive}"
+    ]
+    archive.unlink()
+    assert verify(archive, ["0.1"], case_dir) == [f"{archive} does not exist"]
+
+
+def test_files_missing_from_the_manifest_fail_the_check(
+    case_dir: Path,
+) -> None:
+    archive = case_dir / "0.1.tar"
+    create_archive(archive, ["0.1"], directory=case_dir, excludes=[MARKER])
+    assert verify(archive, ["0.1"], case_dir, excludes=[MARKER]) == []
+    assert verify(archive, ["0.1"], case_dir) == [
+        f"0.1/{MARKER} is not in {archive}"
+    ]
+    # Written after the time was archived
+    (case_dir / "0.1" / "p").write_text("p at 0.1")
+    (case_dir / "0.1" / "uniform" / "extra").write_text("extra")
+    assert verify(archive, ["0.1"], case_dir, excludes=[MARKER]) == [
+        f"0.1/p is not in {archive}",
+        f"0.1/uniform/extra is not in {archive}",
+    ]
+    # Only the fields at the top of the time are archived with fields
+    assert verify(
+        archive, ["0.1"], case_dir, excludes=[MARKER], fields=["U"]
+    ) == [f"0.1/uniform/extra is not in {archive}"]
+
+
+def test_tars_can_carry_their_own_manifest(case_dir: Path) -> None:
+    archive = case_dir / "0.1.tar"
+    entries = create_archive(
+        archive,
+        ["0.1"],
+        directory=case_dir,
+        excludes=[MARKER],
+        manifest_member="0.1.tar.sha256",
+    )
+    assert not manifest_path_of(archive).exists()
+    assert read_embedded_manifest(archive, "0.1.tar.sha256") == {
+        e.name: e for e in entries
+    }
+    assert read_embedded_manifest(archive, "0.2.tar.sha256") is None
+    assert verify(archive, ["0.1"], case_dir, excludes=[MARKER]) == []
+    (case_dir / "0.1" / "U").write_text("U changed after archiving")
+    assert verify(archive, ["0.1"], case_dir, excludes=[MARKER]) == [
+        f"0.1/U is 25 bytes but 8 bytes were archived in {archive}"
+    ]
+
+
+def test_lists_archives_without_a_manifest(case_dir: Path) -> None:
+    # The tars of the times used to be written from their absolute paths
+    archive = case_dir / "0.1.tar"
+    with tarfile.open(archive, "w") as tar:
+        tar.add(case_dir / "0.1")
+    assert verify(archive, ["0.1"], case_dir) == []
+    (case_dir / "0.1" / "U").write_text("U changed after archiving")
+    assert len(verify(archive, ["0.1"], case_dir)) == 1
+
+
+def test_command_line(case_dir: Path, tmp_path: Path) -> None:
+    # Run as a module from somewhere else like the tasks do
+    if shutil.which("zstd") is None:
+        pytest.skip("zstd is not installed")
+    tool = module_command("manifest")
+    archive = case_dir / "out.tar.zst"
+    subprocess.run(
+        f"{tool} tar --directory {case_dir} --compress-program 'zstd -1'"
+        f" {archive} 0.1",
+        shell=True,
+        check=True,
+        cwd=tmp_path,
+    )
+    command = f"{tool} verify --directory {case_dir}"
+    assert (
+        subprocess.run(
+            f"{command} {archive} 0.1", shell=True, cwd=tmp_path
+        ).returncode
+        == 0
+    )
+    (case_dir / "0.1" / "U").write_text("U changed after archiving")
+    result = subprocess.run(
+        f"{command} {archive} 0.1",
+        shell=True,
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert "0.1/U is" in result.stderr
+    # The fields that are not archived do not have to be in it
+    assert (
+        subprocess.run(
+            f"{command} --exclude {MARKER} {archive} 0.1 --fields T",
+            shell=True,
+            cwd=tmp_path,
+        ).returncode
+        == 0
+    )
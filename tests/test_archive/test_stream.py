@@ -0,0 +1,360 @@
+import gzip
+import io
+import os
+import subprocess
+import tarfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from simon.archive import delta
+from simon.archive.manifest import read_manifest
+from simon.archive.stream import (StreamArchive, index_path_of, main, pack,
+                                  read_index)
+
+MARKER = ".__reconstruction_done"
+needs_zstd = pytest.mark.skipif(
+    not delta.is_available(), reason="zstd is not installed"
+)
+
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    case_dir = tmp_path / "case"
+    for t in ["0.1", "0.2"]:
+        (case_dir / t / "uniform").mkdir(parents=True)
+        (case_dir / t / "uniform" / "time").write_text(t)
+        (case_dir / t / "U").write_text(f"U at {t}")
+        (case_dir / t / "p").write_text(f"p at {t}")
+        (case_dir / t / MARKER).touch()
+    return case_dir
+
+
+def test_finalized_archive_is_a_tgz(tmp_path: Path, case_dir: Path) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    assert archive.append(case_dir, "0.1", excludes=[MARKER])
+    assert archive.append(case_dir, "0.2", excludes=[MARKER])
+    final_path = tmp_path / "times_0.1_0.2_0.1.tgz"
+    archive.finalize(final_path)
+    assert not archive.path.exists()
+    assert (tmp_path / "times_0.1_0.2_0.1.tgz.idx").is_file()
+    with tarfile.open(final_path) as tar:
+        assert tar.getnames() == [
+            "0.1",
+            "0.1/U",
+            "0.1/p",
+            "0.1/uniform",
+            "0.1/uniform/time",
+            "0.2",
+            "0.2/U",
+            "0.2/p",
+            "0.2/uniform",
+            "0.2/uniform/time",
+        ]
+        assert tar.extractfile("0.2/U").read() == b"U at 0.2"  # type: ignore
+
+
+def test_appends_waiting_on_finalize_are_refused(
+    tmp_path: Path, case_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1", excludes=[MARKER])
+    errors = []
+
+    def append() -> None:
+        try:
+            StreamArchive(archive.path).append(case_dir, "0.2")
+        except ValueError as e:
+            errors.append(e)
+
+    appender = threading.Thread(target=append)
+    replace = os.replace
+
+    def replace_once_appender_waits(src: Path, dst: Path) -> None:
+        # While finalize holds the lock
+        if appender.ident is None:
+            appender.start()
+            time.sleep(0.2)
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace_once_appender_waits)
+    final_path = tmp_path / "times_0.1_0.1_0.1.tgz"
+    archive.finalize(final_path)
+    appender.join()
+    assert len(errors) == 1
+    assert not archive.path.exists()
+    with tarfile.open(final_path) as tar:
+        assert "0.2" not in tar.getnames()
+
+
+def test_appends_after_finalize_are_refused(
+    tmp_path: Path, case_dir: Path
+) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1", excludes=[MARKER])
+    final_path = tmp_path / "times_0.1_0.1_0.1.tgz"
+    archive.finalize(final_path)
+    with pytest.raises(ValueError, match="finalized"):
+        StreamArchive(archive.path).append(case_dir, "0.2")
+    assert not archive.path.exists()
+    assert not archive.index_path.exists()
+    # Finalizing it again is a no-op
+    StreamArchive(archive.path).finalize(final_path)
+    assert read_index(index_path_of(final_path)).keys() == {"0.1"}
+    # Until the finished archive is gone (e.g., merged into another one)
+    final_path.unlink()
+    assert StreamArchive(archive.path).append(case_dir, "0.2")
+    assert list(archive.read_index()) == ["0.2"]
+
+
+def test_frames_can_be_read_on_their_own(
+    tmp_path: Path, case_dir: Path
+) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1")
+    archive.append(case_dir, "0.2", fields=["U"])
+    offset, length = archive.read_index()["0.2"]
+    with open(archive.path, "rb") as f:
+        f.seek(offset)
+        frame = gzip.decompress(f.read(length))
+    with tarfile.open(fileobj=io.BytesIO(frame)) as tar:
+        assert tar.getnames() == [
+            "0.2",
+            "0.2/U",
+            "0.2/uniform",
+            "0.2/uniform/time",
+        ]
+
+
+def test_appending_is_idempotent(tmp_path: Path, case_dir: Path) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    assert archive.append(case_dir, "0.1")
+    size = archive.path.stat().st_size
+    assert not archive.append(case_dir, "0.1")
+    assert archive.path.stat().st_size == size
+
+
+def test_drops_interrupted_appends(tmp_path: Path, case_dir: Path) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1")
+    size = archive.path.stat().st_size
+    with open(archive.path, "ab") as f:
+        f.write(b"half a frame")
+    archive.append(case_dir, "0.2")
+    assert archive.read_index()["0.2"][0] == size
+
+
+def test_appends_the_files_to_the_manifest(
+    tmp_path: Path, case_dir: Path
+) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1", excludes=[MARKER], fields=["U"])
+    archive.append(case_dir, "0.2", excludes=[MARKER], fields=["U"])
+    archive.finalize(tmp_path / "times.tgz")
+    assert sorted(read_manifest(tmp_path / "times.tgz.sha256")) == [
+        "0.1/U",
+        "0.1/uniform/time",
+        "0.2/U",
+        "0.2/uniform/time",
+    ]
+    # Appending again checks the time against the manifest
+    (case_dir / "0.2" / "U").write_text("U changed after appending")
+    archive = StreamArchive(tmp_path / "stream_0_2.inprogress")
+    archive.append(case_dir, "0.1")
+    archive.append(case_dir, "0.2")
+    assert not archive.append(case_dir, "0.1")
+    (case_dir / "0.2" / "U").write_text("U changed again")
+    with pytest.raises(ValueError, match="0.2/U"):
+        archive.append(case_dir, "0.2")
+
+
+def test_command_line(tmp_path: Path, case_dir: Path) -> None:
+    stream_path = tmp_path / "stream_0_1.inprogress"
+    main(["append", str(stream_path), str(case_dir), "0.1"])
+    main(["finalize", str(stream_path), str(tmp_path / "times.tgz")])
+    with tarfile.open(tmp_path / "times.tgz") as tar:
+        assert f"0.1/{MARKER}" in tar.getnames()
+
+
+def test_extracts_a_single_time(tmp_path: Path, case_dir: Path) -> None:
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1", excludes=[MARKER])
+    archive.append(case_dir, "0.2", excludes=[MARKER])
+    archive.finalize(tmp_path / "times.tgz")
+    dest_dir = tmp_path / "restored"
+    StreamArchive(tmp_path / "times.tgz").extract("0.2", dest_dir)
+    assert sorted(p.name for p in dest_dir.iterdir()) == ["0.2"]
+    assert (dest_dir / "0.2" / "U").read_text() == "U at 0.2"
+    assert (dest_dir / "0.2" / "uniform" / "time").read_text() == "0.2"
+
+
+def test_packs_tars_into_a_seekable_archive(
+    tmp_path: Path, case_dir: Path
+) -> None:
+    for t in ["0.1", "0.2"]:
+        with tarfile.open(case_dir / f"{t}.tar", "w") as tar:
+            tar.add(case_dir / t, arcname=t)
+    archive_path = tmp_path / "times.tgz.inprogress.1"
+    index_path = tmp_path / "times.tgz.idx"
+    # Whatever an interrupted run left behind gets replaced
+    archive_path.write_bytes(b"junk")
+    pack(
+        archive_path,
+        ["0.1.tar", "0.2.tar"],
+        case_dir=case_dir,
+        index_path=index_path,
+    )
+    archive_path.rename(tmp_path / "times.tgz")
+    with tarfile.open(tmp_path / "times.tgz") as tar:
+        assert tar.getnames() == ["0.1.tar", "0.2.tar"]
+    assert list(read_manifest(tmp_path / "times.tgz.inprogress.1.sha256")) == [
+        "0.1.tar",
+        "0.2.tar",
+    ]
+    archive = StreamArchive(tmp_path / "times.tgz")
+    assert list(archive.read_index()) == ["0.1", "0.2"]
+    # The tar of the time gets extracted too
+    archive.extract("0.1", tmp_path / "restored")
+    assert sorted(p.name for p in (tmp_path / "restored").iterdir()) == [
+        "0.1"
+    ]
+    assert (tmp_path / "restored" / "0.1" / "p").read_text() == "p at 0.1"
+
+
+def test_stores_unchanged_files_once(tmp_path: Path, case_dir: Path) -> None:
+    points = "(0 0 0)\n" * 1000
+    for t in ["0.1", "0.2"]:
+        (case_dir / t / "polyMesh").mkdir()
+        (case_dir / t / "polyMesh" / "points").write_text(points)
+    # Same size as U at 0.1 but not the same contents
+    (case_dir / "0.2" / "U").write_text("U at 0.3")
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1", excludes=[MARKER])
+    archive.append(case_dir, "0.2", excludes=[MARKER])
+    archive.finalize(tmp_path / "times.tgz")
+    with tarfile.open(tmp_path / "times.tgz") as tar:
+        links = {m.name: m.linkname for m in tar if m.islnk()}
+        assert links == {"0.2/polyMesh/points": "0.1/polyMesh/points"}
+        tar.extractall(tmp_path / "all")
+    assert (tmp_path / "all" / "0.2" / "polyMesh" / "points").read_text() == (
+        points
+    )
+    assert read_manifest(tmp_path / "times.tgz.sha256")[
+        "0.2/polyMesh/points"
+    ].size == len(points)
+    # A single time gets the files it links to from their frames
+    archive = StreamArchive(tmp_path / "times.tgz")
+    archive.extract("0.2", tmp_path / "one")
+    restored = tmp_path / "one" / "0.2" / "polyMesh" / "points"
+    assert restored.read_text() == points
+    assert not restored.is_symlink()
+    assert sorted(p.name for p in (tmp_path / "one").iterdir()) == ["0.2"]
+    assert (tmp_path / "one" / "0.2" / "U").read_text() == "U at 0.3"
+
+
+def test_does_not_link_to_interrupted_appends(
+    tmp_path: Path, case_dir: Path
+) -> None:
+    for t in ["0.1", "0.2"]:
+        (case_dir / t / "T").write_text("T" * 100)
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    archive.append(case_dir, "0.1", excludes=[MARKER])
+    # Interrupted after the files of 0.1 went into the manifest but before
+    # its frame got indexed
+    archive.index_path.write_text("")
+    archive.path.write_bytes(b"")
+    archive.append(case_dir, "0.2", excludes=[MARKER])
+    archive.append(case_dir, "0.1", excludes=[MARKER])
+    frame = archive.read_frame("0.2")
+    with tarfile.open(fileobj=io.BytesIO(frame), mode="r|") as tar:
+        assert not any(m.islnk() for m in tar)
+    archive.finalize()
+    archive.extract("0.1", tmp_path / "restored")
+    assert (tmp_path / "restored" / "0.1" / "T").read_text() == "T" * 100
+
+
+def write_evolving_field(case_dir: Path, times: list) -> dict:
+    # A field of which a few values change from one time to the next
+    values = [f"{i * 0.001:.6f}" for i in range(20000)]
+    contents = {}
+    for i, t in enumerate(times):
+        (case_dir / t).mkdir(parents=True, exist_ok=True)
+        values[i * 100] = "1.0"
+        contents[t] = "\n".join(values)
+        (case_dir / t / "T").write_text(contents[t])
+    return contents
+
+
+def frame_names(archive: StreamArchive, timestamp: str) -> list:
+    frame = archive.read_frame(timestamp)
+    with tarfile.open(fileobj=io.BytesIO(frame), mode="r|") as tar:
+        return [m.name for m in tar]
+
+
+@needs_zstd
+def test_stores_delta_fields_as_patches(
+    tmp_path: Path, case_dir: Path
+) -> None:
+    times = ["0.1", "0.2", "0.3", "0.4"]
+    contents = write_evolving_field(case_dir, times)
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    for t in times:
+        archive.append(
+            case_dir,
+            t,
+            excludes=[MARKER],
+            delta_fields=["T"],
+            keyframe_every=3,
+        )
+    assert "0.1/T" in frame_names(archive, "0.1")
+    assert "0.2/T.zpatch" in frame_names(archive, "0.2")
+    assert "0.3/T.zpatch" in frame_names(archive, "0.3")
+    # Every third time of the field is stored in full again
+    assert "0.4/T" in frame_names(archive, "0.4")
+    assert "0.2/U" in frame_names(archive, "0.2")
+    assert len(archive.read_frame("0.3")) < len(contents["0.3"]) / 10
+    assert read_manifest(archive.manifest_path)["0.3/T"].size == len(
+        contents["0.3"]
+    )
+    archive.finalize(tmp_path / "times.tgz")
+    archive = StreamArchive(tmp_path / "times.tgz")
+    for t in times:
+        archive.extract(t, tmp_path / "restored")
+        assert (tmp_path / "restored" / t / "T").read_text() == contents[t]
+        assert not (tmp_path / "restored" / t / "T.zpatch").exists()
+    assert (tmp_path / "restored" / "0.2" / "U").read_text() == "U at 0.2"
+    archive.extract("0.2", tmp_path / "fields", fields=["T"])
+    restored = tmp_path / "fields" / "0.2"
+    assert sorted(p.name for p in restored.iterdir()) == ["T", "uniform"]
+
+
+@needs_zstd
+def test_does_not_link_to_patched_files(
+    tmp_path: Path, case_dir: Path
+) -> None:
+    contents = write_evolving_field(case_dir, ["0.1", "0.2"])
+    (case_dir / "0.3").mkdir()
+    (case_dir / "0.3" / "T_0").write_text(contents["0.2"])
+    (case_dir / "0.3" / "U_0").write_text("U at 0.1")
+    archive = StreamArchive(tmp_path / "stream_0_1.inprogress")
+    for t in ["0.1", "0.2", "0.3"]:
+        archive.append(case_dir, t, delta_fields=["T"])
+    assert "0.2/T.zpatch" in frame_names(archive, "0.2")
+    frame = archive.read_frame("0.3")
+    with tarfile.open(fileobj=io.BytesIO(frame), mode="r|") as tar:
+        # 0.2/T is only in the archive as a patch
+        assert {m.name: m.linkname for m in tar if m.islnk()} == {
+            "0.3/U_0": "0.1/U"
+        }
+    archive.finalize(tmp_path / "times.tgz")
+    restored = tmp_path / "restored"
+    restored.mkdir()
+    subprocess.run(
+        ["tar", "-xzf", str(tmp_path / "times.tgz"), "-C", str(restored)],
+        check=True,
+    )
+    assert (restored / "0.3" / "T_0").read_text() == contents["0.2"]
+    assert (restored / "0.3" / "U_0").read_text() == "U at 0.1"
+    StreamArchive(tmp_path / "times.tgz").extract("0.3", tmp_path / "one")
+    assert (tmp_path / "one" / "0.3" / "T_0").read_text() == contents["0.2"]
\ No newline at end of file
@@ -4,10 +4,14 @@ from typing import List
 from unittest import mock
 
 import pytest
+from simon.archive import module_command
+from simon.archive.codecs import Codec
 from simon.cluster.local import LocalJobManager
 from simon.task import Task
 
 COMPRESS_PID = "513849050313"
+# What the compress jobs write the manifest of the archive with
+MANIFEST_HASH = f"{module_command('manifest')} hash"
 
 # Case directory setup convenience functions
 
@@ -149,7 +153,11 @@ def test_compress_generates_correct_command_for_files(
     compress_command = cluster._create_compress_command(
         tgz_file=tgz_file, files=files_list
     )
-    true_tar_command = "tar -czvf some_tgz_file.tgz.inprogress.$$ 1e-4 0.001 0.01 0.1 1 10.0 100"
+    true_tar_command = (
+        "tar -czvf some_tgz_file.tgz.inprogress.$$ 1e-4 0.001 0.01 0.1 1 10.0 100"
+        f" && {MANIFEST_HASH} some_tgz_file.tgz.sha256"
+        " 1e-4 0.001 0.01 0.1 1 10.0 100"
+    )
     true_compress_command = (
         "mv some_tgz_file.tgz.queued some_tgz_file.tgz.inprogress.$$"
         + " && "
@@ -169,6 +177,8 @@ def test_compress_generates_correct_command_for_directories(
     )
     true_tar_command = (
         f"tar -czvf {test_tgz}.inprogress.$$ 1e-4 0.001 0.01 0.1 1 10.0 100"
+        f" && {MANIFEST_HASH} {test_tgz}.sha256"
+        " 1e-4 0.001 0.01 0.1 1 10.0 100"
     )
     true_compress_command = (
         f"mv {test_tgz}.queued {test_tgz}.inprogress.$$"
@@ -180,6 +190,36 @@ def test_compress_generates_correct_command_for_directories(
     assert compress_command == true_compress_command
 
 
+def test_compress_generates_command_for_codec(
+    case_dir: Path, files_list: List[str]
+) -> None:
+    cluster = LocalJobManager(
+        case_dir=case_dir, codec=Codec("zstd", level=19, threads=8)
+    )
+    compress_command = cluster._create_compress_command(
+        tgz_file="some_file.tar.zst", files=files_list[:2]
+    )
+    assert compress_command.split(" && ")[1:3] == [
+        "tar -I 'zstd -T8 -19' -cvf some_file.tar.zst.inprogress.$$"
+        " 1e-4 0.001",
+        f"{MANIFEST_HASH} some_file.tar.zst.sha256 1e-4 0.001",
+    ]
+
+
+def test_compress_writes_index_of_seekable_archives_next_to_it(
+    case_dir: Path, files_list: List[str]
+) -> None:
+    cluster = LocalJobManager(case_dir=case_dir, codec=Codec(seekable=True))
+    compress_command = cluster._create_compress_command(
+        tgz_file="some_file.tgz", files=files_list[:1]
+    )
+    assert (
+        " pack --index some_file.tgz.idx --manifest some_file.tgz.sha256"
+        " some_file.tgz.inprogress.$$ 1e-4 && "
+        in compress_command
+    )
+
+
 def test_compress_generates_correct_sfile(
     cluster: LocalJobManager, files_list: List[str]
 ) -> None:
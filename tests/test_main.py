@@ -0,0 +1,100 @@
+import shutil
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+from main import create_listener, init_argparse, report_drain_mode
+from simon.cluster.local import LocalJobManager
+from simon.cluster.slurm import SlurmJobManager
+from simon.openfoam.solver_log import SolverLog
+
+JOB_SFILE_NAME = "case.sbatch"
+COMPRESS_SFILE_NAME = "compress.sbatch.template"
+
+
+@pytest.fixture
+def case_dir(tmp_path: Path) -> Path:
+    (tmp_path / "system").mkdir()
+    (tmp_path / "constant").mkdir()
+    (tmp_path / "processor0").mkdir()
+    tests_dir = Path(__file__).parent
+    shutil.copy(tests_dir / "sample_case.sbatch", tmp_path / JOB_SFILE_NAME)
+    shutil.copy(
+        tests_dir / "sample_compress.sbatch", tmp_path / COMPRESS_SFILE_NAME
+    )
+    return tmp_path
+
+
+def test_runs_locally_unless_given_a_slurm_job(case_dir: Path) -> None:
+    listener = create_listener(Decimal("1"), Decimal("10"), case_dir)
+    assert isinstance(listener.cluster, LocalJobManager)
+    assert not listener.hold_job_when_draining
+
+
+def test_holds_the_slurm_job_when_asked_to(case_dir: Path) -> None:
+    args = init_argparse().parse_args(
+        [
+            "monitor",
+            "--keep-every",
+            "1",
+            "--compress-every",
+            "10",
+            "--hold-job-when-draining",
+            "--slurm-job-id",
+            "19810412",
+            "--slurm-job-sfile",
+            JOB_SFILE_NAME,
+            "--slurm-compress-sfile",
+            COMPRESS_SFILE_NAME,
+        ]
+    )
+    listener = create_listener(
+        args.keep_every,
+        args.compress_every,
+        case_dir,
+        hold_job_when_draining=args.hold_job_when_draining,
+        slurm_job_id=args.slurm_job_id,
+        slurm_job_sfile=args.slurm_job_sfile,
+        slurm_compress_sfile=args.slurm_compress_sfile,
+    )
+    assert isinstance(listener.cluster, SlurmJobManager)
+    assert listener.cluster.job_id == "19810412"
+    assert listener.hold_job_when_draining
+
+
+def test_refuses_a_slurm_job_without_its_sbatch_files(case_dir: Path) -> None:
+    with pytest.raises(ValueError):
+        create_listener(
+            Decimal("1"),
+            Decimal("10"),
+            case_dir,
+            slurm_job_id="19810412",
+            slurm_job_sfile=JOB_SFILE_NAME,
+        )
+
+
+def test_reports_when_draining_starts_and_stops(
+    case_dir: Path, capsys: pytest.CaptureFixture
+) -> None:
+    listener = create_listener(Decimal("1"), Decimal("10"), case_dir)
+    report_drain_mode(listener, was_draining=False)
+    assert capsys.readouterr().out == ""
+    listener.draining = True
+    report_drain_mode(listener, was_draining=False)
+    assert "Draining..." in capsys.readouterr().out
+    listener.draining = False
+    report_drain_mode(listener, was_draining=True)
+    assert "Resuming..." in capsys.readouterr().out
+
+
+def test_write_completion_follows_the_given_solver_log(case_dir: Path) -> None:
+    log = SolverLog(case_dir / "log.pimpleFoam")
+    listener = create_listener(
+        Decimal("1"),
+        Decimal("10"),
+        case_dir,
+        detect_write_completion=True,
+        solver_log=log,
+    )
+    assert listener.completion is not None
+    assert listener.completion.solver_log is log
@@ -42,6 +42,16 @@ def create_split_timestamps(case_dir: Path, timestamps: List[str]) -> None:
                 (case_dir / f"processor{i}" / timestamp / var).touch()
 
 
+def create_collated_split_timestamps(
+    case_dir: Path, timestamps: List[str]
+) -> None:
+    processors_dir = case_dir / f"processors{NUM_PROCESSORS}"
+    for timestamp in timestamps:
+        (processors_dir / timestamp).mkdir()
+        for var in TEST_VARIABLES:
+            (processors_dir / timestamp / var).touch()
+
+
 def create_reconstructed_timestamps_without_done_marker(
     case_dir: Path, timestamps: List[str]
 ) -> None:
@@ -79,6 +89,15 @@ def decomposed_case_dir(tmp_path: Path) -> Path:
     return case_dir
 
 
+@pytest.fixture
+def collated_case_dir(tmp_path: Path) -> Path:
+    case_dir = tmp_path
+    (case_dir / "constant").mkdir()
+    (case_dir / "system").mkdir()
+    (case_dir / f"processors{NUM_PROCESSORS}").mkdir()
+    return case_dir
+
+
 @pytest.fixture
 def listener(decomposed_case_dir: Path) -> OFListener:
     return OFListener(
@@ -89,6 +108,16 @@ def listener(decomposed_case_dir: Path) -> OFListener:
     )
 
 
+@pytest.fixture
+def collated_listener(collated_case_dir: Path) -> OFListener:
+    return OFListener(
+        state=OFFileState(collated_case_dir),
+        keep_every=Decimal("0.0001"),
+        compress_every=Decimal("3000"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+    )
+
+
 @pytest.fixture
 def times() -> List[str]:
     return sorted(TEST_TIMESTAMP_STRINGS, key=float)
@@ -0,0 +1,57 @@
+import time
+from pathlib import Path
+
+import pytest
+from simon.openfoam.completion import WriteCompletionDetector
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.solver_log import SolverLog
+from tests.test_openfoam.conftest import (NUM_PROCESSORS,
+                                          create_split_timestamps)
+
+
+def create_uniform_time(case_dir: Path, timestamp: str) -> None:
+    for i in range(NUM_PROCESSORS):
+        uniform_dir = case_dir / f"processor{i}" / timestamp / "uniform"
+        uniform_dir.mkdir()
+        (uniform_dir / "time").touch()
+
+
+@pytest.fixture
+def detector(decomposed_case_dir: Path) -> WriteCompletionDetector:
+    return WriteCompletionDetector(
+        OFFileState(decomposed_case_dir),
+        quiet_seconds=10,
+        solver_log=SolverLog(decomposed_case_dir / "log.pimpleFoam"),
+        clock=lambda: time.time() + 60,
+    )
+
+
+def test_complete_once_solver_moves_on(
+    decomposed_case_dir: Path, detector: WriteCompletionDetector
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1"])
+    (decomposed_case_dir / "log.pimpleFoam").write_text("Time = 0.1\n")
+    assert not detector.is_complete("0.1")
+    with open(decomposed_case_dir / "log.pimpleFoam", "a") as f:
+        f.write("Time = 0.105\n")
+    assert detector.is_complete("0.1")
+
+
+def test_complete_once_quiet(
+    decomposed_case_dir: Path, detector: WriteCompletionDetector
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1"])
+    assert not detector.is_complete("0.1")
+    create_uniform_time(decomposed_case_dir, "0.1")
+    assert detector.is_complete("0.1")
+    detector.clock = time.time
+    assert not detector.is_complete("0.1")
+
+
+def test_incomplete_when_a_processor_is_missing_uniform_time(
+    decomposed_case_dir: Path, detector: WriteCompletionDetector
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1"])
+    create_uniform_time(decomposed_case_dir, "0.1")
+    (decomposed_case_dir / "processor3" / "0.1" / "uniform" / "time").unlink()
+    assert not detector.is_complete("0.1")
@@ -1,11 +1,13 @@
 import shutil
+from decimal import Decimal
 from pathlib import Path
 from typing import Callable, List
 
 import pytest
 from simon.openfoam.file_state import OFFileState
 from tests.test_openfoam.conftest import (
-    create_compressed_files, create_reconstructed_tars,
+    NUM_PROCESSORS, create_collated_split_timestamps, create_compressed_files,
+    create_reconstructed_tars,
     create_reconstructed_timestamps_with_done_marker,
     create_reconstructed_timestamps_without_done_marker,
     create_split_timestamps)
@@ -35,6 +37,27 @@ def test_in_bad_case_dir(
         OFFileState(decomposed_case_dir)
 
 
+def test_processor_dirs_are_not_needed_for_the_archives(
+    decomposed_case_dir: Path,
+) -> None:
+    (decomposed_case_dir / "processor0").rmdir()
+    state = OFFileState(decomposed_case_dir, require_processor_dirs=False)
+    assert state.get_split_times() == []
+    (decomposed_case_dir / "system").rmdir()
+    with pytest.raises(ValueError):
+        OFFileState(decomposed_case_dir, require_processor_dirs=False)
+
+
+def test_in_valid_collated_case_dir(collated_case_dir: Path) -> None:
+    # This should not raise an error
+    state = OFFileState(collated_case_dir)
+    assert state.is_collated
+
+
+def test_uncollated_case_dir_is_not_collated(state: OFFileState) -> None:
+    assert not state.is_collated
+
+
 # Test get file state
 
 
@@ -66,6 +89,14 @@ def test_given_extra_file_states_returns_correct_list_of_split_times(
     assert state.get_split_times() == times
 
 
+def test_given_collated_split_times_returns_correct_list_of_split_times(
+    collated_case_dir: Path, times: List[str]
+) -> None:
+    state = OFFileState(collated_case_dir)
+    create_collated_split_timestamps(collated_case_dir, times)
+    assert state.get_split_times() == times
+
+
 def test_given_only_reconstructed_times_returns_correct_list_of_reconstructed_times(
     state: OFFileState, times: List[str]
 ) -> None:
@@ -131,6 +162,46 @@ def test_given_only_partially_reconstructed_times_does_not_return_anything(
     assert state.get_tarred_times() == []
 
 
+def test_split_time_counts_count_the_processors_containing_each_time(
+    state: OFFileState, times: List[str]
+) -> None:
+    create_split_timestamps(state.case_dir, times)
+    # Simulate OpenFOAM still writing out the last time on some processors
+    for i in range(NUM_PROCESSORS // 2, NUM_PROCESSORS):
+        shutil.rmtree(state.case_dir / f"processor{i}" / times[-1])
+    counts = state.get_split_time_counts()
+    assert set(counts) == set(times)
+    for t in times[:-1]:
+        assert counts[t] == NUM_PROCESSORS
+    assert counts[times[-1]] == NUM_PROCESSORS // 2
+
+
+def test_returns_split_times_missing_from_processor0(
+    state: OFFileState, times: List[str]
+) -> None:
+    create_split_timestamps(state.case_dir, times)
+    shutil.rmtree(state.case_dir / "processor0" / times[-1])
+    assert state.get_split_times() == times
+
+
+def test_lists_time_dirs_whatever_their_state(
+    state: OFFileState, times: List[str]
+) -> None:
+    create_split_timestamps(state.case_dir, times[:2])
+    shutil.rmtree(state.case_dir / "processor0" / times[1])
+    create_reconstructed_timestamps_without_done_marker(
+        state.case_dir, times[2:3]
+    )
+    processor_dirs = [
+        state.case_dir / f"processor{i}" for i in range(NUM_PROCESSORS)
+    ]
+    assert sorted(state.get_split_time_dirs()) == sorted(
+        [d / times[0] for d in processor_dirs]
+        + [d / times[1] for d in processor_dirs[1:]]
+    )
+    assert state.get_time_dirs() == times[2:3]
+
+
 # Test query timestamp properties
 
 
@@ -270,6 +341,49 @@ def test_is_compressed_returns_false_when_is_outside_range(
         assert not state.is_compressed(t)
 
 
+@pytest.mark.parametrize(
+    "compressed_files, compressed_timestamps, uncompressed_timestamps",
+    [
+        (
+            ["times_0_0.15_0.05.tgz"],
+            ["0", "0.05", "0.1", "0.15"],
+            ["0.2", "0.25", "0.99", "1"],
+        ),
+        (
+            ["times_0_0.1_0.05.tgz", "times_1_1.15_0.05.tgz"],
+            ["0", "0.05", "0.1", "1", "1.05", "1.1", "1.15"],
+            ["0.2", "0.5", "0.9", "1.2", "1.4"],
+        ),
+        (
+            ["times_0_2_0.5.tgz", "times_0.1_0.3_0.1.tgz"],
+            ["0", "0.1", "0.2", "0.3", "0.5", "1", "2"],
+            ["0.4", "0.6", "1.1", "2.5"],
+        ),
+        ([], [], ["0", "0.1"]),
+    ],
+)
+def test_get_compressed_time_files_matches_is_compressed(
+    state: OFFileState,
+    compressed_files: List[str],
+    compressed_timestamps: List[str],
+    uncompressed_timestamps: List[str],
+) -> None:
+    create_compressed_files(state.case_dir, compressed_files)
+    timestamps = sorted(
+        compressed_timestamps + uncompressed_timestamps, key=float
+    )
+    compressed_time_files = state.get_compressed_time_files(timestamps)
+    assert sorted(compressed_time_files, key=float) == sorted(
+        compressed_timestamps, key=float
+    )
+    for t in timestamps:
+        assert state.is_compressed(t) == (t in compressed_time_files)
+    # Along with the compressed file each one is in
+    assert compressed_time_files == {
+        t: state.find_compressed_file(t) for t in compressed_time_files
+    }
+
+
 def test_reconstructed_dir_exists_returns_true_when_reconstructed_time_exists(
     state: OFFileState,
 ) -> None:
@@ -411,3 +525,72 @@ def test_create_compressed_filename_with_invalid_arguments_raises_value_error(
 ) -> None:
     with pytest.raises(ValueError):
         state.create_compressed_filename(start, end, step)
+
+
+def test_get_split_field_sizes(decomposed_case_dir: Path) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1"])
+    (decomposed_case_dir / "processor0" / "0.1" / "U").write_text("abc")
+    (decomposed_case_dir / "processor0" / "0.1" / "uniform").mkdir()
+    state = OFFileState(decomposed_case_dir)
+    assert state.get_split_field_sizes("0.1") == {
+        "U": 3,
+        "T": 0,
+        "p": 0,
+        "H2": 0,
+    }
+    assert state.get_split_field_sizes("0.2") == {}
+
+
+def test_get_streamed_times_only_returns_complete_index_lines(
+    decomposed_case_dir: Path, state: OFFileState
+) -> None:
+    stream_file = state.create_stream_filename(1, "0.2")
+    assert stream_file == "stream_1_0.2.inprogress"
+    (decomposed_case_dir / stream_file).touch()
+    (decomposed_case_dir / f"{stream_file}.idx").write_text(
+        "0.2 0 10\n0.3 10 12\n0.35 22"
+    )
+    assert state.get_stream_files() == [stream_file]
+    assert state.get_streamed_times() == {
+        "0.2": stream_file,
+        "0.3": stream_file,
+    }
+    assert state.extract_stream_file_params(stream_file) == (
+        1,
+        Decimal("0.2"),
+    )
+
+
+def test_compressed_files_with_any_codec_extension_are_recognized(
+    decomposed_case_dir: Path, state: OFFileState
+) -> None:
+    create_compressed_files(
+        decomposed_case_dir,
+        [
+            "times_0.3_0.4_0.1.tar.zst",
+            "times_0.1_0.2_0.1.tgz",
+            "times_0.5_0.6_0.1.tar.xz",
+            "times_0.7_0.8_0.1.tar.lz4",
+            "times_0.9_1.0_0.1.tar",
+            "times_1.1_1.2_0.1.tar.zst.inprogress.123",
+            "times_1.3_1.4_0.1.zip",
+        ],
+    )
+    assert state.get_compressed_files() == [
+        "times_0.1_0.2_0.1.tgz",
+        "times_0.3_0.4_0.1.tar.zst",
+        "times_0.5_0.6_0.1.tar.xz",
+        "times_0.7_0.8_0.1.tar.lz4",
+        "times_0.9_1.0_0.1.tar",
+    ]
+    assert state.is_compressed_file("times_0.3_0.4_0.1.tar.zst")
+    assert not state.is_compressed_file("times_1.3_1.4_0.1.zip")
+    assert state.is_compressed("0.4")
+    assert not state.is_compressed("1.2")
+    assert state.extract_compressed_file_params(
+        "times_0.3_0.4_0.1.tar.zst"
+    ) == (Decimal("0.3"), Decimal("0.4"), Decimal("0.1"))
+    assert (
+        state.create_compressed_filename("0.3", "0.4", "0.1", "tar.zst")
+        == "times_0.3_0.4_0.1.tar.zst"
+    )
@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+import pytest
+from simon.openfoam.grouping import CompressionGrouper, partition_by_size
+
+
+def test_emits_window_when_it_becomes_full() -> None:
+    grouper = CompressionGrouper(Decimal("0.05"), Decimal("0.2"))
+    assert grouper.update(["0", "0.05", "0.1"]) == []
+    assert grouper.update(["0", "0.05", "0.1", "0.15", "0.2"]) == [
+        ["0", "0.05", "0.1", "0.15"]
+    ]
+
+
+def test_does_not_emit_full_window_again() -> None:
+    grouper = CompressionGrouper(Decimal("0.05"), Decimal("0.2"))
+    times = ["0", "0.05", "0.1", "0.15"]
+    assert grouper.update(times) == [times]
+    assert grouper.update(times + ["0.2"]) == []
+
+
+def test_emits_windows_that_are_not_adjacent() -> None:
+    grouper = CompressionGrouper(Decimal("0.05"), Decimal("0.1"))
+    assert grouper.update(["0.3", "0.35", "0.8", "0.85"]) == [
+        ["0.3", "0.35"],
+        ["0.8", "0.85"],
+    ]
+
+
+def test_removed_tars_leave_their_window() -> None:
+    grouper = CompressionGrouper(Decimal("0.05"), Decimal("0.2"))
+    grouper.update(["0", "0.05", "0.1"])
+    grouper.update(["0", "0.05"])
+    assert len(grouper) == 2
+    assert grouper.update(["0", "0.05", "0.15"]) == []
+    assert grouper.update(["0", "0.05", "0.1", "0.15"]) == [
+        ["0", "0.05", "0.1", "0.15"]
+    ]
+
+
+def test_closes_groups_at_max_bytes_or_the_end_of_the_window() -> None:
+    sizes = {"0": 6, "0.05": 1, "0.1": 2, "0.15": 3, "0.2": 9}
+    grouper = CompressionGrouper(
+        Decimal("0.05"), Decimal("0.2"), max_bytes=5, size_of=sizes.get
+    )
+    # 0.1 and 0.15 wait for whatever comes after them
+    assert grouper.update(["0", "0.05", "0.15"]) == [["0"]]
+    assert grouper.update(["0", "0.05", "0.1", "0.15", "0.2"]) == [
+        ["0"],
+        ["0.05", "0.1", "0.15"],
+        ["0.2"],
+    ]
+
+
+def test_groups_start_after_the_archived_times() -> None:
+    sizes = {"0": 1, "0.05": 1, "0.1": 1, "0.15": 1}
+    grouper = CompressionGrouper(
+        Decimal("0.05"), Decimal("0.2"), max_bytes=2, size_of=sizes.get
+    )
+    # The tar of 0 is still there but it is already in an archive with 0.05
+    # (whose tar has been deleted)
+    assert grouper.update(
+        ["0", "0.1", "0.15"], lambda times: {"0", "0.05"} & set(times)
+    ) == [["0.1", "0.15"]]
+
+
+def test_max_bytes_needs_the_sizes() -> None:
+    with pytest.raises(ValueError):
+        CompressionGrouper(Decimal("0.05"), Decimal("0.2"), max_bytes=5)
+
+
+def test_partitions_by_size() -> None:
+    sizes = {"U": 30, "p": 10, "T": 10, "H2": 5, "O2": 5}
+    assert partition_by_size(sizes, 2) == [["U"], ["H2", "O2", "T", "p"]]
+    assert partition_by_size(sizes, 10) == [
+        ["U"],
+        ["T"],
+        ["p"],
+        ["H2"],
+        ["O2"],
+    ]
+    assert partition_by_size({}, 2) == []
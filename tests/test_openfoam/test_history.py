@@ -0,0 +1,119 @@
+import json
+from decimal import Decimal
+
+from simon.openfoam.history import ProcessedTimes, TimeRanges
+
+
+def test_everything_is_pending_at_first() -> None:
+    processed = ProcessedTimes()
+    assert processed.pending(["0.2", "0.1", "1"]) == ["0.1", "0.2", "1"]
+
+
+def test_processed_times_are_not_pending() -> None:
+    processed = ProcessedTimes()
+    processed.pending(["0.1", "0.2", "0.3"])
+    processed.add("0.1")
+    processed.add("0.3")
+    assert processed.pending(["0.1", "0.2", "0.3"]) == ["0.2"]
+    assert "0.1" in processed
+    assert "0.2" not in processed
+    assert len(processed) == 2
+
+
+def test_new_times_become_pending() -> None:
+    processed = ProcessedTimes()
+    for t in processed.pending(["0.1", "0.2"]):
+        processed.add(t)
+    assert processed.pending(["0.1", "0.2", "0.3", "0.4"]) == ["0.3", "0.4"]
+
+
+def test_forgets_times_that_are_gone() -> None:
+    processed = ProcessedTimes()
+    for t in processed.pending(["0.1", "0.2"]):
+        processed.add(t)
+    processed.pending(["0.2"])
+    assert "0.1" not in processed
+    assert len(processed) == 1
+
+
+def test_times_that_come_back_are_pending_again() -> None:
+    processed = ProcessedTimes()
+    for t in processed.pending(["0.1", "0.2"]):
+        processed.add(t)
+    processed.pending(["0.2"])
+    assert processed.pending(["0.1", "0.2"]) == ["0.1"]
+
+
+def test_unprocessed_times_that_are_gone_are_not_pending() -> None:
+    processed = ProcessedTimes()
+    processed.pending(["0.1", "0.2"])
+    assert processed.pending(["0.2"]) == ["0.2"]
+
+
+def test_consecutive_times_merge_into_one_range() -> None:
+    time_ranges = TimeRanges(Decimal("0.1"))
+    for t in ["0.3", "0.1", "0.2", "0.5"]:
+        time_ranges.add(t)
+    assert time_ranges.num_ranges == 2
+    time_ranges.add("0.4")
+    assert time_ranges.num_ranges == 1
+    assert len(time_ranges) == 5
+    assert "0.4" in time_ranges
+    assert "0.6" not in time_ranges
+    assert "0.35" not in time_ranges
+
+
+def test_times_off_the_grid_are_kept_separately() -> None:
+    time_ranges = TimeRanges(Decimal("0.1"))
+    time_ranges.add("0.1")
+    time_ranges.add("0.15")
+    assert "0.15" in time_ranges
+    assert time_ranges.num_ranges == 1
+    time_ranges.discard_off_grid(["0.15", "0.1"])
+    assert "0.15" not in time_ranges
+    assert "0.1" in time_ranges
+
+
+def test_time_ranges_round_trip_through_json() -> None:
+    time_ranges = TimeRanges(Decimal("0.1"))
+    for t in ["0.1", "0.2", "0.7", "0.75"]:
+        time_ranges.add(t)
+    data = json.loads(json.dumps(time_ranges.to_dict()))
+    assert data == {
+        "step": "0.1",
+        "ranges": [[1, 2], [7, 7]],
+        "times": ["0.75"],
+    }
+    loaded = TimeRanges.from_dict(data)
+    assert sorted(loaded.times()) == sorted(time_ranges.times())
+
+
+def test_rebased_time_ranges_hold_the_same_times() -> None:
+    time_ranges = TimeRanges(Decimal("0.1"))
+    for t in ["0.1", "0.2", "0.3", "0.25"]:
+        time_ranges.add(t)
+    rebased = time_ranges.rebased(Decimal("0.05"))
+    assert sorted(rebased.times()) == sorted(time_ranges.times())
+    assert rebased.num_ranges == 2
+    assert "0.25" in rebased
+
+
+def test_history_of_a_long_run_stays_small() -> None:
+    processed = ProcessedTimes(Decimal("0.001"))
+    times = [str(Decimal(i) * Decimal("0.001")) for i in range(1, 100001)]
+    for t in times:
+        processed.add(t)
+    assert len(processed) == len(times)
+    assert processed._processed.num_ranges == 1
+    assert processed.to_dict()["ranges"] == [[1, 100000]]
+
+
+def test_loaded_history_rechecks_times_on_the_disk() -> None:
+    processed = ProcessedTimes(Decimal("0.1"))
+    for t in processed.pending(["0.1", "0.2"]):
+        processed.add(t)
+    loaded = ProcessedTimes.from_dict(processed.to_dict())
+    assert "0.1" in loaded
+    assert loaded.pending(["0.1", "0.2"]) == ["0.1", "0.2"]
+    loaded.add("0.1")
+    assert loaded.pending(["0.1", "0.2", "0.3"]) == ["0.2", "0.3"]
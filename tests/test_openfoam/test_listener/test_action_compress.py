@@ -4,6 +4,8 @@ from typing import List
 from unittest.mock import Mock
 
 import pytest
+from simon.archive.codecs import Codec
+from simon.openfoam.file_state import OFFileState
 from simon.openfoam.listener import OFListener
 from tests.test_openfoam.conftest import (create_compressed_files,
                                           create_reconstructed_tars)
@@ -65,7 +67,9 @@ def test_compresses_when_single_compression_candidate_exists(
     create_reconstructed_tars(decomposed_case_dir, tars_present)
     listener.get_new_tasks()
     listener.cluster.compress.assert_called_once()
-    listener.cluster.compress.assert_called_with(tgz_filename, tars_compressed)
+    listener.cluster.compress.assert_called_with(
+        tgz_filename, [f"{t}.tar" for t in tars_compressed]
+    )
 
 
 @pytest.mark.parametrize(
@@ -534,3 +538,100 @@ def test_does_not_compress_when_tars_in_sequence_are_missing(
         tars_compressed_list,
     ):
         compress_call.args == (tgz_filename, tars_compressed)
+
+
+def test_compresses_window_once_its_last_tar_appears(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    assert isinstance(listener.cluster, Mock)
+    listener.update_processing_frequencies(
+        keep_every=Decimal("0.05"), compress_every=Decimal("0.2")
+    )
+    create_reconstructed_tars(decomposed_case_dir, ["0", "0.05", "0.1"])
+    listener.get_new_tasks()
+    listener.cluster.compress.assert_not_called()
+    create_reconstructed_tars(decomposed_case_dir, ["0.15"])
+    listener.get_new_tasks()
+    listener.cluster.compress.assert_called_once_with(
+        "times_0_0.15_0.05.tgz", ["0.tar", "0.05.tar", "0.1.tar", "0.15.tar"]
+    )
+
+
+def test_regroups_tars_when_frequencies_change(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    assert isinstance(listener.cluster, Mock)
+    listener.update_processing_frequencies(
+        keep_every=Decimal("0.05"), compress_every=Decimal("0.4")
+    )
+    create_reconstructed_tars(decomposed_case_dir, ["0", "0.05", "0.1"])
+    listener.get_new_tasks()
+    listener.cluster.compress.assert_not_called()
+    listener.compress_every = Decimal("0.15")
+    listener.get_new_tasks()
+    listener.cluster.compress.assert_called_once_with(
+        "times_0_0.1_0.05.tgz", ["0.tar", "0.05.tar", "0.1.tar"]
+    )
+
+
+def test_compressed_filename_carries_the_codec(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    assert isinstance(listener.cluster, Mock)
+    listener.codec = Codec("zstd", threads=4)
+    listener.update_processing_frequencies(
+        keep_every=Decimal("0.05"), compress_every=Decimal("0.1")
+    )
+    create_reconstructed_tars(decomposed_case_dir, ["0", "0.05"])
+    listener.get_new_tasks()
+    listener.cluster.compress.assert_called_once_with(
+        "times_0_0.05_0.05.tar.zst", ["0.tar", "0.05.tar"]
+    )
+    # The tars get deleted once their compressed file exists
+    create_compressed_files(decomposed_case_dir, ["times_0_0.05_0.05.tar.zst"])
+    tasks = listener.get_new_tasks()
+    assert listener._create_delete_tar_task("0") in tasks
+    assert listener._create_delete_tar_task("0.05") in tasks
+
+
+def test_splits_windows_into_groups_of_max_group_bytes(
+    decomposed_case_dir: Path,
+) -> None:
+    listener = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.05"),
+        compress_every=Decimal("0.4"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        max_group_bytes=100,
+    )
+    assert isinstance(listener.cluster, Mock)
+    sizes = {"0": 150, "0.05": 40, "0.1": 40, "0.15": 40, "0.2": 10}
+    for t, size in sizes.items():
+        (decomposed_case_dir / f"{t}.tar").write_bytes(b"\0" * size)
+    listener.get_new_tasks()
+    # A single time can be a group of its own and the rest of the window
+    # waits for the times that are still missing
+    assert [c.args for c in listener.cluster.compress.mock_calls] == [
+        ("times_0_0_0.05.tgz", ["0.tar"]),
+        ("times_0.05_0.15_0.05.tgz", ["0.05.tar", "0.1.tar", "0.15.tar"]),
+    ]
+    # Once the first groups are compressed and their tars deleted, the next
+    # group starts after them and is closed by the end of the window
+    create_compressed_files(
+        decomposed_case_dir,
+        ["times_0_0_0.05.tgz", "times_0.05_0.15_0.05.tgz"],
+    )
+    for t in ["0", "0.05", "0.1"]:
+        (decomposed_case_dir / f"{t}.tar").unlink()
+    create_reconstructed_tars(decomposed_case_dir, ["0.25", "0.3", "0.35"])
+    listener.get_new_tasks()
+    assert listener.cluster.compress.mock_calls[-1].args == (
+        "times_0.2_0.35_0.05.tgz",
+        ["0.2.tar", "0.25.tar", "0.3.tar", "0.35.tar"],
+    )
+    assert listener.cluster.compress.call_count == 3
+    assert listener.state.find_compressed_file("0.1") == (
+        "times_0.05_0.15_0.05.tgz"
+    )
+    assert listener.state.find_compressed_file("0") == "times_0_0_0.05.tgz"
+    assert not listener.state.is_compressed("0.2")
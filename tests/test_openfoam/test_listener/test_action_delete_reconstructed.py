@@ -29,7 +29,9 @@ def test_does_not_delete_reconstructed_times_if_not_tarred(
         if timestamp in already_tarred_times:
             continue
         # If a time is not tarred, it should not be deleted
-        unallowed_task = listener._create_delete_reconstructed_task(timestamp)
+        unallowed_task = listener._create_delete_reconstructed_task(
+            timestamp, archive=f"{timestamp}.tar"
+        )
         assert unallowed_task not in tasks
 
 
@@ -75,5 +77,8 @@ def test_deletes_reconstructed_times_if_tarred(
     create_reconstructed_tars(decomposed_case_dir, already_tarred_times)
     tasks = listener.get_new_tasks()
     for timestamp in already_tarred_times:
-        required_task = listener._create_delete_reconstructed_task(timestamp)
+        # Once the time checks out against the manifest of its tar
+        required_task = listener._create_delete_reconstructed_task(
+            timestamp, archive=f"{timestamp}.tar"
+        )
         assert required_task in tasks
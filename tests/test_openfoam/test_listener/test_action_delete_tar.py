@@ -1,10 +1,17 @@
+import tarfile
+import time
 from decimal import Decimal
+from pathlib import Path
 from typing import List
 
 import pytest
+from simon.archive.manifest import create_archive
+from simon.cluster.local import LocalJobManager
+from simon.openfoam.file_state import OFFileState
 from simon.openfoam.listener import OFListener
-from tests.test_openfoam.conftest import (create_compressed_files,
-                                          create_reconstructed_tars)
+from tests.test_openfoam.conftest import (
+    create_compressed_files, create_reconstructed_tars,
+    create_reconstructed_timestamps_with_done_marker)
 
 
 @pytest.mark.parametrize(
@@ -184,9 +191,9 @@ def test_does_not_delete_tarred_times_if_nothing_compressed(
     )
     create_reconstructed_tars(listener.state.case_dir, tars_present)
     tasks = listener.get_new_tasks()
+    deleted_tars = [task.short_string for task in tasks]
     for t in tars_present:
-        forbidden_task = listener._create_delete_tar_task(t)
-        assert forbidden_task not in tasks
+        assert f"DeleteTar {t}" not in deleted_tars
 
 
 @pytest.mark.parametrize(
@@ -363,9 +370,9 @@ def test_does_not_delete_tarred_times_when_other_tgzs_are_present(
     create_reconstructed_tars(listener.state.case_dir, tars_present)
     create_compressed_files(listener.state.case_dir, tgzs_present)
     tasks = listener.get_new_tasks()
+    deleted_tars = [task.short_string for task in tasks]
     for t in tars_to_preserve:
-        forbidden_task = listener._create_delete_tar_task(t)
-        assert forbidden_task not in tasks
+        assert f"DeleteTar {t}" not in deleted_tars
 
 
 @pytest.mark.parametrize(
@@ -558,3 +565,54 @@ def test_does_not_create_duplicate_tar_deletion_tasks(
     # Running again should not create any new tar deletion tasks
     tasks = listener.get_new_tasks()
     assert len(tasks) == 0
+
+
+def test_deletes_only_the_tars_that_check_out_against_the_manifest(
+    listener: OFListener,
+) -> None:
+    case_dir = listener.state.case_dir
+    times = ["0", "0.05", "0.1", "0.15", "0.2"]
+    create_reconstructed_tars(case_dir, times)
+    create_archive(
+        case_dir / "times_0_0.15_0.05.tgz",
+        [f"{t}.tar" for t in times[:-1]],
+        directory=case_dir,
+        compress_program="gzip",
+    )
+    # This one changed after it got compressed
+    (case_dir / "0.1.tar").write_bytes(b"\0" * 512)
+    tasks = listener.get_new_tasks()
+    for task in tasks:
+        task.run(block=True)
+    assert sorted(p.name for p in case_dir.glob("*.tar*")) == [
+        "0.1.tar",
+        "0.2.tar",
+    ]
+
+
+def test_deletes_the_tars_once_the_job_manager_has_compressed_them(
+    decomposed_case_dir: Path,
+) -> None:
+    listener = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.05"),
+        compress_every=Decimal("0.1"),
+        cluster=LocalJobManager(decomposed_case_dir),
+    )
+    times = ["0", "0.05"]
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, times
+    )
+    for t in times:
+        (decomposed_case_dir / t / "U").write_text(f"U at {t}")
+    compressed_file = decomposed_case_dir / "times_0_0.05_0.05.tgz"
+    deadline = time.monotonic() + 30
+    # Tar, compress (in the background) and delete the tars like monitor
+    # does until there is nothing left but the compressed file
+    while sorted(p.name for p in decomposed_case_dir.glob("0*")):
+        assert time.monotonic() < deadline
+        for task in listener.get_new_tasks():
+            task.run(block=True)
+        time.sleep(0.1)
+    with tarfile.open(compressed_file) as tar:
+        assert tar.getnames() == ["0.tar", "0.05.tar"]
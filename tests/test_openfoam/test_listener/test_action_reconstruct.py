@@ -1,11 +1,13 @@
+import shutil
 from decimal import Decimal
 from pathlib import Path
 from typing import List
 
 import pytest
 from simon.openfoam.listener import OFListener
+from simon.openfoam.file_state import RECONSTRUCTION_DONE_MARKER_FILENAME
 from tests.test_openfoam.conftest import (
-    create_reconstructed_tars,
+    NUM_PROCESSORS, create_reconstructed_tars,
     create_reconstructed_timestamps_with_done_marker,
     create_reconstructed_timestamps_without_done_marker,
     create_split_timestamps)
@@ -148,3 +150,107 @@ def test_does_reconstruct_partially_reconstructed_times(
                 timestamp
             )
             assert required_reconstruct_task in tasks
+
+
+def test_does_not_reconstruct_time_missing_from_some_processors(
+    decomposed_case_dir: Path,
+    listener: OFListener,
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2", "0.3"])
+    shutil.rmtree(
+        decomposed_case_dir / f"processor{NUM_PROCESSORS - 1}" / "0.1"
+    )
+    tasks = listener.get_new_tasks()
+    assert listener._create_reconstruct_task("0.1") not in tasks
+    assert listener._create_reconstruct_task("0.2") in tasks
+
+
+def test_reconstructs_time_once_all_processors_have_it(
+    decomposed_case_dir: Path,
+    listener: OFListener,
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2", "0.3"])
+    incomplete_time_dir = (
+        decomposed_case_dir / f"processor{NUM_PROCESSORS - 1}" / "0.1"
+    )
+    shutil.rmtree(incomplete_time_dir)
+    listener.get_new_tasks()
+    incomplete_time_dir.mkdir()
+    tasks = listener.get_new_tasks()
+    assert listener._create_reconstruct_task("0.1") in tasks
+
+
+def test_reconstructs_pending_times_in_batches(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    listener.keep_every = Decimal("0.1")
+    listener.reconstruct_batch_size = 2
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2", "0.3", "0.4"])
+    tasks = listener.get_new_tasks()
+    assert listener._create_batch_reconstruct_task(["0.1", "0.2"]) in tasks
+    assert listener._create_reconstruct_task("0.3") in tasks
+    assert listener._create_reconstruct_task("0.1") not in tasks
+
+
+def test_batch_reconstruct_marks_every_time(listener: OFListener) -> None:
+    task = listener._create_batch_reconstruct_task(["0", "0.1"])
+    case_dir = listener.state.case_dir
+    assert task.command.startswith(
+        f"reconstructPar -time '0,0.1' -case {case_dir} -withZero && "
+    )
+    for t in ["0", "0.1"]:
+        assert listener.state.registry.create_mark_command(t) in task.command
+
+
+def test_batch_reconstruct_runs_and_marks(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    # reconstructPar is not available here so stand in for it with a
+    # command that writes out the requested times
+    task = listener._create_batch_reconstruct_task(["0.1", "0.2"])
+    command = task.command.replace(
+        "reconstructPar -time '0.1,0.2'",
+        f"mkdir {decomposed_case_dir / '0.1'} {decomposed_case_dir / '0.2'}"
+        " && true",
+    )
+    task.command = command
+    task.run(block=True)
+    assert listener.state.get_reconstructed_times() == ["0.1", "0.2"]
+
+
+def test_reconstructs_field_subsets_concurrently(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    listener.keep_every = Decimal("0.1")
+    listener.reconstruct_field_parts = 2
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2"])
+    tasks = listener.get_new_tasks()
+    field_tasks = [t for t in tasks if t.command.startswith("reconstructPar")]
+    assert len(field_tasks) == 2
+    assert "-fields '(H2 U)'" in field_tasks[0].command
+    assert "-fields '(T p)'" in field_tasks[1].command
+    # Stand in for reconstructPar and run the parts one after the other
+    (decomposed_case_dir / "0.1").mkdir()
+    for i, task in enumerate(field_tasks):
+        task.command = "true " + task.command.split(" ", 1)[1]
+        task.run(block=True)
+        assert listener.state.is_reconstructed("0.1") == (i == 1)
+    assert sorted(p.name for p in (decomposed_case_dir / "0.1").iterdir()) == [
+        RECONSTRUCTION_DONE_MARKER_FILENAME
+    ]
+
+
+def test_reconstructs_only_the_fields_to_keep(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    listener.keep_every = Decimal("0.1")
+    listener.fields = ["U", "p"]
+    task = listener._create_reconstruct_task("0.1")
+    assert "-fields '(U p)'" in task.command
+    listener.reconstruct_field_parts = 2
+    create_split_timestamps(decomposed_case_dir, ["0.1"])
+    commands = [
+        t.command for t in listener._create_field_reconstruct_tasks("0.1")
+    ]
+    assert "-fields '(U)'" in commands[0]
+    assert "-fields '(p)'" in commands[1]
@@ -1,3 +1,4 @@
+import tarfile
 from pathlib import Path
 
 import pytest
@@ -66,3 +67,71 @@ def test_tars_times_if_reconstructed(
     for timestamp in TEST_TIMESTAMP_STRINGS:
         required_task = listener._create_tar_task(timestamp)
         assert required_task in tasks
+
+
+def test_tars_only_the_fields_to_keep(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    listener.fields = ["U", "p"]
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    (decomposed_case_dir / "0.1" / "uniform").mkdir()
+    task = listener._create_tar_task("0.1")
+    assert " 0.1/U 0.1/p 0.1/uniform &&" in task.command
+    assert "0.1/T" not in task.command
+
+
+def test_tars_the_whole_time_if_none_of_the_fields_were_written(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    listener.fields = ["alpha.water"]
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    listener._create_tar_task("0.1").run(block=True)
+    with tarfile.open(decomposed_case_dir / "0.1.tar") as tar:
+        assert tar.getnames() == [
+            "0.1",
+            "0.1/H2",
+            "0.1/T",
+            "0.1/U",
+            "0.1/p",
+            "0.1.tar.sha256",
+        ]
+    listener._create_delete_reconstructed_task("0.1", archive="0.1.tar").run(
+        block=True
+    )
+    assert not (decomposed_case_dir / "0.1").exists()
+
+
+def test_deletes_the_time_once_it_checks_out_against_its_tar(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    (decomposed_case_dir / "0.1" / "U").write_text("U at 0.1")
+    listener._create_tar_task("0.1").run(block=True)
+    # Written relative to the case directory without the marker and with
+    # its manifest inside it
+    with tarfile.open(decomposed_case_dir / "0.1.tar") as tar:
+        assert tar.getnames() == [
+            "0.1",
+            "0.1/H2",
+            "0.1/T",
+            "0.1/U",
+            "0.1/p",
+            "0.1.tar.sha256",
+        ]
+    assert not (decomposed_case_dir / "0.1.tar.sha256").exists()
+    (decomposed_case_dir / "0.1" / "U").write_text("U changed after tarring")
+    listener._create_delete_reconstructed_task("0.1", archive="0.1.tar").run(
+        block=True
+    )
+    assert (decomposed_case_dir / "0.1").is_dir()
+    (decomposed_case_dir / "0.1" / "U").write_text("U at 0.1")
+    listener._create_delete_reconstructed_task("0.1", archive="0.1.tar").run(
+        block=True
+    )
+    assert not (decomposed_case_dir / "0.1").exists()
@@ -0,0 +1,45 @@
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from simon.archive.catalog import ArchiveCatalog
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.listener import OFListener
+from tests.test_openfoam.conftest import (
+    create_reconstructed_timestamps_with_done_marker)
+
+
+@pytest.fixture
+def cataloging_listener(decomposed_case_dir: Path) -> OFListener:
+    return OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+        catalog=ArchiveCatalog.for_case(decomposed_case_dir),
+    )
+
+
+def test_catalogs_new_compressed_files_once(
+    decomposed_case_dir: Path, cataloging_listener: OFListener
+) -> None:
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2", "0.3"]
+    )
+    for _ in range(2):
+        for task in cataloging_listener.get_new_tasks():
+            task.run(block=True)
+    tasks = cataloging_listener.get_new_tasks()
+    assert [t.short_string for t in tasks] == [
+        "Catalog times_0.2_0.3_0.1.tgz"
+    ]
+    # Not requested again while it is running
+    assert cataloging_listener.get_new_tasks() == []
+    tasks[0].run(block=True)
+    assert cataloging_listener.get_new_tasks() == []
+    assert cataloging_listener.catalog is not None
+    (archived,) = cataloging_listener.catalog.find("0.3")
+    assert archived.archive == "times_0.2_0.3_0.1.tgz"
+    assert archived.offset is not None
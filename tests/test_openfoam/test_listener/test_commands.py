@@ -1,8 +1,9 @@
 from pathlib import Path
 
 import pytest
-from simon.openfoam.file_state import RECONSTRUCTION_DONE_MARKER_FILENAME
-from simon.openfoam.listener import OFListener
+from simon.openfoam.file_state import (RECONSTRUCTION_DONE_MARKER_FILENAME,
+                                       OFFileState)
+from simon.openfoam.listener import MANIFEST_TOOL, OFListener
 from tests.test_openfoam.conftest import TEST_TIMESTAMP_STRINGS
 
 
@@ -34,6 +35,39 @@ def test_delete_split_task_command(
     assert generated_command == true_command
 
 
+@pytest.mark.parametrize("timestamp", TEST_TIMESTAMP_STRINGS)
+def test_collated_reconstruct_task_command(
+    collated_case_dir: Path,
+    timestamp: str,
+    collated_listener: OFListener,
+) -> None:
+    reconstruction_done_marker_filepath = (
+        collated_case_dir / timestamp / RECONSTRUCTION_DONE_MARKER_FILENAME
+    )
+    true_command = (
+        f"reconstructPar -time {timestamp} -case {collated_case_dir}"
+        f" -fileHandler collated"
+        f" && touch {reconstruction_done_marker_filepath}"
+    )
+    generated_command = collated_listener._create_reconstruct_task(
+        timestamp
+    ).command
+    assert generated_command == true_command
+
+
+@pytest.mark.parametrize("timestamp", TEST_TIMESTAMP_STRINGS)
+def test_collated_delete_split_task_command(
+    collated_case_dir: Path,
+    timestamp: str,
+    collated_listener: OFListener,
+) -> None:
+    true_command = f"rm -rf {collated_case_dir}/processors*/{timestamp}"
+    generated_command = collated_listener._create_delete_split_task(
+        timestamp
+    ).command
+    assert generated_command == true_command
+
+
 @pytest.mark.parametrize("timestamp", TEST_TIMESTAMP_STRINGS)
 def test_delete_reconstructed_task_command(
     decomposed_case_dir: Path,
@@ -48,18 +82,42 @@ def test_delete_reconstructed_task_command(
 
 
 @pytest.mark.parametrize("timestamp", TEST_TIMESTAMP_STRINGS)
-def test_create_tar_task_command(
+def test_manifest_registry_reconstruct_and_delete_commands(
     decomposed_case_dir: Path,
     timestamp: str,
     listener: OFListener,
 ) -> None:
-    reconstruction_done_marker_filepath = (
-        decomposed_case_dir / timestamp / RECONSTRUCTION_DONE_MARKER_FILENAME
+    listener.state = OFFileState(
+        decomposed_case_dir, reconstruction_registry="manifest"
+    )
+    registry = listener.state.registry
+    reconstruct_command = listener._create_reconstruct_task(timestamp).command
+    assert reconstruct_command == (
+        f"reconstructPar -time {timestamp} -case {decomposed_case_dir}"
+        f" && {registry.create_mark_command(timestamp)}"
+    )
+    delete_command = listener._create_delete_reconstructed_task(
+        timestamp
+    ).command
+    assert delete_command == (
+        f"rm -rf {decomposed_case_dir}/{timestamp}"
+        f" && {registry.create_unmark_command(timestamp)}"
     )
+
+
+@pytest.mark.parametrize("timestamp", TEST_TIMESTAMP_STRINGS)
+def test_create_tar_task_command(
+    decomposed_case_dir: Path,
+    timestamp: str,
+    listener: OFListener,
+) -> None:
     true_command = (
-        f"tar --exclude {reconstruction_done_marker_filepath}"
-        f" -cvf {decomposed_case_dir}/{timestamp}.tar.inprogress"
-        f" {decomposed_case_dir}/{timestamp}"
+        f"{MANIFEST_TOOL} tar"
+        f" --directory {decomposed_case_dir}"
+        f" --exclude {RECONSTRUCTION_DONE_MARKER_FILENAME}"
+        f" --manifest-member {timestamp}.tar.sha256"
+        f" {decomposed_case_dir}/{timestamp}.tar.inprogress"
+        f" {timestamp}"
         f" &&"
         f" mv {decomposed_case_dir}/{timestamp}.tar.inprogress"
         f" {decomposed_case_dir}/{timestamp}.tar"
@@ -0,0 +1,155 @@
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+from unittest.mock import Mock
+
+import pytest
+from simon.archive.catalog import ArchiveCatalog
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.listener import OFListener
+from tests.test_openfoam.conftest import (
+    create_reconstructed_timestamps_with_done_marker)
+
+
+@pytest.fixture
+def compacting_listener(decomposed_case_dir: Path) -> OFListener:
+    return OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+        catalog=ArchiveCatalog.for_case(decomposed_case_dir),
+        compact_bytes=1 << 20,
+    )
+
+
+def run_until_done(listener: OFListener) -> List[str]:
+    short_strings: List[str] = []
+    while tasks := listener.get_new_tasks():
+        for task in sorted(tasks, key=lambda t: t.priority):
+            short_strings.append(task.short_string)
+            task.run(block=True)
+    return short_strings
+
+
+def test_merges_small_compressed_files_once_they_are_done_with(
+    decomposed_case_dir: Path, compacting_listener: OFListener
+) -> None:
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2", "0.3", "0.4", "0.5", "0.6", "0.7"]
+    )
+    run_until_done(compacting_listener)
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.8", "0.9", "1"]
+    )
+    short_strings = run_until_done(compacting_listener)
+    assert short_strings.count("Compact times_0.2_0.9_0.1.tgz") == 1
+    state = compacting_listener.state
+    assert state.get_compressed_files() == ["times_0.2_0.9_0.1.tgz"]
+    assert list(state.get_compressed_file_index("times_0.2_0.9_0.1.tgz")) == [
+        "0.2",
+        "0.3",
+        "0.4",
+        "0.5",
+        "0.6",
+        "0.7",
+        "0.8",
+        "0.9",
+    ]
+    assert compacting_listener.catalog is not None
+    (archived,) = compacting_listener.catalog.find("0.5")
+    assert archived.archive == "times_0.2_0.9_0.1.tgz"
+    assert [r.name for r in compacting_listener.catalog.archives()] == [
+        "times_0.2_0.9_0.1.tgz"
+    ]
+
+
+def test_finishes_interrupted_compactions(decomposed_case_dir: Path) -> None:
+    listener = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+        compact_bytes=1 << 20,
+    )
+    for name in ["times_0.2_0.5_0.1.tgz", "times_0.4_0.5_0.1.tgz"]:
+        (decomposed_case_dir / name).write_bytes(b"")
+    # Its record lists the compressed files that it is merged from
+    (decomposed_case_dir / "times_0.2_0.5_0.1.tgz.merged").write_text(
+        "times_0.2_0.3_0.1.tgz\ntimes_0.4_0.5_0.1.tgz\n"
+    )
+    tasks = listener.get_new_tasks()
+    assert [t.short_string for t in tasks] == [
+        "Compact times_0.2_0.5_0.1.tgz"
+    ]
+    assert tasks[0].command.endswith(
+        f"--output times_0.2_0.5_0.1.tgz {decomposed_case_dir}"
+        " times_0.2_0.3_0.1.tgz times_0.4_0.5_0.1.tgz"
+    )
+    # Not requested again while it is running
+    assert listener.get_new_tasks() == []
+
+
+def test_leaves_compressed_files_that_were_not_merged_alone(
+    decomposed_case_dir: Path,
+) -> None:
+    listener = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+        compact_bytes=1,
+    )
+    # One covers the times of the other without a record of a compaction
+    for name in ["times_0.2_0.5_0.1.tgz", "times_0.4_0.5_0.1.tgz"]:
+        (decomposed_case_dir / name).write_bytes(b"")
+    assert listener.get_new_tasks() == []
+
+
+def test_does_not_compact_without_compact_bytes(
+    decomposed_case_dir: Path,
+) -> None:
+    listener = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+    )
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2", "0.3", "0.4", "0.5", "0.6"]
+    )
+    assert not any(
+        s.startswith("Compact") for s in run_until_done(listener)
+    )
+    with pytest.raises(ValueError):
+        OFListener(
+            state=OFFileState(decomposed_case_dir),
+            keep_every=Decimal("0.1"),
+            compress_every=Decimal("0.2"),
+            cluster=Mock(spec=["requeue_job", "compress"]),
+            compact_bytes=0,
+        )
+
+
+def test_looks_at_every_compressed_file_once(
+    decomposed_case_dir: Path, compacting_listener: OFListener
+) -> None:
+    # Not next to each other so they wait for the ones in between
+    names = ["times_0.2_0.3_0.1.tgz", "times_0.6_0.7_0.1.tgz"]
+    for name in names:
+        (decomposed_case_dir / name).write_bytes(b"")
+    compacting_listener.catalog = None
+    state = compacting_listener.state
+    get_index = Mock(wraps=state.get_compressed_file_index)
+    state.get_compressed_file_index = get_index  # type: ignore
+    for _ in range(3):
+        assert compacting_listener.get_new_tasks() == []
+    assert sorted(c.args[0] for c in get_index.call_args_list) == names
+    # Forgotten once they are gone
+    (decomposed_case_dir / names[0]).unlink()
+    compacting_listener.get_new_tasks()
+    assert list(compacting_listener._compressed_file_info) == names[1:]
@@ -0,0 +1,95 @@
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+from unittest.mock import Mock
+
+import pytest
+from simon.cluster.quota import QuotaMonitor
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.listener import OFListener
+from tests.test_openfoam.conftest import (
+    create_reconstructed_tars,
+    create_reconstructed_timestamps_with_done_marker,
+    create_split_timestamps)
+
+
+@pytest.fixture
+def files_used() -> List[int]:
+    return [0]
+
+
+@pytest.fixture
+def draining_listener(
+    decomposed_case_dir: Path, files_used: List[int]
+) -> OFListener:
+    return OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("3000"),
+        cluster=Mock(
+            spec=["requeue_job", "compress", "hold_job", "release_job"]
+        ),
+        quota=QuotaMonitor(max_files=100, usage=lambda: (files_used[0], 0)),
+        hold_job_when_draining=True,
+    )
+
+
+def test_does_not_reconstruct_while_draining(
+    decomposed_case_dir: Path,
+    draining_listener: OFListener,
+    files_used: List[int],
+) -> None:
+    files_used[0] = 95
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.15", "0.2"])
+    tasks = draining_listener.get_new_tasks()
+    assert draining_listener.draining
+    assert draining_listener._create_reconstruct_task("0.1") not in tasks
+    # Deleting split times frees up space so that should still happen
+    assert draining_listener._create_delete_split_task("0.15") in tasks
+
+
+def test_runs_space_freeing_tasks_while_draining(
+    decomposed_case_dir: Path,
+    draining_listener: OFListener,
+    files_used: List[int],
+) -> None:
+    files_used[0] = 95
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    create_reconstructed_tars(decomposed_case_dir, ["0.1"])
+    tasks = draining_listener.get_new_tasks()
+    assert (
+        draining_listener._create_delete_reconstructed_task(
+            "0.1", archive="0.1.tar"
+        )
+        in tasks
+    )
+
+
+def test_reconstructs_after_draining(
+    decomposed_case_dir: Path,
+    draining_listener: OFListener,
+    files_used: List[int],
+) -> None:
+    files_used[0] = 95
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2"])
+    draining_listener.get_new_tasks()
+    files_used[0] = 10
+    tasks = draining_listener.get_new_tasks()
+    assert not draining_listener.draining
+    assert draining_listener._create_reconstruct_task("0.1") in tasks
+
+
+def test_holds_and_releases_job(
+    draining_listener: OFListener, files_used: List[int]
+) -> None:
+    assert isinstance(draining_listener.cluster, Mock)
+    files_used[0] = 95
+    draining_listener.get_new_tasks()
+    draining_listener.get_new_tasks()
+    draining_listener.cluster.hold_job.assert_called_once()
+    draining_listener.cluster.release_job.assert_not_called()
+    files_used[0] = 10
+    draining_listener.get_new_tasks()
+    draining_listener.cluster.release_job.assert_called_once()
@@ -0,0 +1,65 @@
+import json
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import Mock
+
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.listener import HISTORY_FILENAME, OFListener
+from tests.test_openfoam.conftest import (
+    create_reconstructed_timestamps_with_done_marker,
+    create_split_timestamps)
+
+
+def test_history_round_trips_through_json(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2", "0.3"])
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    listener.get_new_tasks()
+    history = json.loads(json.dumps(listener.dump_history()))
+    assert history["processed_split_times"]["step"] == "0.0001"
+    listener.load_history(history)
+    assert "0.1" in listener._processed_split_times
+    assert listener.dump_history() == history
+
+
+def test_history_follows_keep_every(listener: OFListener) -> None:
+    listener._processed_split_times.add("0.1")
+    listener._processed_split_times.add("0.2")
+    listener.keep_every = Decimal("0.1")
+    assert listener._processed_split_times.to_dict()["ranges"] == [[1, 2]]
+    listener.update_processing_frequencies(
+        keep_every=Decimal("0.05"), compress_every=Decimal("3000")
+    )
+    assert listener._processed_split_times.to_dict()["ranges"] == [
+        [2, 2],
+        [4, 4],
+    ]
+
+
+def test_history_is_restored_by_the_next_listener(
+    decomposed_case_dir: Path, listener: OFListener
+) -> None:
+    assert not listener.restore_history()
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2", "0.3"])
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    listener.get_new_tasks()
+    listener.save_history()
+    assert sorted(p.name for p in decomposed_case_dir.glob(".simon*")) == [
+        HISTORY_FILENAME
+    ]
+    restarted = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=listener.keep_every,
+        compress_every=listener.compress_every,
+        cluster=Mock(spec=["requeue_job", "compress"]),
+    )
+    assert restarted.restore_history()
+    assert restarted.dump_history() == listener.dump_history()
+    # The times still on the disk are looked at again since their tasks
+    # may not have finished
+    assert restarted.get_new_tasks() != []
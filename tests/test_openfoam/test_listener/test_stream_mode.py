@@ -0,0 +1,151 @@
+import tarfile
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.listener import OFListener
+from tests.test_openfoam.conftest import (
+    create_reconstructed_timestamps_with_done_marker,
+    create_split_timestamps)
+
+
+@pytest.fixture
+def stream_listener(decomposed_case_dir: Path) -> OFListener:
+    return OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+    )
+
+
+def test_streams_reconstructed_times_into_group_archives(
+    decomposed_case_dir: Path, stream_listener: OFListener
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.2", "0.3", "0.4"])
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2", "0.3"]
+    )
+    tasks = stream_listener.get_new_tasks()
+    stream_tasks = [t for t in tasks if t.short_string.startswith("Stream")]
+    assert [t.short_string for t in stream_tasks] == [
+        "Stream 0.2",
+        "Stream 0.3",
+    ]
+    assert not any(t.short_string.startswith("Tar") for t in tasks)
+    for task in stream_tasks:
+        task.run(block=True)
+    # The reconstructed times are removed once they have been streamed
+    assert stream_listener.state.get_reconstructed_times() == []
+    assert stream_listener.state.get_streamed_times() == {
+        "0.2": "stream_1_0.2.inprogress",
+        "0.3": "stream_1_0.2.inprogress",
+    }
+    tasks = stream_listener.get_new_tasks()
+    assert [t.short_string for t in tasks] == [
+        "FinalizeStream times_0.2_0.3_0.1.tgz"
+    ]
+    tasks[0].run(block=True)
+    assert stream_listener.state.get_compressed_files() == [
+        "times_0.2_0.3_0.1.tgz"
+    ]
+    with tarfile.open(decomposed_case_dir / "times_0.2_0.3_0.1.tgz") as tar:
+        assert "0.3/U" in tar.getnames()
+        assert "0.3/.__reconstruction_done" not in tar.getnames()
+    assert stream_listener.get_new_tasks() == []
+
+
+def test_deletes_times_that_are_already_streamed(
+    decomposed_case_dir: Path, stream_listener: OFListener
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.4"])
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2"]
+    )
+    stream_listener.get_new_tasks()[0].run(block=True)
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2"]
+    )
+    stream_listener._requested_tar_times.clear()
+    stream_listener._processed_reconstructed_times = type(
+        stream_listener._processed_reconstructed_times
+    )()
+    tasks = stream_listener.get_new_tasks()
+    # Once it checks out against the manifest of its stream archive
+    stream_file = stream_listener.state.get_streamed_times()["0.2"]
+    assert (
+        stream_listener._create_delete_reconstructed_task(
+            "0.2", archive=stream_file
+        )
+        in tasks
+    )
+    for task in tasks:
+        task.run(block=True)
+    assert not (decomposed_case_dir / "0.2").exists()
+
+
+def test_rejects_unknown_archive_mode(decomposed_case_dir: Path) -> None:
+    with pytest.raises(ValueError):
+        OFListener(
+            state=OFFileState(decomposed_case_dir),
+            keep_every=Decimal("0.1"),
+            compress_every=Decimal("0.2"),
+            cluster=Mock(spec=["requeue_job", "compress"]),
+            archive_mode="zip",
+        )
+
+
+def test_restores_the_newest_archived_time(
+    decomposed_case_dir: Path, stream_listener: OFListener
+) -> None:
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2", "0.3"]
+    )
+    for task in stream_listener.get_new_tasks():
+        task.run(block=True)
+    for task in stream_listener.get_new_tasks():
+        task.run(block=True)
+    assert stream_listener.state.get_compressed_files() == [
+        "times_0.2_0.3_0.1.tgz"
+    ]
+    assert stream_listener.state.get_reconstructed_times() == []
+    stream_listener.ensure_case_correctness()
+    assert stream_listener.state.get_reconstructed_times() == ["0.3"]
+    assert (decomposed_case_dir / "0.3" / "U").is_file()
+
+
+def test_streams_delta_fields_as_patches(decomposed_case_dir: Path) -> None:
+    listener = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+        delta_fields=["U", "p"],
+        keyframe_every=4,
+    )
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.2"]
+    )
+    (task,) = listener.get_new_tasks()
+    assert " --delta U p --keyframe-every 4" in task.command
+    task.run(block=True)
+    assert listener.state.get_streamed_times() == {
+        "0.2": "stream_1_0.2.inprogress"
+    }
+
+
+def test_only_stream_archives_store_patches(
+    decomposed_case_dir: Path,
+) -> None:
+    with pytest.raises(ValueError):
+        OFListener(
+            state=OFFileState(decomposed_case_dir),
+            keep_every=Decimal("0.1"),
+            compress_every=Decimal("0.2"),
+            cluster=Mock(spec=["requeue_job", "compress"]),
+            delta_fields=["U"],
+        )
@@ -0,0 +1,99 @@
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import Mock
+
+import pytest
+from simon.openfoam.completion import WriteCompletionDetector
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.listener import OFListener
+from simon.openfoam.solver_log import SolverLog
+from tests.test_openfoam.conftest import (
+    create_reconstructed_timestamps_with_done_marker,
+    create_split_timestamps)
+
+
+@pytest.fixture
+def completion_listener(decomposed_case_dir: Path) -> OFListener:
+    state = OFFileState(decomposed_case_dir)
+    return OFListener(
+        state=state,
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("3000"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        completion=WriteCompletionDetector(
+            state,
+            solver_log=SolverLog(decomposed_case_dir / "log.pimpleFoam"),
+        ),
+    )
+
+
+def test_reconstructs_latest_time_once_written(
+    decomposed_case_dir: Path, completion_listener: OFListener
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.2"])
+    log_path = decomposed_case_dir / "log.pimpleFoam"
+    log_path.write_text("Time = 0.2\n")
+    tasks = completion_listener.get_new_tasks()
+    assert completion_listener._create_reconstruct_task("0.1") in tasks
+    assert completion_listener._create_reconstruct_task("0.2") not in tasks
+    with open(log_path, "a") as f:
+        f.write("Time = 0.21\n")
+    tasks = completion_listener.get_new_tasks()
+    assert tasks == [completion_listener._create_reconstruct_task("0.2")]
+
+
+def test_never_deletes_latest_split_time(
+    decomposed_case_dir: Path, completion_listener: OFListener
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1", "0.15"])
+    (decomposed_case_dir / "log.pimpleFoam").write_text("Time = 0.16\n")
+    tasks = completion_listener.get_new_tasks()
+    assert completion_listener._create_delete_split_task("0.15") not in tasks
+
+
+def test_tars_latest_reconstructed_time_once(
+    decomposed_case_dir: Path, completion_listener: OFListener
+) -> None:
+    create_split_timestamps(decomposed_case_dir, ["0.1"])
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    (decomposed_case_dir / "log.pimpleFoam").write_text("Time = 0.11\n")
+    tar_task = completion_listener._create_tar_task("0.1")
+    assert tar_task in completion_listener.get_new_tasks()
+    assert tar_task not in completion_listener.get_new_tasks()
+    assert completion_listener._create_delete_split_task(
+        "0.1"
+    ) not in completion_listener.get_new_tasks()
+
+
+def test_deletes_reconstructed_latest_time_once_a_later_one_is_written(
+    decomposed_case_dir: Path,
+) -> None:
+    listener = OFListener(
+        state=OFFileState(decomposed_case_dir),
+        keep_every=Decimal("0.1"),
+        compress_every=Decimal("0.2"),
+        cluster=Mock(spec=["requeue_job", "compress"]),
+        archive_mode="stream",
+        completion=Mock(is_complete=Mock(return_value=True)),
+    )
+    for t in ["0.2", "0.3", "0.4", "0.5"]:
+        create_split_timestamps(decomposed_case_dir, [t])
+        tasks = listener.get_new_tasks()
+        assert listener._create_reconstruct_task(t) in tasks
+        # As if the reconstruct task had run
+        create_reconstructed_timestamps_with_done_marker(
+            decomposed_case_dir, [t]
+        )
+        # Streamed and deleted before the next time gets written
+        while tasks := [
+            task
+            for task in listener.get_new_tasks() + tasks
+            if not task.short_string.startswith("Reconstruct")
+        ]:
+            for task in tasks:
+                task.run(block=True)
+            tasks = []
+        assert listener.state.get_reconstructed_times() == []
+    assert sorted(listener.state.get_split_time_counts()) == ["0.5"]
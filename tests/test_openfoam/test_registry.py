@@ -0,0 +1,183 @@
+import os
+import subprocess
+from pathlib import Path
+from typing import List
+
+import pytest
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.registry import (RECONSTRUCTION_DONE_MARKER_FILENAME,
+                                     ManifestRegistry, XattrRegistry,
+                                     create_reconstruction_registry)
+from tests.test_openfoam.conftest import (
+    create_reconstructed_timestamps_with_done_marker,
+    create_reconstructed_timestamps_without_done_marker)
+
+
+def xattrs_supported(directory: Path) -> bool:
+    try:
+        os.setxattr(directory, "user.simon.test", b"1")
+    except OSError:
+        return False
+    os.removexattr(directory, "user.simon.test")
+    return True
+
+
+@pytest.fixture(params=["marker", "manifest", "xattr"])
+def registry_name(request, decomposed_case_dir: Path) -> str:
+    if request.param == "xattr" and not xattrs_supported(decomposed_case_dir):
+        pytest.skip("User extended attributes are not supported here")
+    return request.param
+
+
+def test_unknown_registry_raises_value_error(
+    decomposed_case_dir: Path,
+) -> None:
+    with pytest.raises(ValueError):
+        create_reconstruction_registry("carrier_pigeon", decomposed_case_dir)
+
+
+def test_marked_times_are_reconstructed(
+    decomposed_case_dir: Path, registry_name: str, times: List[str]
+) -> None:
+    state = OFFileState(
+        decomposed_case_dir, reconstruction_registry=registry_name
+    )
+    create_reconstructed_timestamps_without_done_marker(
+        decomposed_case_dir, times
+    )
+    assert state.get_reconstructed_times() == []
+    state.registry.mark_reconstructed(*times[::2])
+    assert state.get_reconstructed_times() == times[::2]
+    for t in times[::2]:
+        assert state.is_reconstructed(t)
+    for t in times[1::2]:
+        assert not state.is_reconstructed(t)
+
+
+def test_mark_command_marks_time_reconstructed(
+    decomposed_case_dir: Path, registry_name: str
+) -> None:
+    state = OFFileState(
+        decomposed_case_dir, reconstruction_registry=registry_name
+    )
+    if registry_name == "xattr" and subprocess.run(
+        "command -v setfattr", shell=True, capture_output=True
+    ).returncode:
+        pytest.skip("setfattr is not installed")
+    create_reconstructed_timestamps_without_done_marker(
+        decomposed_case_dir, ["0.1", "0.2"]
+    )
+    subprocess.run(
+        state.registry.create_mark_command("0.1"), shell=True, check=True
+    )
+    assert state.get_reconstructed_times() == ["0.1"]
+
+
+def test_manifest_registry_does_not_need_marker_files(
+    decomposed_case_dir: Path,
+) -> None:
+    registry = ManifestRegistry(decomposed_case_dir)
+    create_reconstructed_timestamps_without_done_marker(
+        decomposed_case_dir, ["0.1"]
+    )
+    registry.mark_reconstructed("0.1")
+    assert not (
+        decomposed_case_dir / "0.1" / RECONSTRUCTION_DONE_MARKER_FILENAME
+    ).exists()
+    assert registry.is_reconstructed("0.1")
+
+
+def test_manifest_registry_ignores_times_without_directories(
+    decomposed_case_dir: Path,
+) -> None:
+    registry = ManifestRegistry(decomposed_case_dir)
+    registry.mark_reconstructed("0.1")
+    assert not registry.is_reconstructed("0.1")
+
+
+def test_manifest_registry_ignores_partially_written_line(
+    decomposed_case_dir: Path,
+) -> None:
+    registry = ManifestRegistry(decomposed_case_dir)
+    create_reconstructed_timestamps_without_done_marker(
+        decomposed_case_dir, ["0.1", "0.2"]
+    )
+    registry.manifest_path.write_text("0.1\n0.2")
+    assert registry.filter_reconstructed(["0.1", "0.2"]) == ["0.1"]
+
+
+def test_manifest_unmark_command_removes_only_that_time(
+    decomposed_case_dir: Path,
+) -> None:
+    registry = ManifestRegistry(decomposed_case_dir)
+    create_reconstructed_timestamps_without_done_marker(
+        decomposed_case_dir, ["0.1", "0.11", "1.1", "101"]
+    )
+    registry.mark_reconstructed("0.1", "0.11", "1.1", "101")
+    subprocess.run(
+        registry.create_unmark_command("1.1"), shell=True, check=True
+    )
+    assert registry.filter_reconstructed(["0.1", "0.11", "1.1", "101"]) == [
+        "0.1",
+        "0.11",
+        "101",
+    ]
+
+
+def test_manifest_unmark_command_succeeds_without_a_manifest(
+    decomposed_case_dir: Path,
+) -> None:
+    registry = ManifestRegistry(decomposed_case_dir)
+    subprocess.run(
+        registry.create_unmark_command("0.1"), shell=True, check=True
+    )
+    assert not registry.manifest_path.exists()
+
+
+def test_manifest_unmark_removes_times(decomposed_case_dir: Path) -> None:
+    registry = ManifestRegistry(decomposed_case_dir)
+    create_reconstructed_timestamps_without_done_marker(
+        decomposed_case_dir, ["0.1", "0.2"]
+    )
+    registry.mark_reconstructed("0.1", "0.2")
+    registry.unmark_reconstructed("0.1")
+    assert registry.filter_reconstructed(["0.1", "0.2"]) == ["0.2"]
+
+
+@pytest.mark.parametrize("registry_name", ["manifest", "xattr"])
+def test_migrates_marker_files(
+    decomposed_case_dir: Path, registry_name: str, times: List[str]
+) -> None:
+    if registry_name == "xattr" and not xattrs_supported(decomposed_case_dir):
+        pytest.skip("User extended attributes are not supported here")
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, times[:5]
+    )
+    create_reconstructed_timestamps_without_done_marker(
+        decomposed_case_dir, times[5:]
+    )
+    state = OFFileState(
+        decomposed_case_dir, reconstruction_registry=registry_name
+    )
+    assert state.migrate_reconstruction_markers() == times[:5]
+    assert state.get_reconstructed_times() == times[:5]
+    assert not list(
+        decomposed_case_dir.glob(f"*/{RECONSTRUCTION_DONE_MARKER_FILENAME}")
+    )
+
+
+def test_migrating_to_marker_files_does_nothing(
+    decomposed_case_dir: Path, times: List[str]
+) -> None:
+    create_reconstructed_timestamps_with_done_marker(
+        decomposed_case_dir, times
+    )
+    state = OFFileState(decomposed_case_dir)
+    assert state.migrate_reconstruction_markers() == []
+    assert state.get_reconstructed_times() == times
+
+
+def test_xattr_registry_is_not_reconstructed_without_directory(
+    decomposed_case_dir: Path,
+) -> None:
+    assert not XattrRegistry(decomposed_case_dir).is_reconstructed("0.1")
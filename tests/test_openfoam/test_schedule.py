@@ -0,0 +1,94 @@
+from decimal import Decimal
+from pathlib import Path
+from typing import List
+
+import pytest
+from simon.openfoam.schedule import WriteScheduler
+from simon.openfoam.solver_log import SolverLog
+
+
+def write_steps(
+    log_path: Path, steps: List[str], seconds_per_step: float
+) -> None:
+    # Time steps of 0.01 seconds of simulation time
+    with open(log_path, "a") as f:
+        for t in steps:
+            f.write(f"Time = {t}\n\n")
+            clock_time = (float(t) / 0.01) * seconds_per_step
+            f.write(
+                f"ExecutionTime = {clock_time} s  ClockTime = {clock_time} s\n"
+            )
+
+
+@pytest.fixture
+def now() -> List[float]:
+    return [1000.0]
+
+
+@pytest.fixture
+def scheduler(tmp_path: Path, now: List[float]) -> WriteScheduler:
+    return WriteScheduler(
+        SolverLog(tmp_path / "log.pimpleFoam"),
+        min_sleep=1,
+        max_sleep=60,
+        clock=lambda: now[0],
+    )
+
+
+def test_predicts_next_write(
+    tmp_path: Path, scheduler: WriteScheduler, now: List[float]
+) -> None:
+    # 2 seconds per time step of 0.01 and writes every 0.1
+    write_steps(tmp_path / "log.pimpleFoam", ["0.01", "0.02", "0.03"], 2)
+    scheduler.update(None)
+    assert scheduler.simulation_rate == pytest.approx(0.005)
+    assert scheduler.seconds_until_next_write() is None
+    scheduler.update("0.1")
+    scheduler.update("0.2")
+    assert scheduler.write_interval == Decimal("0.1")
+    assert scheduler.next_write_time == Decimal("0.3")
+    # 0.27 seconds of simulation time to go
+    assert scheduler.seconds_until_next_write() == pytest.approx(54)
+    now[0] += 20
+    assert scheduler.seconds_until_next_write() == pytest.approx(34)
+    assert scheduler.next_sleep(2) == pytest.approx(34)
+    assert scheduler.write_is_imminent(40)
+    assert not scheduler.write_is_imminent(30)
+
+
+def test_sleep_is_bounded(
+    tmp_path: Path, scheduler: WriteScheduler, now: List[float]
+) -> None:
+    write_steps(tmp_path / "log.pimpleFoam", ["0.01", "0.02"], 100)
+    scheduler.update("0.1")
+    scheduler.update("0.2")
+    assert scheduler.next_sleep(2) == 60
+    now[0] += 10000
+    assert scheduler.next_sleep(2) == 1
+
+
+def test_uses_default_without_estimates(scheduler: WriteScheduler) -> None:
+    scheduler.update("0.1")
+    assert scheduler.next_sleep(2) == 2
+
+
+def test_restart_resets_write_interval(scheduler: WriteScheduler) -> None:
+    scheduler.update("0.1")
+    scheduler.update("0.2")
+    scheduler.update("0.1")
+    assert scheduler.write_interval is None
+
+
+def test_follows_a_log_read_by_someone_else(
+    tmp_path: Path, scheduler: WriteScheduler, now: List[float]
+) -> None:
+    write_steps(tmp_path / "log.pimpleFoam", ["0.01", "0.02", "0.03"], 2)
+    scheduler.update("0.1")
+    scheduler.update("0.2")
+    assert scheduler.seconds_until_next_write() == pytest.approx(54)
+    now[0] += 20
+    # The write completion detector reads the new steps first
+    write_steps(tmp_path / "log.pimpleFoam", ["0.04", "0.05"], 2)
+    assert scheduler.solver_log.update()
+    scheduler.update(None)
+    assert scheduler.seconds_until_next_write() == pytest.approx(50)
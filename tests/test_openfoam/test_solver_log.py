@@ -0,0 +1,63 @@
+import os
+from decimal import Decimal
+from pathlib import Path
+
+from simon.openfoam.solver_log import SolverLog, find_solver_log
+
+LOG_START = """\
+Starting time loop
+
+Time = 0.1
+
+ExecutionTime = 1.5 s  ClockTime = 2 s
+
+Time = 0.2s
+
+ExecutionTime = 3.25 s  ClockTime = 4 s
+"""
+
+
+def test_parses_times_and_execution_times(tmp_path: Path) -> None:
+    log_path = tmp_path / "log.pimpleFoam"
+    log_path.write_text(LOG_START)
+    solver_log = SolverLog(log_path)
+    assert solver_log.update() == [Decimal("0.1"), Decimal("0.2")]
+    assert solver_log.latest_time == Decimal("0.2")
+    assert solver_log.latest_execution_time == 3.25
+    assert not solver_log.finished
+
+
+def test_only_reads_complete_new_lines(tmp_path: Path) -> None:
+    log_path = tmp_path / "log.pimpleFoam"
+    log_path.write_text("Time = 0.1\nTime = 0.")
+    solver_log = SolverLog(log_path)
+    assert solver_log.update() == [Decimal("0.1")]
+    with open(log_path, "a") as f:
+        f.write("2\n\nEnd\n")
+    assert solver_log.update() == [Decimal("0.2")]
+    assert solver_log.finished
+    assert solver_log.update() == []
+
+
+def test_starts_over_when_truncated(tmp_path: Path) -> None:
+    log_path = tmp_path / "log.pimpleFoam"
+    log_path.write_text(LOG_START + "End\n")
+    solver_log = SolverLog(log_path)
+    solver_log.update()
+    log_path.write_text("Time = 0.3\n")
+    assert solver_log.update() == [Decimal("0.3")]
+    assert not solver_log.finished
+
+
+def test_missing_log(tmp_path: Path) -> None:
+    solver_log = SolverLog(tmp_path / "log.pimpleFoam")
+    assert solver_log.update() == []
+    assert solver_log.latest_time is None
+
+
+def test_finds_latest_log(tmp_path: Path) -> None:
+    assert find_solver_log(tmp_path) is None
+    (tmp_path / "log.blockMesh").touch()
+    os.utime(tmp_path / "log.blockMesh", (0, 0))
+    (tmp_path / "log.pimpleFoam").touch()
+    assert find_solver_log(tmp_path) == tmp_path / "log.pimpleFoam"
@@ -0,0 +1,25 @@
+from decimal import Decimal
+
+import pytest
+from simon.openfoam.timegrid import TimeGrid
+
+
+@pytest.mark.parametrize("quantum", ["0.001", "0.05", "0.3", "1", "20"])
+def test_classify_matches_decimal_division(quantum: str) -> None:
+    timestamps = [str(i * Decimal("0.0005")) for i in range(2000)]
+    timestamps += ["1e-05", "2E+1", "0.10000", "-0.3", "0"]
+    grid = TimeGrid(Decimal(quantum))
+    assert grid.classify(timestamps) == [
+        (Decimal(t) / Decimal(quantum)) % 1 == 0 for t in timestamps
+    ]
+
+
+def test_is_exact_beyond_the_context_precision() -> None:
+    grid = TimeGrid(Decimal("1"))
+    assert not grid.is_multiple("1.0000000000000000000000000000001")
+    assert grid.is_multiple("100000000000000000000000000")
+
+
+def test_quantum_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        TimeGrid(Decimal("0"))
@@ -0,0 +1,129 @@
+import os
+import shutil
+from pathlib import Path
+from typing import List
+
+import pytest
+from simon.openfoam.file_state import OFFileState
+from simon.openfoam.usage import OFUsageTracker, StageUsage
+from tests.test_openfoam.conftest import (
+    NUM_PROCESSORS, TEST_VARIABLES, create_compressed_files,
+    create_reconstructed_tars,
+    create_reconstructed_timestamps_with_done_marker,
+    create_split_timestamps)
+
+
+@pytest.fixture
+def tracker(decomposed_case_dir: Path) -> OFUsageTracker:
+    return OFUsageTracker(OFFileState(decomposed_case_dir))
+
+
+def test_empty_case_has_no_usage(tracker: OFUsageTracker) -> None:
+    usage = tracker.update()
+    assert usage == {
+        "split": StageUsage(0, 0),
+        "reconstructed": StageUsage(0, 0),
+        "tarred": StageUsage(0, 0),
+        "compressed": StageUsage(0, 0),
+        # The case directory, constant, system and the processor directories
+        "other": StageUsage(3 + NUM_PROCESSORS, 0),
+    }
+
+
+def test_counts_files_in_each_stage(
+    tracker: OFUsageTracker, times: List[str]
+) -> None:
+    case_dir = tracker.state.case_dir
+    create_split_timestamps(case_dir, times[:3])
+    create_reconstructed_timestamps_with_done_marker(case_dir, times[3:5])
+    create_reconstructed_tars(case_dir, times[5:9])
+    create_compressed_files(case_dir, ["times_0_0.15_0.05.tgz"])
+    usage = tracker.update()
+    # Each time directory holds one file per variable plus itself
+    assert usage["split"].files == 3 * NUM_PROCESSORS * (
+        len(TEST_VARIABLES) + 1
+    )
+    # Plus the reconstruction done marker
+    assert usage["reconstructed"].files == 2 * (len(TEST_VARIABLES) + 2)
+    assert usage["tarred"].files == 4
+    assert usage["compressed"].files == 1
+
+
+def test_counts_everything_else_in_the_case_as_other(
+    tracker: OFUsageTracker, times: List[str]
+) -> None:
+    case_dir = tracker.state.case_dir
+    create_split_timestamps(case_dir, times[:3])
+    create_reconstructed_timestamps_with_done_marker(case_dir, times[3:5])
+    create_reconstructed_tars(case_dir, times[5:9])
+    create_compressed_files(case_dir, ["times_0_0.15_0.05.tgz"])
+    before = tracker.update()["other"]
+    # What simon keeps next to the archives
+    for name in [
+        "times_0_0.15_0.05.tgz.sha256",
+        "times_0_0.15_0.05.tgz.idx",
+        "stream_0_0.2.tgz.inprogress",
+        "stream_0_0.2.tgz.lock",
+        "archive_catalog.sqlite",
+        "0.5.tar.inprogress",
+    ]:
+        (case_dir / name).write_bytes(b"x" * 3)
+    (case_dir / "processor0" / "constant" / "polyMesh").mkdir(parents=True)
+    (case_dir / "processor0" / "constant" / "polyMesh" / "points").touch()
+    after = tracker.update()["other"]
+    assert after == before + StageUsage(6 + 3, 6 * 3)
+    # Every inode of the case is counted exactly once
+    num_inodes = 1 + sum(
+        len(dirs) + len(files) for _, dirs, files in os.walk(case_dir)
+    )
+    assert tracker.total.files == num_inodes
+
+
+def test_counts_bytes(tracker: OFUsageTracker) -> None:
+    case_dir = tracker.state.case_dir
+    create_split_timestamps(case_dir, ["0.1"])
+    (case_dir / "processor0" / "0.1" / "U").write_bytes(b"x" * 100)
+    (case_dir / "0.1.tar").write_bytes(b"x" * 10)
+    usage = tracker.update()
+    assert usage["split"].bytes == 100
+    assert usage["tarred"].bytes == 10
+    assert tracker.total.bytes == 110
+
+
+def test_update_picks_up_changes(tracker: OFUsageTracker) -> None:
+    case_dir = tracker.state.case_dir
+    create_split_timestamps(case_dir, ["0.1", "0.2"])
+    before = tracker.update()["split"]
+    (case_dir / "processor3" / "0.2" / "extra").write_bytes(b"x" * 7)
+    shutil.rmtree(case_dir / "processor5" / "0.1")
+    after = tracker.update()["split"]
+    assert after.files == before.files + 1 - (len(TEST_VARIABLES) + 1)
+    assert after.bytes == before.bytes + 7
+
+
+def test_update_picks_up_files_being_written(
+    tracker: OFUsageTracker,
+) -> None:
+    case_dir = tracker.state.case_dir
+    create_split_timestamps(case_dir, ["0.1"])
+    path = case_dir / "processor0" / "0.1" / "U"
+    path.write_bytes(b"x" * 10)
+    before = tracker.update()["split"]
+    mtime_ns = (case_dir / "processor0" / "0.1").stat().st_mtime_ns
+    with open(path, "ab") as f:
+        f.write(b"x" * 90)
+    # Writing to a file does not change its directory
+    assert (case_dir / "processor0" / "0.1").stat().st_mtime_ns == mtime_ns
+    after = tracker.update()["split"]
+    assert after.files == before.files
+    assert after.bytes == before.bytes + 90
+
+
+def test_cache_forgets_deleted_directories(tracker: OFUsageTracker) -> None:
+    case_dir = tracker.state.case_dir
+    create_split_timestamps(case_dir, ["0.1", "0.2"])
+    tracker.update()
+    for i in range(NUM_PROCESSORS):
+        shutil.rmtree(case_dir / f"processor{i}" / "0.1")
+    tracker.update()
+    assert not any("0.1" in Path(path).parts for path in tracker._cache)
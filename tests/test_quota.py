@@ -0,0 +1,90 @@
+import pytest
+from simon.cluster.quota import QuotaMonitor, parse_lfs_quota_output
+
+LFS_QUOTA_OUTPUT = "/storage 900 0 1000 - 95 80 100 -\n"
+
+
+@pytest.mark.parametrize(
+    "output, parsed",
+    [
+        (LFS_QUOTA_OUTPUT, (95, 900 * 1024, 100, 1000 * 1024)),
+        (
+            "/storage 1100* 0 1000 6d 95 80 100 -\n",
+            (95, 1100 * 1024, 100, 1000 * 1024),
+        ),
+        (
+            "/a/very/long/filesystem/name\n 900 0 1000 - 95 80 0 -\n",
+            (95, 900 * 1024, 80, 1000 * 1024),
+        ),
+        ("/storage 900 0 0 - 95 0 0 -\n", (95, 900 * 1024, None, None)),
+    ],
+)
+def test_parses_lfs_quota_output(output: str, parsed: tuple) -> None:
+    assert parse_lfs_quota_output(output) == parsed
+
+
+def test_parse_raises_value_error_on_garbage() -> None:
+    with pytest.raises(ValueError):
+        parse_lfs_quota_output("lfs: command not found")
+
+
+def test_needs_a_source_of_usage() -> None:
+    with pytest.raises(ValueError):
+        QuotaMonitor(max_files=10)
+
+
+@pytest.mark.parametrize("high_water, low_water", [(0.8, 0.9), (1.1, 0.5)])
+def test_rejects_invalid_water_marks(
+    high_water: float, low_water: float
+) -> None:
+    with pytest.raises(ValueError):
+        QuotaMonitor(
+            usage=lambda: (0, 0), high_water=high_water, low_water=low_water
+        )
+
+
+def test_drains_when_quota_command_reports_high_usage() -> None:
+    quota = QuotaMonitor(quota_command=f"echo '{LFS_QUOTA_OUTPUT}'")
+    assert quota.update()
+    assert quota.files_used == 95
+
+
+def test_does_not_drain_when_quota_command_reports_low_usage() -> None:
+    quota = QuotaMonitor(
+        quota_command="echo '/storage 10 0 1000 - 5 0 100 -'"
+    )
+    assert not quota.update()
+
+
+def test_explicit_limits_override_reported_limits() -> None:
+    quota = QuotaMonitor(
+        quota_command=f"echo '{LFS_QUOTA_OUTPUT}'",
+        max_files=1000,
+        max_bytes=10**9,
+    )
+    assert not quota.update()
+
+
+def test_drain_mode_has_hysteresis() -> None:
+    files_used = [0]
+    quota = QuotaMonitor(
+        max_files=100,
+        high_water=0.9,
+        low_water=0.8,
+        usage=lambda: (files_used[0], 0),
+    )
+    for files, draining in [
+        (50, False),
+        (90, True),
+        (85, True),
+        (80, True),
+        (79, False),
+        (85, False),
+    ]:
+        files_used[0] = files
+        assert quota.update() == draining
+
+
+def test_does_not_drain_without_limits() -> None:
+    quota = QuotaMonitor(usage=lambda: (10**9, 10**12))
+    assert not quota.update()
@@ -6,6 +6,7 @@ from typing import List
 from unittest import mock
 
 import pytest
+from simon.archive import module_command
 from simon.cluster.slurm import SlurmJobManager
 from simon.task import Task
 
@@ -13,6 +14,8 @@ JOB_SFILE_NAME = "case.sbatch"
 COMPRESS_SFILE_NAME = "compress.sbatch.template"
 SLURM_JOB_ID = "19810412"
 COMPRESS_JOB_ID = "513849050313"
+# What the compress jobs write the manifest of the archive with
+MANIFEST_HASH = f"{module_command('manifest')} hash"
 
 # Case directory setup convenience functions
 
@@ -213,6 +216,53 @@ def test_requeue_handles_changed_job_name(
     mocked_task_run.assert_not_called()
 
 
+# Test holding the requeued job
+
+
+def test_hold_holds_dependent_jobs(
+    cluster: SlurmJobManager, mocked_task_run, mocked_get_dependent_jobs_queued
+) -> None:
+    cluster.hold_job()
+    mocked_task_run.assert_called_once()
+    generated_command = mocked_task_run.mock_calls[0].args[0].command
+    assert generated_command == "scontrol hold 123456789"
+
+
+def test_release_releases_dependent_jobs(
+    cluster: SlurmJobManager, mocked_task_run, mocked_get_dependent_jobs_queued
+) -> None:
+    cluster.release_job()
+    mocked_task_run.assert_called_once()
+    generated_command = mocked_task_run.mock_calls[0].args[0].command
+    assert generated_command == "scontrol release 123456789"
+
+
+def test_hold_does_nothing_without_dependent_jobs(
+    cluster: SlurmJobManager, mocked_task_run, mocked_get_dependent_jobs_none
+) -> None:
+    cluster.hold_job()
+    mocked_task_run.assert_not_called()
+
+
+def test_dependent_jobs_only_depend_on_the_whole_job_id(
+    cluster: SlurmJobManager,
+) -> None:
+    squeue_output = (
+        "JOBID DEPENDENCY\n"
+        "555 afterany:12(unfulfilled)\n"
+        "556 afterany:123(unfulfilled)\n"
+        "557 afterany:1234\n"
+        "558 afterany:512\n"
+        "559 (null)\n"
+    )
+    with mock.patch(
+        "subprocess.check_output", return_value=squeue_output.encode()
+    ):
+        assert cluster._get_dependent_jobs("12") == ["555"]
+        assert cluster._get_dependent_jobs("123") == ["556"]
+        assert cluster._get_dependent_jobs("1234") == ["557"]
+
+
 # Test compressing
 
 
@@ -290,7 +340,11 @@ def test_compress_generates_correct_command_for_files(
     compress_command = cluster._create_compress_command(
         tgz_file=tgz_file, files=files_list
     )
-    true_tar_command = "tar -czvf some_tgz_file.tgz.inprogress.$SLURM_JOB_ID 1e-4 0.001 0.01 0.1 1 10.0 100"
+    true_tar_command = (
+        "tar -czvf some_tgz_file.tgz.inprogress.$SLURM_JOB_ID 1e-4 0.001 0.01 0.1 1 10.0 100"
+        f" && {MANIFEST_HASH} some_tgz_file.tgz.sha256"
+        " 1e-4 0.001 0.01 0.1 1 10.0 100"
+    )
     true_compress_command = (
         "mv some_tgz_file.tgz.queued some_tgz_file.tgz.inprogress.$SLURM_JOB_ID"
         + " && "
@@ -308,7 +362,11 @@ def test_compress_generates_correct_command_for_directories(
     compress_command = cluster._create_compress_command(
         tgz_file=test_tgz, files=directories_list
     )
-    true_tar_command = f"tar -czvf {test_tgz}.inprogress.$SLURM_JOB_ID 1e-4 0.001 0.01 0.1 1 10.0 100"
+    true_tar_command = (
+        f"tar -czvf {test_tgz}.inprogress.$SLURM_JOB_ID 1e-4 0.001 0.01 0.1 1 10.0 100"
+        f" && {MANIFEST_HASH} {test_tgz}.sha256"
+        " 1e-4 0.001 0.01 0.1 1 10.0 100"
+    )
     true_compress_command = (
         f"mv {test_tgz}.queued {test_tgz}.inprogress.$SLURM_JOB_ID"
         + " && "
@@ -0,0 +1,18 @@
+from pathlib import Path
+
+from simon.task import Task
+from simon.taskqueue import TaskQueue
+
+
+def test_reserved_slots_are_kept_free(tmp_path: Path) -> None:
+    task_queue = TaskQueue(num_simultaneous_tasks=2)
+    task_queue.reserve(1)
+    task_queue.update()
+    task_queue._queue.add(Task(command=f"touch {tmp_path / 'a'}"), 0)
+    task_queue._queue.add(Task(command=f"touch {tmp_path / 'b'}"), 0)
+    task_queue.update()
+    assert len(task_queue._running) == 1
+    # Adding tasks hands the reserved slots back
+    task_queue.add()
+    assert task_queue.reserved == 0
+    assert len(task_queue._running) == 2